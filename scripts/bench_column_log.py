@@ -0,0 +1,90 @@
+"""
+按列分块日志 (utils/column_log.py) 与 CSV 的对比
+生成 --duration 秒、50 Hz 的 Logger 状态 (欧拉角、角速度、功率、12 个关节的位置/目标/力矩、z 速度)，
+分别写成 CSV (np.savetxt) 和按列分块压缩的文件，比较文件大小、写入时间，
+以及读取任意 --window 秒内一列 (dof_pos) 的时间和读取的字节数。
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from utils.column_log import ColumnLogReader, convert_csv, write_log
+
+SCALARS = ("roll", "pitch", "yaw", "angle_vel_x", "angle_vel_y", "angle_vel_z", "power", "base_vel_z")
+JOINTS = ("dof_pos", "dof_pos_target", "dof_torque")
+
+
+def make_states(rows, dt, rng):
+    """步态频率的正弦加噪声，数值按 float32 的精度取整，接近实际记录的数据"""
+    t = np.arange(rows) * dt
+    phase = 2 * np.pi * 2.0 * t[:, None] + np.arange(12) * np.pi / 6
+    states = {"t": t}
+    for name in SCALARS:
+        states[name] = (0.1 * np.sin(0.3 * t) + 0.01 * rng.normal(size=rows)).astype(np.float32).astype(np.float64)
+    for k, name in enumerate(JOINTS):
+        values = (k + 1) * 0.4 * np.sin(phase) + 0.02 * rng.normal(size=(rows, 12))
+        states[name] = values.astype(np.float32).astype(np.float64)
+    return states
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunked column log vs CSV: size, write time and window reads")
+    parser.add_argument("--duration", type=float, default=3600.0, help="simulated seconds")
+    parser.add_argument("--dt", type=float, default=0.02)
+    parser.add_argument("--window", type=float, default=10.0, help="seconds read per query")
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--chunk-rows", type=int, default=4096)
+    parser.add_argument("--dir", default=None, help="output directory, default a temporary one")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    rows = int(args.duration / args.dt)
+    states = make_states(rows, args.dt, rng)
+    header = ["t", *SCALARS] + [f"{name}_{i}" for name in JOINTS for i in range(12)]
+    table = np.column_stack([states[name] for name in ("t", *SCALARS, *JOINTS)])
+    print(f"{rows} rows x {table.shape[1]} values ({args.duration:g} s at {1 / args.dt:g} Hz)")
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as directory:
+        csv = os.path.join(directory, "states.csv")
+        log = os.path.join(directory, "states.dwql")
+        start = time.perf_counter()
+        np.savetxt(csv, table, delimiter=",", fmt="%.9g", header=",".join(header), comments="")
+        csv_write = time.perf_counter() - start
+        start = time.perf_counter()
+        write_log(log, states, chunk_rows=args.chunk_rows)
+        log_write = time.perf_counter() - start
+        start = time.perf_counter()
+        convert_csv(csv, os.path.join(directory, "converted.dwql"), chunk_rows=args.chunk_rows)
+        convert = time.perf_counter() - start
+        print(f"csv: {os.path.getsize(csv) / 2**20:.1f} MiB, written in {csv_write:.2f}s")
+        print(f"column log: {os.path.getsize(log) / 2**20:.1f} MiB, written in {log_write:.2f}s "
+              f"(raw {table.nbytes / 2**20:.1f} MiB), csv conversion {convert:.2f}s")
+
+        starts = rng.uniform(0, args.duration - args.window, args.queries)
+        # CSV 只能整个解析后再按时间筛选
+        start = time.perf_counter()
+        data = np.loadtxt(csv, delimiter=",", skiprows=1)
+        rows_csv = data[(data[:, 0] >= starts[0]) & (data[:, 0] <= starts[0] + args.window)]
+        csv_read = time.perf_counter() - start
+        print(f"csv window read: {csv_read * 1e3:.0f} ms, {os.path.getsize(csv) / 2**20:.1f} MiB parsed")
+
+        with ColumnLogReader(log) as reader:
+            start = time.perf_counter()
+            for t0 in starts:
+                window = reader.read(t0, t0 + args.window, ["dof_pos"])
+            elapsed = (time.perf_counter() - start) / args.queries
+            window = reader.read(starts[0], starts[0] + args.window, ["dof_pos"])
+            # %.9g 足够让 float32 精度的数值往返一致
+            expected = rows_csv[:, 1 + len(SCALARS):13 + len(SCALARS)]
+            assert np.array_equal(window["dof_pos"].astype(np.float32), expected.astype(np.float32))
+            print(f"column log window read: {elapsed * 1e3:.2f} ms, "
+                  f"{reader.bytes_read / (args.queries + 1) / 2**10:.0f} KiB and "
+                  f"{reader.chunks_read / (args.queries + 1):.1f} chunks per query, {len(window)} rows")
+
+
+if __name__ == "__main__":
+    main()
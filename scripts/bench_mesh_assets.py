@@ -0,0 +1,133 @@
+"""
+网页可视化网格加载的传输字节数和加载时间
+对比原来的加载方式 (逐个顺序请求 /static/models/go2/*.obj 文本) 和 utils/mesh_assets.py 的
+二进制网格 (manifest + 带哈希的文件名，预压缩，永久缓存)，分首次访问和再次访问两种情况：
+    实测: 本机上取回并解码所有网格的时间 (解码在 Python 中进行，只作为相对比较)
+    估算: 按 --bandwidth / --rtt 模拟的网络上的加载时间 = 字节数 / 带宽 + 串行往返次数 * rtt
+"""
+
+import argparse
+import gzip
+import http.client
+import json
+import math
+import time
+import urllib.parse
+
+from scripts.load_test_server import free_port, start_server
+from utils.mesh_assets import ENCODINGS, decode_mesh, parse_obj
+
+# robot_renderer.js 加载的网格，原来的页面按这个顺序逐个 await (base_4 在仓库中不存在)
+PAGE_MESHES = (["base_0", "base_1", "base_2", "base_3", "base_4"]
+               + ["hip_0", "hip_1", "thigh_0", "thigh_1", "calf_0", "calf_1", "foot"] * 2
+               + ["hip_0", "hip_1", "thigh_mirror_0", "thigh_mirror_1", "calf_mirror_0", "calf_mirror_1", "foot"] * 2)
+# 浏览器对同一主机的 HTTP/1.1 并发连接数
+BROWSER_CONNECTIONS = 6
+
+
+class Fetcher:
+    """一个 keep-alive 连接，统计请求数和响应体字节数 (压缩后，即线上传输的字节)"""
+
+    def __init__(self, url):
+        parsed = urllib.parse.urlsplit(url)
+        self.connection = http.client.HTTPConnection(parsed.hostname, parsed.port)
+        self.requests = 0
+        self.bytes = 0
+
+    def get(self, path, headers=None):
+        self.connection.request("GET", path, headers=headers or {})
+        response = self.connection.getresponse()
+        body = response.read()
+        self.requests += 1
+        self.bytes += len(body)
+        return response, body
+
+
+def load_obj(url, cached=None):
+    """原来的页面: 顺序请求每个 OBJ；cached 为首次访问得到的 ETag，再次访问时发条件请求
+
+    原来的页面对同一个 OBJ 最多请求 4 次，浏览器是否用启发式缓存回答重复的请求因浏览器而异，
+    这里每个网格只计一次 (对原来的方式有利的下界)。
+    """
+    fetcher = Fetcher(url)
+    etags = {}
+    start = time.perf_counter()
+    for name in dict.fromkeys(PAGE_MESHES):
+        headers = {"If-None-Match": cached[name]} if cached and name in cached else {}
+        response, body = fetcher.get(f"/static/models/go2/{name}.obj", headers)
+        if response.status == 200:
+            etags[name] = response.getheader("ETag")
+            parse_obj(body.decode())
+    return fetcher, time.perf_counter() - start, etags
+
+
+def load_binary(url, encoding, cached=None):
+    """新的页面: manifest 加每个网格一次；再次访问时 manifest 返回 304，网格直接来自浏览器缓存"""
+    fetcher = Fetcher(url)
+    start = time.perf_counter()
+    headers = {"If-None-Match": cached} if cached else {}
+    response, body = fetcher.get("/meshes/manifest.json", headers)
+    etag = response.getheader("ETag")
+    if response.status == 200:
+        manifest = json.loads(body)["meshes"]
+        for name in dict.fromkeys(PAGE_MESHES):
+            if name not in manifest:
+                continue
+            response, body = fetcher.get(f"/meshes/{manifest[name]['file']}", {"Accept-Encoding": encoding})
+            if response.getheader("Content-Encoding") == "gzip":
+                body = gzip.decompress(body)
+            elif response.getheader("Content-Encoding") == "br":
+                import brotli
+
+                body = brotli.decompress(body)
+            decode_mesh(body)
+    return fetcher, time.perf_counter() - start, etag
+
+
+def modeled(fetcher, round_trips, args):
+    return fetcher.bytes * 8 / (args.bandwidth * 1e6) + round_trips * args.rtt / 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mesh asset transfer size and load time")
+    parser.add_argument("--url", default=None, help="http://host:port of a running server, default starts one")
+    parser.add_argument("--bandwidth", type=float, default=20.0, help="modeled link bandwidth [Mbit/s]")
+    parser.add_argument("--rtt", type=float, default=40.0, help="modeled round trip time [ms]")
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if url is None:
+        port = free_port()
+        server = start_server(port)
+        url = f"http://127.0.0.1:{port}"
+    try:
+        # 服务器启动后的第一次请求会等待网格转换 (缓存存在时只计算哈希)，不计入测量
+        Fetcher(url).get("/meshes/manifest.json")
+        rows = []
+        obj, t, etags = load_obj(url)
+        # 原来的页面对每个网格依次 await，每个请求一次往返
+        rows.append(("obj, first visit", obj, t, modeled(obj, obj.requests, args)))
+        obj, t, _ = load_obj(url, etags)
+        rows.append(("obj, revisit (304s)", obj, t, modeled(obj, obj.requests, args)))
+        # br 只在安装了 brotli 时可用
+        for encoding in ("identity", *reversed(ENCODINGS)):
+            binary, t, etag = load_binary(url, encoding)
+            meshes = binary.requests - 1
+            rows.append((f"binary {encoding}, first visit", binary, t,
+                         modeled(binary, 1 + math.ceil(meshes / BROWSER_CONNECTIONS), args)))
+        binary, t, _ = load_binary(url, "gzip", etag)
+        rows.append(("binary, revisit", binary, t, modeled(binary, binary.requests, args)))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    print(f"{'':<28}{'requests':>9}{'bytes':>12}{'local [ms]':>12}"
+          f"{f'@{args.bandwidth:g}Mbit/{args.rtt:g}ms [ms]':>24}")
+    for label, fetcher, t, model in rows:
+        print(f"{label:<28}{fetcher.requests:>9}{fetcher.bytes:>12}{t * 1000:>12.1f}{model * 1000:>24.1f}")
+
+
+if __name__ == "__main__":
+    main()
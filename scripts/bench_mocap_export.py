@@ -0,0 +1,86 @@
+"""
+AMPCollector 导出速度测试
+用随机数据填满 --rows 行 (默认 10^6 行，61 列) 的 AMPCollector，分别测量文本 / .npy / .npz 导出的耗时、
+吞吐量和文件大小；原来逐个元素格式化的 numpy_to_formatted_list 只在 --old-rows 行上测量，
+并检查两种实现输出的文本完全相同。
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from utils.mocap_collector import AMPCollector, load_fields, numpy_to_formatted_list
+
+# 原来的实现，逐个元素 f-string 并反复 += 同一个字符串
+def numpy_to_formatted_list_old(arr, decimals=5):
+    formatted_str = "["
+    for i, row in enumerate(arr):
+        if i > 0:
+            formatted_str += "  "
+        formatted_str += "["
+        for j, elem in enumerate(row):
+            formatted_str += f"{elem:.{decimals}f}"
+            if j < len(row) - 1:
+                formatted_str += ", "
+        formatted_str += "]"
+        if i < len(arr) - 1:
+            formatted_str += ","
+        formatted_str += "\n"
+    formatted_str += "]"
+    return formatted_str
+
+
+def fill(collector, rows, rng):
+    """按 AMP 字段的长度逐帧采样，返回每帧的采样耗时 [s]"""
+    frames = rng.normal(size=(rows, 61))
+    splits = np.cumsum([3, 4, 12, 12, 3, 3, 12])
+    start = time.perf_counter()
+    for k in range(rows):
+        collector.amp_collector(k + 1.0, *np.split(frames[k], splits))
+    return (time.perf_counter() - start) / rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AMPCollector export throughput")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--old-rows", type=int, default=20_000, help="rows the old formatter is timed on")
+    parser.add_argument("--dir", default=None, help="output directory, default a temporary one")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    collector = AMPCollector(interval=0.0)
+    per_frame = fill(collector, args.rows, rng)
+    print(f"{args.rows} rows x {collector.chunks[0].shape[1]} columns, sampling {per_frame * 1e6:.2f} us/frame")
+
+    sample = np.concatenate(list(collector.iter_chunks()))[:args.old_rows]
+    start = time.perf_counter()
+    old = numpy_to_formatted_list_old(sample)
+    old_time = time.perf_counter() - start
+    start = time.perf_counter()
+    new = numpy_to_formatted_list(sample)
+    new_time = time.perf_counter() - start
+    assert old == new, "formatted output differs from the old implementation"
+    print(f"format {len(sample)} rows: old {old_time:.2f}s ({len(sample) / old_time:,.0f} rows/s), "
+          f"new {new_time:.3f}s ({len(sample) / new_time:,.0f} rows/s), identical output, "
+          f"{old_time / new_time:.0f}x")
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as directory:
+        for ext in ("txt", "npy", "npz"):
+            path = os.path.join(directory, f"amp.{ext}")
+            start = time.perf_counter()
+            collector.export(path)
+            elapsed = time.perf_counter() - start
+            size = os.path.getsize(path)
+            print(f"export .{ext}: {elapsed:.2f}s, {args.rows / elapsed:,.0f} rows/s, "
+                  f"{size / elapsed / 2**20:.0f} MiB/s, {size / 2**20:.0f} MiB")
+            if ext != "txt":
+                fields = load_fields(path)
+                assert np.array_equal(fields["foot_vel"][-1], collector.chunks[-1][collector._n - 1][49:61])
+        print(f"old formatter extrapolated to {args.rows} rows: {old_time / len(sample) * args.rows:.0f}s")
+
+
+if __name__ == "__main__":
+    main()
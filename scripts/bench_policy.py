@@ -0,0 +1,79 @@
+"""
+策略推理后端的微基准测试
+对每个后端和 batch size 统计 p50/p99 延迟，并在同一随机种子下与 reference 输出对比
+"""
+
+import argparse
+import time
+
+import numpy as np
+import torch
+
+from utils.policy_engine import BACKENDS, make_engine
+
+BATCH_SIZES = (1, 4, 16, 64, 256, 1024, 4096)
+
+
+def measure(engine, obs, iters, warmup):
+    for _ in range(warmup):
+        engine(obs)
+    times = np.empty(iters)
+    for i in range(iters):
+        t0 = time.perf_counter()
+        engine(obs)
+        times[i] = time.perf_counter() - t0
+    return np.percentile(times, 50) * 1e3, np.percentile(times, 99) * 1e3
+
+
+def max_abs_diff(engine, reference, obs, seed=0):
+    torch.manual_seed(seed)
+    expected = reference(obs)
+    torch.manual_seed(seed)
+    actual = engine(obs)
+    return float(np.abs(actual - expected).max())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Policy inference microbenchmark")
+    parser.add_argument("--policy", default="./policies/dreamwaq/go2/policy_dwaq.pt")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=list(BATCH_SIZES))
+    parser.add_argument("--threads", type=int, default=1, help="intra-op thread count")
+    parser.add_argument("--iters", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--atol", type=float, default=1e-4)
+    args = parser.parse_args()
+
+    reference = make_engine(torch.jit.load(args.policy), "reference", args.threads)
+    engines = []
+    for backend in args.backends:
+        try:
+            engines.append(make_engine(torch.jit.load(args.policy), backend, args.threads,
+                                       policy_path=args.policy))
+        except ImportError as e:
+            print(f"skip {backend}: {e}")
+
+    num_observations = int(reference.module.num_obs) * int(reference.module.num_obs_hist)
+    rng = np.random.default_rng(0)
+
+    print(f"threads={args.threads}")
+    print(f"{'backend':>12} {'batch':>6} {'p50 [ms]':>10} {'p99 [ms]':>10} {'us/sample':>10} {'max|diff|':>10}")
+    failed = False
+    for batch_size in args.batch_sizes:
+        obs = torch.from_numpy(rng.standard_normal((batch_size, num_observations)).astype(np.float32))
+        # 大 batch 时减少迭代次数，避免基准测试本身耗时过长
+        iters = max(10, min(args.iters, args.iters * 64 // batch_size))
+        for engine in engines:
+            diff = max_abs_diff(engine, reference, obs)
+            p50, p99 = measure(engine, obs, iters, args.warmup)
+            mark = "" if diff <= args.atol else "  MISMATCH"
+            failed |= diff > args.atol
+            print(f"{engine.name:>12} {batch_size:>6} {p50:>10.3f} {p99:>10.3f} "
+                  f"{p50 * 1e3 / batch_size:>10.2f} {diff:>10.2e}{mark}")
+
+    if failed:
+        raise SystemExit(f"numerical agreement check failed (atol={args.atol})")
+
+
+if __name__ == "__main__":
+    main()
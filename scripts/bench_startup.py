@@ -0,0 +1,73 @@
+"""
+策略加载的冷/热启动基准测试
+每次测量都在新的子进程中进行：
+    baseline  原来的方式，torch.jit.load + 第一次推理
+    cold      空的磁盘缓存，注册表加载、freeze/导出并写缓存
+    warm      磁盘缓存已存在，直接加载优化后的产物
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+CHILD = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import torch
+from utils.policy_registry import PolicyRegistry
+t1 = time.perf_counter()
+mode, path, backend, cache_dir = sys.argv[1:5]
+if mode == "baseline":
+    module = torch.jit.load(path)
+    policy = lambda x: module(x).detach().numpy()
+else:
+    policy = PolicyRegistry(cache_dir).engine(path, backend, 1)
+t2 = time.perf_counter()
+policy(torch.zeros(1, 270))
+t3 = time.perf_counter()
+print(json.dumps({"import": t1 - t0, "load": t2 - t1, "first_call": t3 - t2, "total": t3 - t0}))
+"""
+
+
+def run_child(mode, policy, backend, cache_dir):
+    env = dict(os.environ, PYTHONPATH=os.getcwd(), PYTHONWARNINGS="ignore")
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", CHILD, mode, policy, backend, cache_dir],
+                         env=env, check=True, capture_output=True, text=True).stdout
+    result = json.loads(out.strip().splitlines()[-1])
+    result["process"] = time.perf_counter() - start
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold/warm policy startup benchmark")
+    parser.add_argument("--policy", default="./policies/dreamwaq/go2/policy_dwaq.pt")
+    parser.add_argument("--backends", nargs="+", default=["torchscript"])
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    keys = ("import", "load", "first_call", "total", "process")
+    print(f"{'case':>24} " + " ".join(f"{k + ' [ms]':>16}" for k in keys))
+
+    def report(name, runs):
+        print(f"{name:>24} " + " ".join(f"{np.median([r[k] for r in runs]) * 1e3:>16.1f}" for k in keys))
+
+    report("baseline", [run_child("baseline", args.policy, "reference", "") for _ in range(args.repeats)])
+    for backend in args.backends:
+        cold, warm = [], []
+        for _ in range(args.repeats):
+            with tempfile.TemporaryDirectory() as cache_dir:
+                cold.append(run_child("registry", args.policy, backend, cache_dir))
+                warm.append(run_child("registry", args.policy, backend, cache_dir))
+        report(f"{backend} cold", cold)
+        report(f"{backend} warm", warm)
+
+
+if __name__ == "__main__":
+    main()
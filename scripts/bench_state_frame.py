@@ -0,0 +1,126 @@
+"""
+WebSocketBridge.send_state 的状态消息编码对比
+    json    旧格式，每帧 4 次 tolist() + json.dumps，并重复发送 12 个关节名
+    binary  utils/state_frame.py 的定长二进制帧
+    delta   utils/state_codec.py 的量化 + 相对 keyframe 增量编码
+统计每帧字节数、相对 json 的压缩比、编码/解码耗时 p50/p99，以及解码后的最大误差。
+按录制文件 (scripts/dreamwaq_go2.py --record) 的每个控制周期依次编码；不传录制文件时用 utils/batch_runner.py
+无界面运行 --duration 秒生成一段真实步态的状态序列。
+--synthetic 重复编码同一个随机状态，增量编码每帧都几乎为 0，压缩比远高于实际运动，只用于测编码开销。
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from utils.session_recorder import read_session
+from utils.state_codec import RESOLUTION, DeltaFrameDecoder, DeltaFrameEncoder
+from utils.state_frame import StateFrameEncoder, decode
+from utils.websocket_bridge import WebSocketBridge
+
+
+def synthetic_state():
+    """一个随机状态，重复编码时增量为 0，结果不代表实际的压缩比"""
+    rng = np.random.default_rng(0)
+    qpos = rng.standard_normal(19)
+    qvel = rng.standard_normal(18)
+    return [(qpos[0:3], qpos[3:7], qpos[7:19], qvel[6:18])]
+
+
+def simulate_states(duration, cmd, scene=None):
+    """没有录制文件时，无界面运行一个环境 duration 秒，返回每个控制周期的状态"""
+    from utils.batch_runner import BatchedRunner
+    from utils.sim2sim_config import Sim2simCfg
+
+    traj = BatchedRunner(Sim2simCfg(), 1, model_path=scene).run(np.array(cmd), duration).trajectories
+    return [(p[0], q[0], j[0], v[0]) for p, q, j, v in
+            zip(traj["base_pos"], traj["base_quat"], traj["dof_pos"], traj["dof_vel"])]
+
+
+def load_states(sessions):
+    """每个控制周期的 (base_pos, base_quat, joint_pos, joint_vel)，与控制循环一样是 float64 视图"""
+    states = []
+    for path in sessions:
+        _, records = read_session(path)
+        qpos = np.array(records["qpos"])
+        qvel = np.array(records["qvel"])
+        states.extend((p[0:3], p[3:7], p[7:19], v[6:18]) for p, v in zip(qpos, qvel))
+    return states
+
+
+def run_codec(encode, decode, states, iters):
+    """按顺序编码/解码 states (循环直到 iters 帧)，返回每帧字节数、编码/解码耗时和最大误差"""
+    n = max(iters, len(states))
+    sizes = np.empty(n)
+    encode_times = np.empty(n)
+    decode_times = np.empty(n)
+    max_error = 0.0
+    for i in range(n):
+        state = states[i % len(states)]
+        t0 = time.perf_counter()
+        message = encode(state)
+        t1 = time.perf_counter()
+        decoded = decode(message)
+        t2 = time.perf_counter()
+        sizes[i] = len(message)
+        encode_times[i] = t1 - t0
+        decode_times[i] = t2 - t1
+        if decoded is not None:
+            for name, value in zip(("base_pos", "base_quat", "joint_pos", "joint_vel"), state):
+                max_error = max(max_error, float(np.abs(np.asarray(decoded[name]) - value).max()))
+    return sizes, encode_times * 1e6, decode_times * 1e6, max_error
+
+
+def main():
+    parser = argparse.ArgumentParser(description="State message encoding benchmark")
+    parser.add_argument("sessions", nargs="*", help="recorded sessions to encode, default a simulated rollout")
+    parser.add_argument("--duration", type=float, default=20.0, help="simulated seconds without sessions")
+    parser.add_argument("--cmd", type=float, nargs=3, default=[0.5, 0.0, 0.0],
+                        metavar=("X_VEL", "Y_VEL", "ANG_VEL"), help="velocity command of the simulated rollout")
+    parser.add_argument("--scene", default=None, help="MuJoCo scene of the simulated rollout")
+    parser.add_argument("--synthetic", action="store_true",
+                        help="repeat one random state instead, measures codec cost only (ratio not representative)")
+    parser.add_argument("--iters", type=int, default=20000, help="minimum number of frames to encode")
+    parser.add_argument("--keyframe-interval", type=int, default=50)
+    for name, value in RESOLUTION.items():
+        parser.add_argument(f"--{name.replace('_', '-')}-res", type=float, default=value,
+                            help=f"delta codec quantization of {name}")
+    args = parser.parse_args()
+
+    if args.sessions:
+        states = load_states(args.sessions)
+        source = f"{len(args.sessions)} recorded session(s)"
+    elif args.synthetic:
+        states = synthetic_state()
+        source = "one repeated random state (synthetic: sizes and ratios are NOT representative)"
+    else:
+        states = simulate_states(args.duration, args.cmd, args.scene)
+        source = f"a {args.duration:g} s simulated rollout, cmd {args.cmd}"
+    resolution = {name: getattr(args, f"{name}_res") for name in RESOLUTION}
+    raw = StateFrameEncoder()
+    delta = DeltaFrameEncoder(resolution=resolution, keyframe_interval=args.keyframe_interval)
+    delta_decoder = DeltaFrameDecoder(resolution)
+
+    codecs = {
+        "json": (lambda s: WebSocketBridge.encode_state_json(*s), json.loads),
+        "binary": (lambda s: raw.encode(*s), decode),
+        "delta": (lambda s: delta.encode(*s), delta_decoder.decode),
+    }
+
+    print(f"{len(states)} states from {source}")
+    print(f"{'format':<8}{'bytes/frame':>12}{'ratio':>8}{'encode p50':>12}{'p99':>8}"
+          f"{'decode p50':>12}{'p99':>8}{'max err':>10}  (us)")
+    json_size = None
+    for name, (encode, decode_fn) in codecs.items():
+        sizes, encode_us, decode_us, max_error = run_codec(encode, decode_fn, states, args.iters)
+        size = sizes.mean()
+        json_size = json_size or size
+        print(f"{name:<8}{size:>12.1f}{json_size / size:>7.1f}x"
+              f"{np.percentile(encode_us, 50):>12.2f}{np.percentile(encode_us, 99):>8.2f}"
+              f"{np.percentile(decode_us, 50):>12.2f}{np.percentile(decode_us, 99):>8.2f}{max_error:>10.2g}")
+
+
+if __name__ == "__main__":
+    main()
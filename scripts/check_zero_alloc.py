@@ -0,0 +1,93 @@
+"""
+检查 ControlLoop.step() 的内存分配
+    frozen  策略替换为返回预分配数组的桩，测量每一步 tracemalloc 峰值增量，应为 0 字节
+    policy  真实推理引擎，推理本身会分配临时张量，检查多步之后的净增长应接近 0
+"""
+
+import argparse
+import sys
+import tracemalloc
+
+import numpy as np
+
+from utils.command_sources import ConstantCommandSource
+from utils.control_loop import ControlLoop
+from utils.sim2sim_config import Sim2simCfg
+
+
+class FrozenPolicy:
+    """每次返回同一个预分配的动作，用于把推理的分配和控制循环本身的分配分开"""
+
+    def __init__(self, action):
+        self.action = action
+
+    def __call__(self, obs):
+        return self.action
+
+
+def warmup(loop, steps):
+    loop.reset()
+    for _ in range(steps):
+        loop.step()
+
+
+def per_step_peak(loop, steps):
+    """逐步测量 tracemalloc 峰值相对于步前的增量，返回最大值 [bytes]"""
+    worst = 0
+    step = loop.step
+    tracemalloc.start()
+    for _ in range(steps):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        step()
+        worst = max(worst, tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+    return worst
+
+
+def net_growth(loop, steps):
+    """连续运行 steps 步后被追踪内存的净增长 [bytes]"""
+    step = loop.step
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for _ in range(steps):
+        step()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that the control loop does not allocate per step")
+    parser.add_argument("--scene", default=None, help="MuJoCo scene, default cfg.sim_config.mujoco_model_path")
+    parser.add_argument("--steps", type=int, default=2000)
+    parser.add_argument("--tolerance", type=int, default=4096, help="allowed net growth with the real policy [bytes]")
+    args = parser.parse_args()
+
+    cfg = Sim2simCfg()
+    source = ConstantCommandSource([0.5, 0.0, 0.0])
+    loop = ControlLoop(cfg, source, model_path=args.scene)
+
+    # 用真实策略走一段，取得一个合理的动作作为桩的输出
+    warmup(loop, 400)
+    frozen = np.array(loop.policy(loop.obs_history.tensor), dtype=np.float32)
+    policy = loop.policy
+
+    loop.policy = FrozenPolicy(frozen)
+    warmup(loop, 200)
+    frozen_peak = per_step_peak(loop, args.steps)
+
+    loop.policy = policy
+    warmup(loop, 200)
+    growth = net_growth(loop, args.steps)
+
+    print(f"frozen policy: max transient allocation per step {frozen_peak} B over {args.steps} steps")
+    print(f"real policy:   net growth {growth} B over {args.steps} steps")
+
+    ok = frozen_peak == 0 and abs(growth) <= args.tolerance
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+把 CSV 日志 (np.savetxt 导出，例如 utils/datacollector.py 中注释的示例) 转换成 utils/column_log.py 的
+按列分块压缩文件，之后可以按时间范围只读取部分列:
+    python scripts/convert_csv_log.py logs/run.csv --dt 0.02
+    python scripts/convert_csv_log.py logs/run.csv --columns t,cmd:3,omega:3,euler:3,q:12,dq:12
+表头中的 q_0, q_1, ... 或 q[0], q[1], ... 自动合并为一个向量列。
+"""
+
+import argparse
+import os
+import time
+
+from utils.column_log import SUFFIX, ColumnLogReader, convert_csv
+
+
+def parse_columns(spec):
+    """"t,cmd:3,q:12" -> [("t", ()), ("cmd", (3,)), ("q", (12,))]"""
+    columns = []
+    for item in spec.split(","):
+        name, _, width = item.strip().partition(":")
+        columns.append((name, (int(width),) if width else ()))
+    return columns
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a CSV log to a time-indexed chunked column log")
+    parser.add_argument("csv")
+    parser.add_argument("output", nargs="?", default=None, help=f"default: the CSV path with {SUFFIX}")
+    parser.add_argument("--columns", type=parse_columns, default=None,
+                        help="name[:width],... for every CSV column, default from the header")
+    parser.add_argument("--time-column", default="t")
+    parser.add_argument("--dt", type=float, default=None, help="generate the time column as row * dt")
+    parser.add_argument("--delimiter", default=",")
+    parser.add_argument("--chunk-rows", type=int, default=4096)
+    parser.add_argument("--level", type=int, default=3, help="zlib level")
+    args = parser.parse_args()
+
+    output = args.output or os.path.splitext(args.csv)[0] + SUFFIX
+    start = time.perf_counter()
+    rows = convert_csv(args.csv, output, columns=args.columns, time_column=args.time_column, dt=args.dt,
+                       delimiter=args.delimiter, chunk_rows=args.chunk_rows, level=args.level)
+    elapsed = time.perf_counter() - start
+    with ColumnLogReader(output) as reader:
+        summary = reader.summary()
+    size = os.path.getsize(output)
+    print(f"{rows} rows in {summary['chunks']} chunks, t = [{summary['start']:g}, {summary['end']:g}], "
+          f"{elapsed:.2f}s")
+    print(f"columns: {', '.join(f'{name}{shape}' if shape else name for name, shape in summary['columns'].items())}")
+    print(f"{os.path.getsize(args.csv) / 2**20:.1f} MiB -> {size / 2**20:.1f} MiB: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""
+server/websocket_server.py 的扇出负载测试
+一个模拟的仿真端按固定频率发送二进制状态帧，同时连接 N 个网页客户端，其中一部分是慢客户端
+(每收到一帧睡眠一段时间) 或完全不读的卡死客户端。
+检查仿真端发送是否被慢客户端拖慢，并汇总每个客户端的接收数和服务器端的丢帧统计。
+--sub-rate / --sub-fields 让正常客户端订阅降频、裁剪后的状态流，对比服务器的出站字节数。
+--sims N 同时连接 N 个仿真端 (sim0..simN-1)，正常客户端轮流订阅其中 --watch 个，检查服务器按仿真路由。
+--saturate 用大帧 (--joints)、较长的时间和很小的接收缓冲区让慢/卡死客户端在服务器端的队列溢出
+(默认参数下 socket 缓冲区足以装下全部帧，服务器不会丢帧)，并检查: 慢和卡死客户端都有丢帧、
+正常客户端没有丢帧、仿真端 send 的 p99 不超过 --max-send-ms。
+"""
+
+import argparse
+import asyncio
+import json
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+import numpy as np
+import websockets
+
+from utils.state_codec import DeltaFrameEncoder
+from utils.state_frame import StateFrameEncoder, handshake
+
+
+def start_server(port):
+    """在子进程中启动服务器，避免与测试客户端争用同一个 GIL"""
+    process = subprocess.Popen([sys.executable, "-m", "uvicorn", "server.websocket_server:app",
+                                "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+                               stdout=subprocess.DEVNULL)
+    deadline = time.time() + 20
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("server did not start")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def small_socket(url, size):
+    """接收缓冲区为 size 字节的已连接 socket，让不读的客户端很快把服务器端的发送堵住"""
+    host, port = url.split("://", 1)[1].split("/", 1)[0].rsplit(":", 1)
+    sock = socket.socket()
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, size)
+    sock.connect((host, int(port)))
+    sock.setblocking(False)
+    return sock
+
+
+async def web_client(url, delay, stop, counts, index, subscription=None, ports=None, recv_buffer=None):
+    """delay=None 表示正常客户端，delay>0 为每帧睡眠的慢客户端，delay<0 为不读的卡死客户端
+
+    ports: 记录每个客户端的本地端口，用于对应服务器统计中的客户端；recv_buffer: 慢/卡死客户端的接收缓冲区 [B]
+    """
+    sock = small_socket(url, recv_buffer) if recv_buffer and delay is not None else None
+    async with websockets.connect(url, max_queue=4, sock=sock) as ws:
+        if ports is not None:
+            ports[index] = ws.local_address[1]
+        await ws.send(json.dumps({"type": "web_connect"}))
+        if subscription:
+            await ws.send(json.dumps({"type": "subscribe", **subscription}))
+        if delay is not None and delay < 0:
+            await stop.wait()
+            return
+        while not stop.is_set():
+            try:
+                message = await asyncio.wait_for(ws.recv(), timeout=0.1)
+            except asyncio.TimeoutError:
+                continue
+            if isinstance(message, bytes):
+                counts[index] += 1
+            if delay:
+                await asyncio.sleep(delay)
+
+
+async def sim_client(url, rate, duration, codec="raw", sim_id=None, sent=None, hold=None, joints=12):
+    """按 rate 发送状态帧，返回每次 send 的耗时 [s] 和实际发送帧数
+
+    sent: 发送结束后 put 结果的 asyncio.Queue；hold: 发送结束后保持连接直到该事件置位，便于读取服务器统计
+    joints: 帧中的关节数，大于 12 时用来放大帧 (服务器只按帧头中的关节数处理)
+    """
+    encoder = DeltaFrameEncoder(joints) if codec == "delta" else StateFrameEncoder(joints)
+    qpos = np.zeros(7 + joints)
+    qvel = np.zeros(6 + joints)
+    period = 1.0 / rate
+    send_times = []
+    async with websockets.connect(url) as ws:
+        await ws.send(json.dumps(handshake(codec=encoder.handshake_info(), sim_id=sim_id)))
+        start = next_time = time.perf_counter()
+        k = 0
+        while time.perf_counter() - start < duration:
+            qpos[7:] = np.sin(k * 0.2 + np.arange(joints))
+            frame = encoder.encode(qpos[0:3], qpos[3:7], qpos[7:], qvel[6:])
+            t0 = time.perf_counter()
+            await ws.send(frame)
+            send_times.append(time.perf_counter() - t0)
+            k += 1
+            next_time += period
+            delay = next_time - time.perf_counter()
+            if delay < -period:
+                # 落后超过一帧时不补发 (WebSocketBridge 也只发送最新的一帧)，补发的突发会挤满正常客户端的队列
+                next_time -= delay
+            await asyncio.sleep(max(delay, 0.0))
+        result = np.array(send_times), k, time.perf_counter() - start
+        if hold is not None:
+            await sent.put(result)
+            await hold.wait()
+    return result
+
+
+async def run(args, url, stats_url):
+    stop = asyncio.Event()
+    delays = ([None] * args.clients + [args.slow_delay] * args.slow_clients + [-1.0] * args.stalled_clients)
+    counts = [0] * len(delays)
+    ports = [None] * len(delays)
+    sim_ids = [f"sim{k}" for k in range(args.sims)] if args.sims > 1 else [None]
+    clients = []
+    for i, d in enumerate(delays):
+        subscription = {}
+        if d is None and (args.sub_rate or args.sub_fields):
+            subscription = {"rate": args.sub_rate, "fields": args.sub_fields}
+        if args.sims > 1:
+            subscription["sims"] = [sim_ids[(i + k) % args.sims] for k in range(args.watch)]
+        clients.append(asyncio.create_task(web_client(url, d, stop, counts, i, subscription, ports,
+                                                      args.recv_buffer)))
+    await asyncio.sleep(1.0)
+
+    sent = asyncio.Queue()
+    sims = [asyncio.create_task(sim_client(url, args.rate, args.duration, args.codec, sim_id, sent, stop,
+                                           args.joints))
+            for sim_id in sim_ids]
+    results = [await sent.get() for _ in sims]
+    send_times = np.concatenate([r[0] for r in results])
+    frames = sum(r[1] for r in results)
+    elapsed = max(r[2] for r in results)
+    response = await asyncio.to_thread(urllib.request.urlopen, stats_url)
+    server_stats = json.load(response)
+    stop.set()
+    await asyncio.gather(*sims, *clients, return_exceptions=True)
+    return send_times, frames, elapsed, counts, delays, ports, server_stats
+
+
+def check_saturation(args, send_ms, delays, ports, server_stats):
+    """--saturate 的检查，返回不满足的条件"""
+    dropped = {int(c["client"].rsplit(":", 1)[1]): c["dropped"] for c in server_stats["clients"] if c["client"]}
+    failures = []
+    for name, kind, expect_drops in (("normal", None, False), ("slow", args.slow_delay, True),
+                                     ("stalled", -1.0, True)):
+        drops = [dropped.get(port, 0) for port, d in zip(ports, delays) if d == kind]
+        if expect_drops and not all(drops):
+            failures.append(f"{sum(n == 0 for n in drops)}/{len(drops)} {name} clients have no drops")
+        if not expect_drops and any(drops):
+            failures.append(f"{sum(n > 0 for n in drops)}/{len(drops)} {name} clients dropped frames")
+    p99 = np.percentile(send_ms, 99)
+    if p99 > args.max_send_ms:
+        failures.append(f"sim send p99 {p99:.3f}ms above {args.max_send_ms}ms")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WebSocket server fan-out load test")
+    parser.add_argument("--url", default=None, help="ws://host:port/ws of a running server, default starts one")
+    parser.add_argument("--clients", type=int, default=100, help="normal web clients")
+    parser.add_argument("--slow-clients", type=int, default=10)
+    parser.add_argument("--slow-delay", type=float, default=0.1, help="sleep per frame of a slow client [s]")
+    parser.add_argument("--stalled-clients", type=int, default=5, help="clients that never read")
+    parser.add_argument("--rate", type=float, default=50.0, help="sim state frames per second")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--codec", choices=("raw", "delta"), default="raw", help="state frame encoding of the sim")
+    parser.add_argument("--sub-rate", type=float, default=None, help="state rate the normal clients subscribe to [Hz]")
+    parser.add_argument("--sub-fields", nargs="+", default=None, help="fields the normal clients subscribe to")
+    parser.add_argument("--sims", type=int, default=1, help="simulations connected to the server")
+    parser.add_argument("--watch", type=int, default=1, help="simulations each normal client subscribes to")
+    parser.add_argument("--joints", type=int, default=12, help="joints per state frame, more for larger frames")
+    parser.add_argument("--recv-buffer", type=int, default=None,
+                        help="SO_RCVBUF of the slow and stalled clients [B], default the system one")
+    parser.add_argument("--saturate", action="store_true",
+                        help="overflow the server queues of slow/stalled clients and check the drops "
+                             "(presets below unless given)")
+    parser.add_argument("--max-send-ms", type=float, default=None,
+                        help="--saturate: bound on the sim send p99 [ms], default one frame period")
+    args = parser.parse_args()
+    if args.saturate:
+        # 默认参数下 500 帧不到 100 KiB，全部留在 socket 缓冲区里，服务器端队列不会溢出。
+        # 服务器的内核发送缓冲区会自动增长到约 4 MiB，用 32 KiB 的大帧和更长的时间把它填满，
+        # 客户端数量较少，避免服务器本身跟不上时正常客户端也丢帧
+        given = {arg.split("=", 1)[0] for arg in sys.argv[1:]}
+        for option, value in (("--rate", 25.0), ("--joints", 4096), ("--duration", 20.0), ("--clients", 3),
+                              ("--slow-clients", 2), ("--stalled-clients", 2), ("--recv-buffer", 4096)):
+            if option not in given:
+                setattr(args, option[2:].replace("-", "_"), value)
+        if args.max_send_ms is None:
+            args.max_send_ms = 1000.0 / args.rate
+
+    server = None
+    if args.url is None:
+        port = free_port()
+        server = start_server(port)
+        url = f"ws://127.0.0.1:{port}/ws"
+    else:
+        url = args.url
+    stats_url = url.replace("ws://", "http://", 1).rsplit("/ws", 1)[0] + "/stats"
+
+    try:
+        send_times, frames, elapsed, counts, delays, ports, server_stats = asyncio.run(run(args, url, stats_url))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    send_ms = send_times * 1000
+    print(f"sims: {args.sims}, {frames} frames in {elapsed:.2f}s "
+          f"({frames / elapsed / args.sims:.1f}/{args.rate:.0f} Hz per sim), "
+          f"send p50 {np.percentile(send_ms, 50):.3f}ms p99 {np.percentile(send_ms, 99):.3f}ms "
+          f"max {send_ms.max():.3f}ms")
+    # 每个客户端订阅的仿真所发送的帧数
+    expected = frames // args.sims * (min(args.watch, args.sims) if args.sims > 1 else 1)
+    for name, kind in (("normal", None), ("slow", args.slow_delay), ("stalled", -1.0)):
+        received = [c for c, d in zip(counts, delays) if d == kind]
+        if received:
+            print(f"{name:>8} clients {len(received):>4}: received min {min(received)} "
+                  f"mean {np.mean(received):.1f} max {max(received)} of {expected}")
+    for sim in server_stats["sims"]:
+        print(f"{sim['sim_id']:>8}: channel {sim['channel']}, {sim['subscribers']} subscribers, "
+              f"{sim['messages']} messages")
+    dropped = [c["dropped"] for c in server_stats["clients"]]
+    sent_bytes = sum(c["bytes_sent"] for c in server_stats["clients"])
+    print(f"server: {len(dropped)} clients, {sum(d > 0 for d in dropped)} with drops, "
+          f"total dropped {sum(dropped)}, max per client {max(dropped, default=0)}, "
+          f"sent {sent_bytes / 1024:.1f} KiB ({sent_bytes / 1024 / elapsed:.1f} KiB/s)")
+    if args.saturate:
+        failures = check_saturation(args, send_ms, delays, ports, server_stats)
+        if failures:
+            sys.exit("saturation check failed: " + "; ".join(failures))
+        print("saturation check passed")
+
+
+if __name__ == "__main__":
+    main()
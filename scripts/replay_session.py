@@ -0,0 +1,39 @@
+"""
+回放录制的仿真会话 (scripts/dreamwaq_go2.py --record)
+用录制的命令无界面、不限速地重新驱动控制循环，报告与录制结果的差异。
+策略或模型改动后，可以用 --policy / --scene 做回归检查。
+"""
+
+import argparse
+import sys
+
+from utils.session_recorder import read_session, replay_session
+from utils.sim2sim_config import Sim2simCfg
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded session headless and report divergence")
+    parser.add_argument("session")
+    parser.add_argument("--scene", default=None, help="override the recorded scene")
+    parser.add_argument("--policy", default=None, help="override the recorded policy file")
+    parser.add_argument("--tolerance", type=float, default=1e-6, help="qpos divergence threshold")
+    parser.add_argument("--info", action="store_true", help="only print the recording metadata")
+    args = parser.parse_args()
+
+    if args.info:
+        meta, records = read_session(args.session)
+        meta.pop("dtype")
+        for key, value in meta.items():
+            print(f"{key:>24}: {value}")
+        print(f"{'ticks':>24}: {len(records)}")
+        return
+
+    report = replay_session(args.session, Sim2simCfg(), model_path=args.scene, policy_root=args.policy,
+                            tolerance=args.tolerance)
+    for key, value in report.items():
+        print(f"{key:>24}: {value:.6g}" if isinstance(value, float) else f"{key:>24}: {value}")
+    sys.exit(0 if report["first_divergent_tick"] < 0 and report["ticks"] == report["recorded_ticks"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -24,7 +24,8 @@ async function init() {
         // 2. Initialize WebSocket Client
         console.log('[Init] Connecting to WebSocket server...');
         const wsUrl = getWebSocketUrl();
-        wsClient = new WebSocketClient(wsUrl);
+        const subscription = getSubscription();
+        wsClient = new WebSocketClient(wsUrl, subscription);
 
         // 3. Initialize 3D Renderer
         console.log('[Init] Initializing 3D renderer...');
@@ -54,6 +55,10 @@ async function init() {
 
         // 6. Connect WebSocket state updates to renderer and UI
         wsClient.onStateUpdate((state) => {
+            // With several simulations, the view follows the one that receives the commands
+            if (wsClient.commandSim && state.sim !== wsClient.commandSim) {
+                return;
+            }
             renderer.updateRobotState(state);
             uiController.updateStateDisplay(state);
         });
@@ -94,6 +99,26 @@ function getWebSocketUrl() {
     return 'ws://localhost:8000/ws';
 }
 
+/**
+ * State stream subscription from the page URL, e.g. ?rate=10&fields=base_pose,joint_pos&sim=robot1,robot2
+ * Commands go to the first sim. Returns null (full rate, all fields, the server's default sim) when no
+ * parameter is given.
+ */
+function getSubscription() {
+    const params = new URLSearchParams(window.location.search);
+    const rate = params.get('rate');
+    const fields = params.get('fields');
+    const sims = params.get('sim');
+    if (!rate && !fields && !sims) {
+        return null;
+    }
+    return {
+        rate: rate ? parseFloat(rate) : null,
+        fields: fields ? fields.split(',') : null,
+        sims: sims ? sims.split(',') : null
+    };
+}
+
 function showWelcomeMessage() {
     const messageElement = document.getElementById('status-message');
     if (messageElement) {
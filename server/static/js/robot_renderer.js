@@ -6,6 +6,13 @@
 import * as THREE from 'three';
 import { SplatMesh } from '@sparkjsdev/spark';
 
+// Binary meshes (utils/mesh_assets.py), header: magic "DWQM" | version u16 | flags u16 | vertex_count u32 |
+// index_count u32 | bounds_min f32[3] | bounds_max f32[3], then quantized u16 positions, i8 normals and indices
+const MESH_MAGIC = 0x4d515744;  // "DWQM" read as little-endian u32
+const MESH_VERSION = 1;
+const MESH_HEADER_BYTES = 40;
+const MESH_FLAG_INDEX_U32 = 0x1;
+
 class RobotRenderer {
     constructor(containerId) {
         this.container = document.getElementById(containerId);
@@ -22,6 +29,10 @@ class RobotRenderer {
         this.bodyMeshes = {};
         this.robotGroup = null;
         this.objLoader = new window.THREE.OBJLoader();
+        // Mesh name -> content-hashed binary mesh (/meshes/manifest.json), and one geometry
+        // promise per mesh shared by every leg that uses it
+        this.meshManifest = null;
+        this.geometries = new Map();
 
         this.isLoading = true;
         this.loadedMeshCount = 0;
@@ -96,7 +107,8 @@ class RobotRenderer {
     }
 
     async loadRobotModel() {
-        console.log('[Renderer] Loading GO2 robot OBJ meshes...');
+        console.log('[Renderer] Loading GO2 robot meshes...');
+        await this.loadMeshManifest();
 
         this.robotGroup = new THREE.Group();
         this.scene.add(this.robotGroup);
@@ -114,10 +126,12 @@ class RobotRenderer {
         this.robotGroup.add(baseGroup);
         this.bodyMeshes['base_link'] = baseGroup;
 
+        // All meshes are requested at once, the browser spreads them over its connections
+        const loads = [];
         const baseMeshes = ['base_0', 'base_1', 'base_2', 'base_3', 'base_4'];
         for (let i = 0; i < baseMeshes.length; i++) {
             const mat = i === 3 ? materials.white : (i === 4 ? materials.gray : materials.black);
-            await this.loadObjToGroup(baseMeshes[i], baseGroup, mat);
+            loads.push(this.loadMeshToGroup(baseMeshes[i], baseGroup, mat));
         }
 
         // Load leg meshes
@@ -136,8 +150,8 @@ class RobotRenderer {
             baseGroup.add(hipGroup);
             this.bodyMeshes[`${cfg.name}_hip`] = hipGroup;
 
-            await this.loadObjToGroup('hip_0', hipGroup, materials.metal);
-            await this.loadObjToGroup('hip_1', hipGroup, materials.gray);
+            loads.push(this.loadMeshToGroup('hip_0', hipGroup, materials.metal));
+            loads.push(this.loadMeshToGroup('hip_1', hipGroup, materials.gray));
 
             // Thigh group
             const thighGroup = new THREE.Group();
@@ -146,8 +160,8 @@ class RobotRenderer {
             hipGroup.add(thighGroup);
             this.bodyMeshes[`${cfg.name}_thigh`] = thighGroup;
 
-            await this.loadObjToGroup(`${cfg.thighMesh}_0`, thighGroup, materials.metal);
-            await this.loadObjToGroup(`${cfg.thighMesh}_1`, thighGroup, materials.gray);
+            loads.push(this.loadMeshToGroup(`${cfg.thighMesh}_0`, thighGroup, materials.metal));
+            loads.push(this.loadMeshToGroup(`${cfg.thighMesh}_1`, thighGroup, materials.gray));
 
             // Calf group
             const calfGroup = new THREE.Group();
@@ -156,16 +170,109 @@ class RobotRenderer {
             thighGroup.add(calfGroup);
             this.bodyMeshes[`${cfg.name}_calf`] = calfGroup;
 
-            await this.loadObjToGroup(`${cfg.calfMesh}_0`, calfGroup, materials.gray);
-            await this.loadObjToGroup(`${cfg.calfMesh}_1`, calfGroup, materials.black);
-            await this.loadObjToGroup('foot', calfGroup, materials.black);
+            loads.push(this.loadMeshToGroup(`${cfg.calfMesh}_0`, calfGroup, materials.gray));
+            loads.push(this.loadMeshToGroup(`${cfg.calfMesh}_1`, calfGroup, materials.black));
+            loads.push(this.loadMeshToGroup('foot', calfGroup, materials.black));
         }
+        await Promise.all(loads);
 
         this.robotGroup.visible = false;
         this.isLoading = false;
         console.log(`[Renderer] Loaded ${this.loadedMeshCount} meshes`);
     }
 
+    async loadMeshManifest() {
+        try {
+            const response = await fetch('/meshes/manifest.json');
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}`);
+            }
+            this.meshManifest = (await response.json()).meshes;
+        } catch (error) {
+            console.warn('[Renderer] No binary mesh manifest, loading OBJ meshes:', error);
+            this.meshManifest = {};
+        }
+    }
+
+    /**
+     * Add a mesh to group, from its binary version when the server has one, else from the OBJ
+     */
+    async loadMeshToGroup(meshName, group, material) {
+        const geometry = await this.loadMeshGeometry(meshName);
+        if (!geometry) {
+            return this.loadObjToGroup(meshName, group, material);
+        }
+        const mesh = new THREE.Mesh(geometry, material);
+        mesh.castShadow = true;
+        mesh.receiveShadow = true;
+        group.add(mesh);
+        this.loadedMeshCount++;
+    }
+
+    loadMeshGeometry(meshName) {
+        const entry = this.meshManifest && this.meshManifest[meshName];
+        if (!entry) {
+            return Promise.resolve(null);
+        }
+        if (!this.geometries.has(meshName)) {
+            // Hashed URL, served with an immutable Cache-Control: later page loads skip the request
+            this.geometries.set(meshName, fetch(`/meshes/${entry.file}`)
+                .then(response => {
+                    if (!response.ok) {
+                        throw new Error(`HTTP ${response.status}`);
+                    }
+                    return response.arrayBuffer();
+                })
+                .then(buffer => this.decodeMesh(buffer))
+                .catch(error => {
+                    console.warn(`[Renderer] Failed to load binary mesh ${meshName}, using OBJ:`, error);
+                    return null;
+                }));
+        }
+        return this.geometries.get(meshName);
+    }
+
+    /**
+     * Decode a binary mesh into an indexed BufferGeometry
+     */
+    decodeMesh(buffer) {
+        const view = new DataView(buffer);
+        if (view.getUint32(0, true) !== MESH_MAGIC) {
+            throw new Error('not a binary mesh');
+        }
+        const version = view.getUint16(4, true);
+        if (version !== MESH_VERSION) {
+            throw new Error(`unsupported mesh version ${version}`);
+        }
+        const flags = view.getUint16(6, true);
+        const vertexCount = view.getUint32(8, true);
+        const indexCount = view.getUint32(12, true);
+        const lo = [0, 1, 2].map(i => view.getFloat32(16 + i * 4, true));
+        const hi = [0, 1, 2].map(i => view.getFloat32(28 + i * 4, true));
+        const scale = lo.map((l, i) => Math.max(hi[i] - l, 1e-9) / 65535);
+
+        let offset = MESH_HEADER_BYTES;
+        const quantized = new Uint16Array(buffer, offset, vertexCount * 3);
+        const positions = new Float32Array(vertexCount * 3);
+        for (let i = 0; i < positions.length; i++) {
+            positions[i] = lo[i % 3] + quantized[i] * scale[i % 3];
+        }
+        offset += vertexCount * 6;
+        const normals = new Int8Array(buffer, offset, vertexCount * 3);
+        offset += vertexCount * 3;
+        offset += -offset & 3;
+        const indices = flags & MESH_FLAG_INDEX_U32
+            ? new Uint32Array(buffer, offset, indexCount)
+            : new Uint16Array(buffer, offset, indexCount);
+
+        const geometry = new THREE.BufferGeometry();
+        geometry.setAttribute('position', new THREE.BufferAttribute(positions, 3));
+        geometry.setAttribute('normal', new THREE.BufferAttribute(normals, 3, true));
+        geometry.setIndex(new THREE.BufferAttribute(indices, 1));
+        geometry.computeBoundingSphere();
+        return geometry;
+    }
+
     async loadObjToGroup(meshName, group, material) {
         return new Promise((resolve) => {
             const path = `/static/models/go2/${meshName}.obj`;
@@ -3,9 +3,36 @@
  * Manages WebSocket connection to GO2 backend
  */
 
+const STATE_FRAME_VERSION = 2;
+const STATE_FRAME_HEADER_BYTES = 24;
+// Payload field bits, in payload order (utils/state_frame.py)
+const STATE_FRAME_FIELDS = [
+    ['base_pos', 1, () => 3],
+    ['base_quat', 2, () => 4],
+    ['joint_pos', 4, n => n],
+    ['joint_vel', 8, n => n]
+];
+// Quantized delta frames (utils/state_codec.py), header: magic "DWQD" | version u8 | num_joints u8 |
+// flags u16 | seq u32 | timestamp_ms f64 | key_age u16, then u8 byte length per field and zigzag varints
+const DELTA_FRAME_VERSION = 1;
+const DELTA_FRAME_HEADER_BYTES = 22;
+const DELTA_FLAG_KEYFRAME = 0x100;
+const MAGIC_RAW = 0x53515744;    // "DWQS" read as little-endian u32
+const MAGIC_DELTA = 0x44515744;  // "DWQD"
+// Route header the server puts in front of frames for clients of several simulations: magic "DWQR" | channel u16
+const MAGIC_ROUTE = 0x52515744;  // "DWQR"
+const ROUTE_HEADER_BYTES = 6;
+
 class WebSocketClient {
-    constructor(serverUrl = 'ws://localhost:8000/ws') {
+    /**
+     * @param {string} serverUrl
+     * @param {?{rate: ?number, fields: ?string[], sims: ?string[]}} subscription - max state rate [Hz], fields
+     *        (base_pos, base_quat, joint_pos, joint_vel, base_pose, joints, all) and simulation ids;
+     *        null for the full stream of the server's default simulation
+     */
+    constructor(serverUrl = 'ws://localhost:8000/ws', subscription = null) {
         this.url = serverUrl;
+        this.subscription = subscription;
         this.ws = null;
         this.stateCallbacks = [];
         this.reconnectInterval = 1000;
@@ -13,6 +40,14 @@ class WebSocketClient {
         this.reconnectAttempts = 0;
         this.isConnecting = false;
         this.shouldReconnect = true;
+        // Per-simulation handshake by channel: sim id, joint names attached to every decoded state,
+        // delta codec parameters and the last keyframe (seq, quantized values per field)
+        this.sims = new Map();
+        // Simulation of frames without a route header (the only one subscribed to)
+        this.currentSim = null;
+        // Sequence number of sent commands and the simulation they go to, null for the server's choice
+        this.commandSeq = 0;
+        this.commandSim = subscription && subscription.sims ? subscription.sims[0] : null;
 
         this.connect();
     }
@@ -27,6 +62,7 @@ class WebSocketClient {
 
         try {
             this.ws = new WebSocket(this.url);
+            this.ws.binaryType = 'arraybuffer';
 
             this.ws.onopen = () => {
                 console.log('[WebSocket] Connected!');
@@ -37,20 +73,50 @@ class WebSocketClient {
 
                 // Identify as web client
                 this.ws.send(JSON.stringify({ type: 'web_connect' }));
+                if (this.subscription) {
+                    this.ws.send(JSON.stringify({ type: 'subscribe', ...this.subscription }));
+                }
             };
 
             this.ws.onmessage = (event) => {
                 try {
+                    if (event.data instanceof ArrayBuffer) {
+                        const state = this.decodeMessage(event.data);
+                        if (state) {
+                            this.notifyState(state);
+                        }
+                        return;
+                    }
+
                     const message = JSON.parse(event.data);
 
-                    if (message.type === 'state') {
-                        this.stateCallbacks.forEach(callback => {
-                            try {
-                                callback(message);
-                            } catch (error) {
-                                console.error('[WebSocket] Error in state callback:', error);
+                    if (message.type === 'sim_info') {
+                        const frame = message.state_frame;
+                        const sim = {
+                            id: message.sim_id,
+                            jointNames: frame ? frame.joint_names : null,
+                            codec: frame ? frame.codec : null,
+                            keyframe: null
+                        };
+                        this.sims.set(message.channel, sim);
+                        this.currentSim = sim;
+                        if (frame && frame.version !== STATE_FRAME_VERSION) {
+                            console.warn(`[WebSocket] State frame version ${frame.version}, expected ${STATE_FRAME_VERSION}`);
+                        }
+                    } else if (message.type === 'sim_disconnect') {
+                        for (const [channel, sim] of this.sims) {
+                            if (sim.id === message.sim_id) {
+                                this.sims.delete(channel);
                             }
-                        });
+                        }
+                        console.log(`[WebSocket] Simulation '${message.sim_id}' disconnected`);
+                    } else if (message.type === 'state') {
+                        if (!message.sim && this.currentSim) {
+                            message.sim = this.currentSim.id;
+                        }
+                        this.notifyState(message);
+                    } else if (message.type === 'error') {
+                        console.error('[WebSocket] Server error:', message.message);
                     }
                 } catch (error) {
                     console.error('[WebSocket] Error parsing message:', error);
@@ -84,13 +150,153 @@ class WebSocketClient {
         }
     }
 
-    sendCommand(xVel, yVel, angVel) {
+    /**
+     * Decode a binary message: a state frame, optionally behind a route header naming its simulation
+     */
+    decodeMessage(buffer) {
+        const view = new DataView(buffer);
+        if (view.getUint32(0, true) !== MAGIC_ROUTE) {
+            return this.decodeStateFrame(buffer, this.currentSim);
+        }
+        const sim = this.sims.get(view.getUint16(4, true));
+        if (!sim) {
+            return null;
+        }
+        // Copy so the float32 payload stays 4-byte aligned
+        return this.decodeStateFrame(buffer.slice(ROUTE_HEADER_BYTES), sim);
+    }
+
+    /**
+     * Decode a binary state frame (utils/state_frame.py)
+     * header: magic "DWQS" | version u16 | num_joints u16 | seq u32 | fields u32 | timestamp_ms f64
+     * payload: float32 base_pos[3], base_quat[4], joint_pos[n], joint_vel[n], only the fields set in the mask
+     */
+    decodeStateFrame(buffer, sim) {
+        const view = new DataView(buffer);
+        if (view.getUint32(0, true) === MAGIC_DELTA) {
+            return this.decodeDeltaFrame(view, sim);
+        }
+        const version = view.getUint16(4, true);
+        if (version !== STATE_FRAME_VERSION) {
+            throw new Error(`unsupported state frame version ${version}`);
+        }
+        const numJoints = view.getUint16(6, true);
+        const fields = view.getUint32(12, true);
+        const state = {
+            type: 'state',
+            seq: view.getUint32(8, true),
+            timestamp: view.getFloat64(16, true),
+            sim: sim ? sim.id : null,
+            joint_names: sim ? sim.jointNames : null
+        };
+        let offset = STATE_FRAME_HEADER_BYTES;
+        for (const [name, bit, size] of STATE_FRAME_FIELDS) {
+            if (fields & bit) {
+                const n = size(numJoints);
+                state[name] = new Float32Array(buffer, offset, n);
+                offset += n * 4;
+            } else {
+                state[name] = null;
+            }
+        }
+        return state;
+    }
+
+    /**
+     * Decode a quantized delta frame, null until the first keyframe arrives or when the
+     * frame refers to a keyframe this client did not receive
+     */
+    decodeDeltaFrame(view, sim) {
+        if (!sim || !sim.codec) {
+            return null;
+        }
+        const version = view.getUint8(4);
+        if (version !== DELTA_FRAME_VERSION) {
+            throw new Error(`unsupported delta frame version ${version}`);
+        }
+        const numJoints = view.getUint8(5);
+        const flags = view.getUint16(6, true);
+        const seq = view.getUint32(8, true);
+        const isKeyframe = (flags & DELTA_FLAG_KEYFRAME) !== 0;
+        const keySeq = (seq - view.getUint16(20, true)) >>> 0;
+        if (!isKeyframe && (!sim.keyframe || sim.keyframe.seq !== keySeq)) {
+            return null;
+        }
+        if (isKeyframe) {
+            sim.keyframe = { seq, values: {} };
+        }
+
+        const present = STATE_FRAME_FIELDS.filter(([, bit]) => flags & bit);
+        const state = {
+            type: 'state',
+            seq,
+            timestamp: view.getFloat64(12, true),
+            sim: sim.id,
+            joint_names: sim.jointNames,
+            base_pos: null,
+            base_quat: null,
+            joint_pos: null,
+            joint_vel: null
+        };
+        let offset = DELTA_FRAME_HEADER_BYTES + present.length;
+        present.forEach(([name, , size], field) => {
+            const n = size(numJoints);
+            const length = view.getUint8(DELTA_FRAME_HEADER_BYTES + field);
+            const values = new Float64Array(n);
+            // An empty segment means every value of the field is 0
+            for (let i = 0; i < n && length > 0; i++) {
+                // zigzag varint, up to 5 bytes; arithmetic instead of bit ops to stay above 32 bits
+                let u = 0;
+                let scale = 1;
+                let byte;
+                do {
+                    byte = view.getUint8(offset++);
+                    u += (byte & 0x7f) * scale;
+                    scale *= 128;
+                } while (byte & 0x80);
+                values[i] = u % 2 ? -(u + 1) / 2 : u / 2;
+            }
+            if (isKeyframe) {
+                sim.keyframe.values[name] = values.slice();
+            } else {
+                const key = sim.keyframe.values[name];
+                if (!key) {
+                    return;
+                }
+                for (let i = 0; i < n; i++) {
+                    values[i] += key[i];
+                }
+            }
+            const resolution = sim.codec.resolution[name];
+            for (let i = 0; i < n; i++) {
+                values[i] *= resolution;
+            }
+            state[name] = values;
+        });
+        return state;
+    }
+
+    notifyState(state) {
+        this.stateCallbacks.forEach(callback => {
+            try {
+                callback(state);
+            } catch (error) {
+                console.error('[WebSocket] Error in state callback:', error);
+            }
+        });
+    }
+
+    sendCommand(xVel, yVel, angVel, sim = this.commandSim) {
         if (this.ws && this.ws.readyState === WebSocket.OPEN) {
             const message = {
                 type: 'command',
+                id: ++this.commandSeq,
+                sim,
                 x_vel: xVel,
                 y_vel: yVel,
-                ang_vel: angVel
+                ang_vel: angVel,
+                // Press time, the server and the simulation add their own receive times
+                t_client: Date.now()
             };
 
             try {
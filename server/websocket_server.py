@@ -1,20 +1,350 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse, Response
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+import argparse
 import json
 import asyncio
-from typing import Set
+import os
+import re
+import threading
+import time
+from typing import Dict, Optional, Set
 import uvicorn
 
-app = FastAPI()
+from utils.mesh_assets import MeshAssetCache, negotiate
+from utils.profiler import StageProfiler
+from utils.state_archive import SUFFIX, ArchiveReader, StateArchive, list_archives, records_to_json
+from utils.state_codec import is_keyframe
+from utils.state_frame import ALL_FIELDS, FIELDS, field_mask, project, route
+
+
+class RelayMetrics:
+    """Relay-wide counters for /metrics
+
+    The counters are plain int attributes bumped on every frame. sample()
+    runs once a second and turns them into rates over the last
+    RATE_WINDOW seconds.
+    """
+
+    RATE_WINDOW = 5
+    RATE_COUNTERS = ("messages_in", "bytes_in", "messages_out", "bytes_out")
+
+    def __init__(self):
+        self.messages_in = 0
+        self.bytes_in = 0
+        self.messages_out = 0
+        self.bytes_out = 0
+        self.frames_dropped = 0
+        self.commands_forwarded = 0
+        # Time from receiving a command to handing it to the sim's socket
+        self.command_forward = StageProfiler(min_time=1e-6, max_time=10.0)
+        self.forward_stage = self.command_forward.stage("command_forward", thread="server")
+        self.rates = dict.fromkeys(self.RATE_COUNTERS, 0.0)
+        self._samples = deque(maxlen=self.RATE_WINDOW + 1)
+
+    def sample(self, now):
+        self._samples.append((now, [getattr(self, name) for name in self.RATE_COUNTERS]))
+        (t0, first), (t1, last) = self._samples[0], self._samples[-1]
+        if t1 > t0:
+            self.rates = {name: (b - a) / (t1 - t0) for name, a, b in zip(self.RATE_COUNTERS, first, last)}
+
+
+metrics = RelayMetrics()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    async def sample_metrics():
+        while True:
+            metrics.sample(time.monotonic())
+            await asyncio.sleep(1.0)
+
+    task = asyncio.create_task(sample_metrics())
+    # Converted once per source hash, later starts only hash the OBJ files
+    global mesh_build
+    mesh_build = asyncio.create_task(asyncio.to_thread(mesh_assets.build))
+    yield
+    task.cancel()
+
+
+app = FastAPI(lifespan=lifespan)
+
+# Frames queued per web client and subscribed simulation before the oldest are dropped
+CLIENT_QUEUE_SIZE = 4
+# Simulation used by sims and web clients that do not name one
+DEFAULT_SIM_ID = "default"
+# Directory the state stream of each sim connection is recorded to (utils.state_archive), None to disable
+RECORD_DIR = os.environ.get("DWQ_RECORD_DIR")
+# Upper bound on the records one /sessions request returns, larger ranges are decimated
+MAX_SESSION_RECORDS = 5000
+# Recordings kept open (memmapped) between /sessions requests, least recently used ones are closed
+MAX_OPEN_ARCHIVES = 16
+# OBJ meshes of the web visualizer and the directory their binary / precompressed versions are cached in
+MESH_SOURCE_DIR = "server/static/models/go2"
+MESH_CACHE_DIR = os.environ.get("DWQ_ASSET_CACHE", "server/.asset_cache")
+# Mesh URLs contain the content hash, so browsers may keep them forever
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+mesh_assets = MeshAssetCache(MESH_SOURCE_DIR, MESH_CACHE_DIR)
+# Background build started by lifespan, awaited by the mesh endpoints
+mesh_build: Optional[asyncio.Task] = None
+
+
+class ClientQueue:
+    """Bounded send queue and sender task of one web client
+
+    State frames go into a deque of maxlen CLIENT_QUEUE_SIZE per subscribed
+    simulation. When a client falls behind, the oldest frames are dropped
+    (latest wins), so the sim reader never waits on a slow browser. Control
+    messages (sim_info) use a separate queue and are never dropped.
+
+    A client may subscribe with a rate and a field set. Frames above the
+    rate are skipped before they are queued, and binary frames are cut
+    down to the subscribed fields (utils.state_frame.project). The rate
+    applies to each subscribed simulation separately.
+
+    A client subscribed to several simulations gets binary frames with a
+    route header (utils.state_frame.route) carrying the sim's channel, and
+    JSON states with a "sim" key.
+
+    With the delta codec (utils.state_codec) every frame refers to the
+    last keyframe of its simulation. Keyframes bypass the rate limit and
+    are held in their own slot per simulation. A new keyframe replaces the
+    pending one, and for single-sim clients clears the older frames queued
+    behind it.
+    """
+
+    def __init__(self, websocket: WebSocket, maxlen: int = CLIENT_QUEUE_SIZE):
+        self.websocket = websocket
+        self.frames = deque(maxlen=maxlen)
+        self.control = deque()
+        self.keyframes = {}
+        self.ready = asyncio.Event()
+        self.sent = 0
+        self.dropped = 0
+        self.skipped = 0
+        self.bytes_sent = 0
+        self.rate = None
+        self.fields = ALL_FIELDS
+        self.sims = []
+        self.tagged = False
+        self._period = 0.0
+        self._next_time = {}
+        self.task = asyncio.create_task(self._run())
+
+    def subscribe(self, rate=None, fields=None):
+        """rate: max state messages per second, None for every message; fields: names, None for all"""
+        self.rate = float(rate) if rate else None
+        self._period = 1.0 / self.rate if self.rate else 0.0
+        self._next_time.clear()
+        self.fields = field_mask(fields) if fields else ALL_FIELDS
+
+    def set_sims(self, sim_ids):
+        """Called by subscribe_sims(), sizes the frame queue for the number of simulations"""
+        self.sims = list(sim_ids)
+        self.tagged = len(self.sims) > 1
+        self.frames = deque(self.frames, maxlen=CLIENT_QUEUE_SIZE * max(len(self.sims), 1))
+        self._next_time = {sim_id: t for sim_id, t in self._next_time.items() if sim_id in self.sims}
+
+    def due(self, now, sim_id):
+        """Rate decimation, called once per state message before projecting it"""
+        next_time = self._next_time.get(sim_id, 0.0)
+        if now < next_time:
+            self.skipped += 1
+            return False
+        # Keep the schedule on a fixed grid so jitter does not lower the rate, restart it after a gap
+        next_time += self._period
+        if next_time < now:
+            next_time = now + self._period
+        self._next_time[sim_id] = next_time
+        return True
+
+    def put(self, message):
+        if len(self.frames) == self.frames.maxlen:
+            self.dropped += 1
+            metrics.frames_dropped += 1
+        self.frames.append(message)
+        self.ready.set()
+
+    def put_keyframe(self, frame, sim_id=DEFAULT_SIM_ID):
+        dropped = self.keyframes.pop(sim_id, None) is not None
+        if not self.tagged:
+            dropped += len(self.frames)
+            self.frames.clear()
+        self.dropped += dropped
+        metrics.frames_dropped += dropped
+        self.keyframes[sim_id] = frame
+        self.ready.set()
+
+    def put_control(self, message):
+        self.control.append(message)
+        self.ready.set()
+
+    async def _run(self):
+        try:
+            while True:
+                await self.ready.wait()
+                self.ready.clear()
+                while self.control or self.keyframes or self.frames:
+                    if self.control:
+                        message = self.control.popleft()
+                    elif self.keyframes:
+                        message = self.keyframes.pop(next(iter(self.keyframes)))
+                    else:
+                        message = self.frames.popleft()
+                    if isinstance(message, bytes):
+                        await self.websocket.send_bytes(message)
+                    else:
+                        await self.websocket.send_text(message)
+                    self.sent += 1
+                    self.bytes_sent += len(message)
+                    metrics.messages_out += 1
+                    metrics.bytes_out += len(message)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Send failed, stop routing frames to this client, the receive loop handles the disconnect
+            remove_client(self.websocket)
+
+    def close(self):
+        self.task.cancel()
+
+    def queued(self):
+        return len(self.frames) + len(self.keyframes)
+
+    def stats(self):
+        return {"sims": self.sims, "rate": self.rate, "fields": self.fields, "sent": self.sent,
+                "bytes_sent": self.bytes_sent, "skipped": self.skipped, "dropped": self.dropped,
+                "queued": self.queued()}
+
+
+class SimChannel:
+    """One connected simulation and the web clients subscribed to it
+
+    State messages of the simulation are fanned out to its own subscriber
+    set only, so routing never scans the clients of other simulations.
+    """
+
+    def __init__(self, sim_id, websocket: WebSocket, channel, state_frame):
+        self.sim_id = sim_id
+        self.websocket = websocket
+        self.channel = channel
+        # Handshake (joint names, state frame layout), sent once to each subscriber
+        self.info = json.dumps({"type": "sim_info", "sim_id": sim_id, "channel": channel,
+                                "state_frame": state_frame})
+        # Shared with subscribers[sim_id], which outlives the connection
+        self.subscribers = subscribers.setdefault(sim_id, set())
+        # Latest keyframe of the delta codec, sent to web clients that join between keyframes
+        self.latest_keyframe = None
+        # Command latency histograms reported by the simulation (WebSocketBridge.command_latency)
+        self.command_latency = None
+        self.commands_forwarded = 0
+        self.messages = 0
+        self.bytes_in = 0
+        # Scheduler stats and state frame counts pushed by the simulation (WebSocketBridge sim_metrics)
+        self.metrics = None
+        # Recording of the state stream, written by a background thread
+        self.archive = StateArchive(RECORD_DIR, sim_id, state_frame) if RECORD_DIR else None
+
+    def broadcast(self, message):
+        """Queue a state message for every subscriber, never blocks
+
+        Each distinct field set is projected once per message and shared by
+        all clients subscribed to it, as is the routed copy for clients of
+        several simulations. Legacy JSON messages are only decimated.
+        """
+        self.messages += 1
+        self.bytes_in += len(message)
+        metrics.messages_in += 1
+        metrics.bytes_in += len(message)
+        if self.archive is not None:
+            self.archive.append(message)
+        now = time.monotonic()
+        binary = isinstance(message, bytes)
+        key = binary and is_keyframe(message)
+        if key:
+            self.latest_keyframe = message
+        projected = {(ALL_FIELDS, False): message}
+        for queue in self.subscribers:
+            if not (key or queue.due(now, self.sim_id)):
+                continue
+            cache_key = (queue.fields, queue.tagged)
+            frame = projected.get(cache_key)
+            if frame is None:
+                frame = projected[cache_key] = self.tag(
+                    project(message, queue.fields) if binary else message, queue.tagged)
+            if key:
+                queue.put_keyframe(frame, self.sim_id)
+            else:
+                queue.put(frame)
+
+    def tag(self, message, tagged):
+        if not tagged:
+            return message
+        if isinstance(message, bytes):
+            return route(message, self.channel)
+        return json.dumps({**json.loads(message), "sim": self.sim_id})
+
+    def add_subscriber(self, queue):
+        queue.put_control(self.info)
+        if self.latest_keyframe is not None:
+            queue.put_keyframe(self.tag(project(self.latest_keyframe, queue.fields), queue.tagged), self.sim_id)
+
+    def stats(self):
+        return {"sim_id": self.sim_id, "channel": self.channel, "subscribers": len(self.subscribers),
+                "messages": self.messages, "commands_forwarded": self.commands_forwarded,
+                "command_latency": self.command_latency, "metrics": self.metrics,
+                "archive": self.archive.stats() if self.archive is not None else None}
+
 
 # Connected clients
-web_clients: Set[WebSocket] = set()
-sim_client: WebSocket = None
+web_clients: Dict[WebSocket, ClientQueue] = {}
+# Connected simulations by id
+sims: Dict[str, SimChannel] = {}
+# Web clients subscribed to each sim id, also for sims that are not connected (yet)
+subscribers: Dict[str, Set[ClientQueue]] = {}
+next_channel = 0
+
+
+def subscribe_sims(queue, sim_ids):
+    """Move a web client to the subscriber sets of sim_ids"""
+    sim_ids = list(dict.fromkeys(sim_ids))
+    for sim_id in queue.sims:
+        if sim_id not in sim_ids:
+            unsubscribe(queue, sim_id)
+    new = [sim_id for sim_id in sim_ids if sim_id not in queue.sims]
+    queue.set_sims(sim_ids)
+    for sim_id in new:
+        subscribers.setdefault(sim_id, set()).add(queue)
+        if sim_id in sims:
+            sims[sim_id].add_subscriber(queue)
+
+
+def unsubscribe(queue, sim_id):
+    members = subscribers.get(sim_id)
+    if members is None:
+        return
+    members.discard(queue)
+    queue.keyframes.pop(sim_id, None)
+    if not members and sim_id not in sims:
+        del subscribers[sim_id]
+
+
+def remove_client(websocket):
+    """Forget a web client, safe to call more than once"""
+    queue = web_clients.pop(websocket, None)
+    if queue is None:
+        return None
+    for sim_id in queue.sims:
+        unsubscribe(queue, sim_id)
+    return queue
+
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    global sim_client
+    global next_channel
     await websocket.accept()
 
     try:
@@ -23,49 +353,331 @@ async def websocket_endpoint(websocket: WebSocket):
         msg = json.loads(data)
 
         if msg.get("type") == "sim_connect":
-            sim_client = websocket
-            print("Simulation connected")
+            sim_id = msg.get("sim_id") or DEFAULT_SIM_ID
+            if sim_id in sims:
+                # A second sim with the same id would silently take over the stream
+                await websocket.send_text(json.dumps(
+                    {"type": "error", "message": f"simulation '{sim_id}' is already connected"}))
+                await websocket.close(code=1008)
+                return
+            sim = SimChannel(sim_id, websocket, next_channel, msg.get("state_frame"))
+            next_channel = (next_channel + 1) & 0xFFFF
+            sims[sim_id] = sim
+            print(f"Simulation '{sim_id}' connected. Total: {len(sims)}")
+            for queue in sim.subscribers:
+                sim.add_subscriber(queue)
 
             # Handle simulation messages
-            while True:
-                data = await websocket.receive_text()
-                msg = json.loads(data)
+            try:
+                while True:
+                    message = await websocket.receive()
+                    if message["type"] == "websocket.disconnect":
+                        raise WebSocketDisconnect(message.get("code", 1000))
+
+                    # Binary state frames are forwarded as-is, without parsing
+                    frame = message.get("bytes")
+                    if frame is not None:
+                        sim.broadcast(frame)
+                        continue
 
-                # Broadcast state to all web clients
-                if msg.get("type") == "state":
-                    disconnected = set()
-                    for client in web_clients:
-                        try:
-                            await client.send_text(data)
-                        except:
-                            disconnected.add(client)
-                    web_clients.difference_update(disconnected)
+                    # Legacy JSON state messages
+                    data = message.get("text")
+                    msg = json.loads(data)
+                    if msg.get("type") == "state":
+                        sim.broadcast(data)
+                    elif msg.get("type") == "command_latency":
+                        sim.command_latency = msg.get("stages")
+                    elif msg.get("type") == "sim_metrics":
+                        sim.metrics = msg
+            finally:
+                del sims[sim_id]
+                if sim.archive is not None:
+                    await asyncio.to_thread(sim.archive.close)
+                disconnect = json.dumps({"type": "sim_disconnect", "sim_id": sim_id})
+                for queue in sim.subscribers:
+                    queue.put_control(disconnect)
+                if not sim.subscribers:
+                    subscribers.pop(sim_id, None)
+                print(f"Simulation '{sim_id}' disconnected. Total: {len(sims)}")
 
         else:
             # Web client
-            web_clients.add(websocket)
+            queue = ClientQueue(websocket)
+            web_clients[websocket] = queue
             print(f"Web client connected. Total: {len(web_clients)}")
+            subscribe_sims(queue, [DEFAULT_SIM_ID])
 
             # Handle web client messages
             while True:
                 data = await websocket.receive_text()
+                received = time.perf_counter()
                 msg = json.loads(data)
 
-                # Forward commands to simulation
-                if msg.get("type") == "command" and sim_client:
+                # Per-client simulations, stream rate and field set
+                if msg.get("type") == "subscribe":
+                    try:
+                        queue.subscribe(msg.get("rate"), msg.get("fields"))
+                        sim_ids = msg.get("sims")
+                        if sim_ids is not None:
+                            subscribe_sims(queue, [sim_ids] if isinstance(sim_ids, str) else sim_ids)
+                    except (TypeError, ValueError) as e:
+                        queue.put_control(json.dumps({"type": "error", "message": str(e)}))
+
+                # Forward commands to the addressed simulation, default the client's first one,
+                # stamped with the server receive time
+                elif msg.get("type") == "command":
+                    sim = sims.get(msg.get("sim") or (queue.sims[0] if queue.sims else DEFAULT_SIM_ID))
+                    if sim is None:
+                        continue
+                    msg["t_server"] = time.time() * 1000
                     try:
-                        await sim_client.send_text(data)
+                        await sim.websocket.send_text(json.dumps(msg))
+                        sim.commands_forwarded += 1
+                        metrics.commands_forwarded += 1
+                        metrics.command_forward.record(metrics.forward_stage, received, time.perf_counter())
                     except:
                         pass
 
     except WebSocketDisconnect:
-        if websocket == sim_client:
-            sim_client = None
-            print("Simulation disconnected")
-        else:
-            web_clients.discard(websocket)
+        queue = remove_client(websocket)
+        if queue is not None:
+            queue.close()
+            if queue.dropped:
+                print(f"Web client dropped {queue.dropped}/{queue.sent + queue.dropped} frames")
             print(f"Web client disconnected. Total: {len(web_clients)}")
 
+
+@app.get("/stats")
+async def get_stats():
+    """Per-sim stream and command latency stats, per-client sent/dropped/queued frame counts"""
+    return {
+        "sims": [sim.stats() for sim in sims.values()],
+        "clients": [
+            {"client": f"{ws.client.host}:{ws.client.port}" if ws.client else None, **queue.stats()}
+            for ws, queue in web_clients.items()
+        ],
+    }
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _metric(lines, name, kind, help_text, samples):
+    """Append one metric in the Prometheus text format; samples: (labels dict, value) or a bare value"""
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {kind}")
+    if not isinstance(samples, list):
+        samples = [({}, samples)]
+    for labels, value in samples:
+        if value is None:
+            continue
+        label_text = ",".join(f'{key}="{_label(val)}"' for key, val in labels.items())
+        lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+
+def _summary(lines, name, help_text, stages):
+    """StageProfiler.stats() entries as a Prometheus summary in seconds; stages: (labels, stats)"""
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} summary")
+    for labels, stats in stages:
+        base = ",".join(f'{key}="{_label(val)}"' for key, val in labels.items())
+        for quantile, key in (("0.5", "p50_ms"), ("0.95", "p95_ms"), ("0.99", "p99_ms")):
+            label_text = f'{base},quantile="{quantile}"' if base else f'quantile="{quantile}"'
+            lines.append(f"{name}{{{label_text}}} {stats[key] / 1000}")
+        suffix = f"{{{base}}}" if base else ""
+        lines.append(f"{name}_sum{suffix} {stats['total_s']}")
+        lines.append(f"{name}_count{suffix} {stats['count']}")
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Relay and simulation metrics in the Prometheus text format"""
+    lines = []
+    rates = metrics.rates
+    _metric(lines, "dwq_messages_in_total", "counter", "State messages received from simulations",
+            metrics.messages_in)
+    _metric(lines, "dwq_messages_out_total", "counter", "Messages sent to web clients", metrics.messages_out)
+    _metric(lines, "dwq_bytes_in_total", "counter", "State bytes received from simulations", metrics.bytes_in)
+    _metric(lines, "dwq_bytes_out_total", "counter", "Bytes sent to web clients", metrics.bytes_out)
+    for name in RelayMetrics.RATE_COUNTERS:
+        _metric(lines, f"dwq_{name}_per_second", "gauge",
+                f"{name.replace('_', ' ')} per second over the last {RelayMetrics.RATE_WINDOW}s", rates[name])
+    _metric(lines, "dwq_frames_dropped_total", "counter", "Frames dropped from web client queues",
+            metrics.frames_dropped)
+    _metric(lines, "dwq_web_clients", "gauge", "Connected web clients", len(web_clients))
+    _metric(lines, "dwq_sims", "gauge", "Connected simulations", len(sims))
+
+    clients = [({"client": f"{ws.client.host}:{ws.client.port}" if ws.client else "unknown"}, queue)
+               for ws, queue in web_clients.items()]
+    _metric(lines, "dwq_client_queue_depth", "gauge", "Frames waiting in a web client's queue",
+            [(labels, queue.queued()) for labels, queue in clients])
+    _metric(lines, "dwq_client_dropped_total", "counter", "Frames dropped for a web client",
+            [(labels, queue.dropped) for labels, queue in clients])
+    _metric(lines, "dwq_client_sent_total", "counter", "Messages sent to a web client",
+            [(labels, queue.sent) for labels, queue in clients])
+
+    _metric(lines, "dwq_commands_forwarded_total", "counter", "Commands forwarded to simulations",
+            metrics.commands_forwarded)
+    forward = metrics.command_forward.stats().get("command_forward")
+    _summary(lines, "dwq_command_forward_seconds", "Time from receiving a command to sending it to the sim",
+             [({}, forward)] if forward else [])
+
+    sim_labels = [({"sim": sim.sim_id}, sim) for sim in sims.values()]
+    _metric(lines, "dwq_sim_messages_in_total", "counter", "State messages received from a simulation",
+            [(labels, sim.messages) for labels, sim in sim_labels])
+    _metric(lines, "dwq_sim_bytes_in_total", "counter", "State bytes received from a simulation",
+            [(labels, sim.bytes_in) for labels, sim in sim_labels])
+    reported = [(labels, sim.metrics) for labels, sim in sim_labels if sim.metrics]
+    for name, kind, key, scale, help_text in (
+            ("dwq_sim_real_time_factor", "gauge", "recent_real_time_factor", 1, "Sim time / wall time over the last report interval"),
+            ("dwq_sim_real_time_factor_average", "gauge", "real_time_factor", 1, "Sim time / wall time since the run started"),
+            ("dwq_sim_steps_total", "counter", "steps", 1, "Physics steps of the current run"),
+            ("dwq_sim_overruns_total", "counter", "overruns", 1, "Steps that missed their deadline"),
+            ("dwq_sim_resyncs_total", "counter", "resyncs", 1, "Times the scheduler gave up catching up"),
+            ("dwq_sim_max_lateness_seconds", "gauge", "max_lateness_ms", 1e-3, "Worst step deadline miss"),
+            ("dwq_sim_mean_step_seconds", "gauge", "mean_step_ms", 1e-3, "Mean work time per physics step")):
+        _metric(lines, name, kind, help_text,
+                [(labels, m["scheduler"][key] * scale) for labels, m in reported
+                 if m.get("scheduler", {}).get(key) is not None])
+    _metric(lines, "dwq_sim_state_frames_coalesced_total", "counter",
+            "State frames the sim's bridge overwrote before sending",
+            [(labels, m["state_frames"]["coalesced"]) for labels, m in reported if m.get("state_frames")])
+    _summary(lines, "dwq_command_latency_seconds", "Command latency stages reported by the simulation",
+             [({**labels, "stage": stage}, stats) for labels, sim in sim_labels
+              for stage, stats in (sim.command_latency or {}).items()])
+    return "\n".join(lines) + "\n"
+
+
+@app.get("/sims")
+async def get_sims():
+    """Ids of the connected simulations"""
+    return list(sims)
+
+# Open recordings by session name in LRU order, remapped on each request while they grow.
+# The /sessions handlers run in the threadpool, so the cache is shared between threads: it is only
+# touched under archive_lock, and requests read from a snapshot of the reader. Evicted readers are
+# dropped rather than closed, their memmaps are unmapped once the last snapshot is released.
+archive_readers: "OrderedDict[str, ArchiveReader]" = OrderedDict()
+archive_lock = threading.Lock()
+
+
+def open_archive(session, cache=True):
+    """Snapshot of a recording's reader, refreshed to its current length; cache=False opens one without caching it"""
+    if not RECORD_DIR or not re.fullmatch(r"[A-Za-z0-9_-]+", session):
+        raise HTTPException(status_code=404, detail=f"unknown session '{session}'")
+    with archive_lock:
+        reader = archive_readers.get(session)
+        if reader is not None:
+            archive_readers.move_to_end(session)
+            reader.refresh()
+            return reader.snapshot()
+    path = os.path.join(RECORD_DIR, session + SUFFIX)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail=f"unknown session '{session}'")
+    reader = ArchiveReader(path)
+    if not cache:
+        return reader
+    with archive_lock:
+        # Another request may have opened it meanwhile, keep the cached one
+        cached = archive_readers.setdefault(session, reader)
+        archive_readers.move_to_end(session)
+        while len(archive_readers) > MAX_OPEN_ARCHIVES:
+            archive_readers.popitem(last=False)
+        return cached.snapshot()
+
+
+def archive_response(reader, records, step, fields, fmt):
+    """JSON columns with t relative to the session start, or the raw records for format=bin"""
+    try:
+        mask = field_mask(fields.split(",")) if fields else ALL_FIELDS
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if fmt == "bin":
+        return Response(records.tobytes(), media_type="application/octet-stream",
+                        headers={"X-Record-Dtype": json.dumps(reader.dtype.descr), "X-Step": str(step)})
+    names = [name for name, bit in FIELDS.items() if mask & bit]
+    return {"session": reader.summary()["session"], "step": step, "count": len(records),
+            **records_to_json(records, names, origin=reader.start)}
+
+
+# The /sessions handlers are plain functions: FastAPI runs them in its threadpool, so memmap reads of a
+# long recording do not stall the relay and broadcast loops
+@app.get("/sessions")
+def get_sessions():
+    """Recorded sessions, see RECORD_DIR; listing them does not evict the cached readers"""
+    summaries = []
+    for path in list_archives(RECORD_DIR):
+        session = os.path.basename(path)[:-len(SUFFIX)]
+        with archive_lock:
+            cached = session in archive_readers
+        reader = open_archive(session, cache=cached)
+        summaries.append(reader.summary())
+        if not cached:
+            reader.close()
+    return summaries
+
+
+@app.get("/sessions/{session}")
+def get_session_range(session: str, start: float = 0.0, end: Optional[float] = None,
+                      limit: int = MAX_SESSION_RECORDS, fields: Optional[str] = None, format: str = "json"):
+    """Records received between start and end [s after the session start], decimated to at most limit"""
+    reader = open_archive(session)
+    origin = reader.start
+    records, step = reader.range(origin + start, origin + end if end is not None else float("inf"),
+                                 limit=min(max(limit, 1), MAX_SESSION_RECORDS))
+    return archive_response(reader, records, step, fields, format)
+
+
+@app.get("/sessions/{session}/overview")
+def get_session_overview(session: str, points: int = 500, fields: Optional[str] = None,
+                         format: str = "json"):
+    """About points records evenly spread over the whole session"""
+    reader = open_archive(session)
+    records, step = reader.overview(min(max(points, 1), MAX_SESSION_RECORDS))
+    return archive_response(reader, records, step, fields, format)
+
+async def mesh_manifest():
+    if mesh_build is not None:
+        await mesh_build
+    return mesh_assets.manifest
+
+
+def _etag_matches(request, etag):
+    header = request.headers.get("if-none-match")
+    return header is not None and (header.strip() == "*" or etag in [t.strip() for t in header.split(",")])
+
+
+@app.get("/meshes/manifest.json")
+async def get_mesh_manifest(request: Request):
+    """Mesh name -> content-hashed file, revalidated on every page load (304 while unchanged)"""
+    manifest = await mesh_manifest()
+    etag = f'"{mesh_assets.manifest_etag}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(json.dumps({"version": 1, "meshes": manifest}), media_type="application/json",
+                    headers=headers)
+
+
+@app.get("/meshes/{file_name}")
+async def get_mesh(file_name: str, request: Request):
+    """A binary mesh (utils.mesh_assets), the precompressed variant the client accepts, cached forever"""
+    await mesh_manifest()
+    entry = mesh_assets.lookup(file_name)
+    if entry is None:
+        raise HTTPException(status_code=404, detail=f"unknown mesh '{file_name}'")
+    encoding = negotiate(request.headers.get("accept-encoding"))
+    # Each encoding is its own representation and gets its own strong ETag
+    etag = f'"{entry["hash"]}-{encoding}"' if encoding else f'"{entry["hash"]}"'
+    headers = {"ETag": etag, "Cache-Control": IMMUTABLE, "Vary": "Accept-Encoding"}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return FileResponse(mesh_assets.path(entry, encoding), media_type="application/octet-stream",
+                        headers=headers)
+
 # Serve static files
 app.mount("/static", StaticFiles(directory="server/static"), name="static")
 app.mount("/assets", StaticFiles(directory="robotics/go2/assets"), name="assets")
@@ -75,4 +687,9 @@ async def get_index():
     return FileResponse("server/index.html")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--record-dir", default=RECORD_DIR,
+                        help="record each simulation's state stream to this directory (or set DWQ_RECORD_DIR)")
+    args = parser.parse_args()
+    RECORD_DIR = args.record_dir
     uvicorn.run(app, host="0.0.0.0", port=8000)
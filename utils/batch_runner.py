@@ -0,0 +1,238 @@
+import time
+import mujoco
+import numpy as np
+
+from utils.easy_math import get_gravity_orientation_batch, quat_rotate_inverse_batch
+from utils.obs_history import ObsHistory
+from utils.policy_registry import load_policy
+
+
+class BatchResult:
+    """批量仿真的结果
+
+    trajectories: 每个控制周期记录一次，数组形状为 (T, N, ...)
+    metrics: 每个环境一个值，数组形状为 (N,)
+    summary: 所有环境汇总后的标量
+    """
+
+    def __init__(self, trajectories, metrics, summary):
+        self.trajectories = trajectories
+        self.metrics = metrics
+        self.summary = summary
+
+    def save(self, path):
+        arrays = {f"traj_{k}": v for k, v in self.trajectories.items()}
+        arrays.update({f"metric_{k}": v for k, v in self.metrics.items()})
+        np.savez_compressed(path, **arrays)
+
+
+class BatchedRunner:
+    """在同一个 MjModel 上并行推进 N 个 MjData 的无界面运行器
+
+    每个控制周期为所有环境构建一行观测，并对 (N, num_observations) 只做一次策略前向。
+    """
+
+    def __init__(self, cfg, num_envs, model_path=None, seed=0,
+                 init_pos_noise=0.0, init_yaw_noise=0.0, warmup_time=0.5,
+                 fall_tilt=0.5):
+        """
+        Args:
+            cfg: Sim2simCfg
+            num_envs: 并行环境数量
+            model_path: MuJoCo 场景文件，默认使用 cfg.sim_config.mujoco_model_path
+            seed: 初始状态扰动的随机种子
+            init_pos_noise: 初始 xy 位置的均匀扰动范围 [m]
+            init_yaw_noise: 初始偏航角的均匀扰动范围 [rad]
+            warmup_time: 策略启动前零力矩下落的仿真时间 [s]
+            fall_tilt: projected gravity 的 z 分量大于 -fall_tilt 时判定为摔倒
+        """
+        self.cfg = cfg
+        self.num_envs = num_envs
+        self.model = mujoco.MjModel.from_xml_path(model_path or cfg.sim_config.mujoco_model_path)
+        self.model.opt.timestep = cfg.sim_config.dt
+        self.datas = [mujoco.MjData(self.model) for _ in range(num_envs)]
+        self.rng = np.random.default_rng(seed)
+        self.init_pos_noise = init_pos_noise
+        self.init_yaw_noise = init_yaw_noise
+        self.warmup_steps = int(round(warmup_time / cfg.sim_config.dt))
+        self.fall_tilt = fall_tilt
+        self.policy = load_policy(cfg)
+
+        base_body = mujoco.mj_name2id(self.model, mujoco.mjtObj.mjOBJ_BODY, "base_link")
+        self.base_geoms = np.flatnonzero(self.model.geom_bodyid == base_body)
+
+        nq, nv = self.model.nq, self.model.nv
+        self.qpos = np.zeros((num_envs, nq))
+        self.qvel = np.zeros((num_envs, nv))
+        self.tau = np.zeros((num_envs, cfg.env.num_actions))
+
+    def reset(self):
+        for data in self.datas:
+            mujoco.mj_resetData(self.model, data)
+            if self.init_pos_noise > 0:
+                data.qpos[0:2] += self.rng.uniform(-self.init_pos_noise, self.init_pos_noise, 2)
+            if self.init_yaw_noise > 0:
+                yaw = self.rng.uniform(-self.init_yaw_noise, self.init_yaw_noise)
+                data.qpos[3:7] = [np.cos(yaw / 2), 0.0, 0.0, np.sin(yaw / 2)]
+            mujoco.mj_step(self.model, data)
+            for _ in range(self.warmup_steps):
+                mujoco.mj_step(self.model, data)
+
+    def _gather_state(self):
+        for i, data in enumerate(self.datas):
+            self.qpos[i] = data.qpos
+            self.qvel[i] = data.qvel
+
+    def _base_contact(self, data):
+        if data.ncon == 0:
+            return False
+        contacts = data.contact[:data.ncon]
+        return bool(np.isin(contacts.geom1, self.base_geoms).any()
+                    or np.isin(contacts.geom2, self.base_geoms).any())
+
+    def run(self, commands, duration):
+        """运行 duration 秒仿真时间
+
+        Args:
+            commands: (N, 3) 的固定速度命令，或 callable(t) -> (N, 3)
+            duration: 仿真时长 [s]
+
+        Returns:
+            BatchResult
+        """
+        cfg = self.cfg
+        N = self.num_envs
+        num_actions = cfg.env.num_actions
+        num_single_obs = cfg.env.num_single_obs
+        decimation = cfg.sim_config.decimation
+        dt = cfg.sim_config.dt
+        kps = cfg.robot_config.kps
+        kds = cfg.robot_config.kds
+        default_angles = cfg.robot_config.default_angles
+        obs_scales = cfg.normalization.obs_scales
+        cmd_scale = cfg.normalization.cmd_scale
+
+        if callable(commands):
+            command_fn = commands
+        else:
+            fixed = np.broadcast_to(np.asarray(commands, dtype=np.double), (N, 3))
+            command_fn = lambda t: fixed
+
+        num_steps = int(round(duration / dt))
+        num_ticks = num_steps // decimation
+
+        self.reset()
+
+        action = np.zeros((N, num_actions), dtype=np.double)
+        target_q = np.zeros((N, num_actions), dtype=np.double)
+        target_vel = np.zeros((N, num_actions), dtype=np.double)
+        obs = np.zeros((N, num_single_obs), dtype=np.float32)
+        obs_history = ObsHistory(num_single_obs, cfg.env.frame_stack, num_envs=N)
+        gravity = np.zeros((N, 3))
+        cmd = np.zeros((N, 3))
+
+        traj = {
+            "time": np.zeros(num_ticks),
+            "cmd": np.zeros((num_ticks, N, 3)),
+            "base_pos": np.zeros((num_ticks, N, 3)),
+            "base_quat": np.zeros((num_ticks, N, 4)),
+            "base_lin_vel": np.zeros((num_ticks, N, 3)),
+            "base_ang_vel": np.zeros((num_ticks, N, 3)),
+            "dof_pos": np.zeros((num_ticks, N, num_actions)),
+            "dof_vel": np.zeros((num_ticks, N, num_actions)),
+            "action": np.zeros((num_ticks, N, num_actions)),
+        }
+        energy = np.zeros(N)
+        alive_steps = np.zeros(N, dtype=np.int64)
+        fallen = np.zeros(N, dtype=bool)
+        fall_time = np.full(N, np.nan)
+
+        tick = 0
+        start = time.perf_counter()
+        for count_lowlevel in range(1, num_steps + 1):
+            self._gather_state()
+            qj = self.qpos[:, 7:]
+            dqj = self.qvel[:, 6:]
+
+            if count_lowlevel % decimation == 0 and tick < num_ticks:
+                t = count_lowlevel * dt
+                quat = self.qpos[:, 3:7]
+                omega = self.qvel[:, 3:6]
+                cmd[:] = command_fn(t)
+                get_gravity_orientation_batch(quat, out=gravity)
+
+                obs[:, :3] = cmd * cmd_scale
+                obs[:, 3:6] = omega * obs_scales.ang_vel
+                obs[:, 6:9] = gravity
+                obs[:, 9:9 + num_actions] = qj - default_angles
+                obs[:, 9 + num_actions:9 + num_actions * 2] = dqj * obs_scales.dof_vel
+                obs[:, 9 + num_actions * 2:9 + num_actions * 3] = action
+
+                obs_history.push(obs)
+                actor_input = obs_history.tensor
+
+                action = self.policy(actor_input).astype(np.double)
+                target_q = default_angles + action * cfg.control.action_scale
+
+                newly_fallen = ~fallen & (gravity[:, 2] > -self.fall_tilt)
+                for i in np.flatnonzero(~fallen & ~newly_fallen):
+                    if self._base_contact(self.datas[i]):
+                        newly_fallen[i] = True
+                fall_time[newly_fallen] = t
+                fallen |= newly_fallen
+
+                traj["time"][tick] = t
+                traj["cmd"][tick] = cmd
+                traj["base_pos"][tick] = self.qpos[:, 0:3]
+                traj["base_quat"][tick] = quat
+                traj["base_lin_vel"][tick] = quat_rotate_inverse_batch(quat, self.qvel[:, 0:3])
+                traj["base_ang_vel"][tick] = omega
+                traj["dof_pos"][tick] = qj
+                traj["dof_vel"][tick] = dqj
+                traj["action"][tick] = action
+                tick += 1
+
+            np.multiply(target_q - qj, kps, out=self.tau)
+            self.tau += (target_vel - dqj) * kds
+
+            power = np.abs(self.tau * dqj).sum(axis=1)
+            energy[~fallen] += power[~fallen]
+            alive_steps[~fallen] += 1
+
+            for i, data in enumerate(self.datas):
+                data.ctrl[:] = self.tau[i]
+                mujoco.mj_step(self.model, data)
+        wall_time = time.perf_counter() - start
+
+        metrics = self._compute_metrics(traj, fallen, fall_time, energy, alive_steps)
+        summary = {
+            "num_envs": N,
+            "sim_time": num_steps * dt,
+            "wall_time": wall_time,
+            "sim_seconds_per_wall_second": N * num_steps * dt / wall_time,
+            "fall_rate": float(fallen.mean()),
+            "lin_vel_tracking_error": float(np.nanmean(metrics["lin_vel_tracking_error"])),
+            "ang_vel_tracking_error": float(np.nanmean(metrics["ang_vel_tracking_error"])),
+            "mean_power": float(np.nanmean(metrics["mean_power"])),
+        }
+        return BatchResult(traj, metrics, summary)
+
+    def _compute_metrics(self, traj, fallen, fall_time, energy, alive_steps):
+        # 摔倒之后的数据不计入跟踪误差
+        alive = np.isnan(fall_time)[None, :] | (traj["time"][:, None] < fall_time[None, :])
+        lin_err = np.sum((traj["base_lin_vel"][:, :, :2] - traj["cmd"][:, :, :2]) ** 2, axis=2)
+        ang_err = (traj["base_ang_vel"][:, :, 2] - traj["cmd"][:, :, 2]) ** 2
+        num_alive = alive.sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            lin_rmse = np.sqrt(np.where(alive, lin_err, 0.0).sum(axis=0) / num_alive)
+            ang_rmse = np.sqrt(np.where(alive, ang_err, 0.0).sum(axis=0) / num_alive)
+            mean_power = energy / alive_steps
+        travelled = traj["base_pos"][-1, :, :2] - traj["base_pos"][0, :, :2]
+        return {
+            "lin_vel_tracking_error": lin_rmse,
+            "ang_vel_tracking_error": ang_rmse,
+            "mean_power": mean_power,
+            "fallen": fallen,
+            "fall_time": fall_time,
+            "distance": np.linalg.norm(travelled, axis=1),
+        }
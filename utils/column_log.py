@@ -0,0 +1,394 @@
+import json
+import os
+import re
+import struct
+import time
+import zlib
+from itertools import islice
+
+import numpy as np
+
+MAGIC = b"DWQCLOG\0"
+VERSION = 1
+# magic, 版本, metadata 长度；与 utils/session_recorder.py 相同，第一块从 ALIGN 的整数倍开始
+_HEADER = struct.Struct("<8sII")
+ALIGN = 64
+# 每块的头: 标记, 行数, 第一行和最后一行的时间；之后是每列压缩后的字节数 (u4)，再之后是各列数据
+_CHUNK = struct.Struct("<4sIdd")
+CHUNK_MARK = b"CHNK"
+# 文件尾: 时间索引的偏移, 块数, 标记；正常 close() 后才有，没有时读取端扫描各块的头重建索引
+_TRAILER = struct.Struct("<QQ8s")
+TRAILER_MAGIC = b"DWQCEND\0"
+SUFFIX = ".dwql"
+# CSV 表头中带下标的列名，q_0 或 q[0]
+_INDEXED = re.compile(r"^(.+?)(?:_(\d+)|\[(\d+)\])$")
+
+
+def index_dtype(num_columns):
+    """时间索引每块一项，与块头的内容相同，另加块在文件中的偏移"""
+    return np.dtype([("offset", "<u8"), ("rows", "<u4"), ("t0", "<f8"), ("t1", "<f8"),
+                     ("sizes", "<u4", (num_columns,))])
+
+
+def records_dtype(records):
+    """结构化数组或 {列名: 数组} 的记录类型，每列第一维为行"""
+    if isinstance(records, np.ndarray) and records.dtype.names:
+        return records.dtype
+    return np.dtype([(name, np.asarray(values).dtype, np.shape(values)[1:]) for name, values in records.items()])
+
+
+def _encode(values, level, shuffle):
+    """一列一块: 先按字节重排 (同一字节位置的字节放在一起，浮点数的符号/指数字节高度重复)，再 zlib 压缩"""
+    data = np.ascontiguousarray(values)
+    itemsize = data.dtype.itemsize
+    if shuffle and itemsize > 1:
+        data = data.view(np.uint8).reshape(-1, itemsize).T
+    return zlib.compress(data.tobytes(), level)
+
+
+def _decode(blob, dtype, shape, rows, shuffle):
+    raw = np.frombuffer(zlib.decompress(blob), dtype=np.uint8)
+    itemsize = dtype.itemsize
+    if shuffle and itemsize > 1:
+        raw = raw.reshape(itemsize, -1).T.copy()
+    return raw.view(dtype).reshape((rows,) + shape)
+
+
+class ColumnLogWriter:
+    """按列分块压缩的日志文件，带时间索引，读取时只解压与时间范围和所需列相关的块
+
+    文件格式: 头 (magic, 版本, metadata 长度) + JSON metadata (各列的 dtype 和形状、时间列名)，
+    之后是若干块，每块 chunk_rows 行，每列单独压缩；最后是时间索引 (每块一项) 和文件尾。
+    记录先写入预分配的块，块满时压缩写出。时间列必须单调不减。
+    进程中途退出时没有时间索引，读取时扫描块头重建，最多丢失最后未写出的一块。
+    """
+
+    def __init__(self, path, time_column="t", chunk_rows=4096, level=3, shuffle=True, meta=None):
+        """
+        Args:
+            path: 输出文件
+            time_column: 时间列名，按它建立索引
+            chunk_rows: 每块的行数，越小按时间读取越精确，压缩率越低
+            level: zlib 压缩级别 (0-9)
+            shuffle: 压缩前是否按字节重排
+            meta: 额外保存在 metadata 中的信息 (可 JSON 序列化)
+        """
+        self.path = path
+        self.time_column = time_column
+        self.chunk_rows = chunk_rows
+        self.level = level
+        self.shuffle = shuffle
+        self.meta = meta or {}
+        self.dtype = None
+        self.count = 0
+        self.bytes_raw = 0
+        self._file = None
+        self._index = []
+        self._block = None
+        self._n = 0
+        self._last_t = -np.inf
+
+    def _open(self, dtype):
+        if self.time_column not in dtype.names:
+            raise ValueError(f"time column {self.time_column!r} not in {dtype.names}")
+        if dtype[self.time_column].shape:
+            raise ValueError(f"time column {self.time_column!r} must be a scalar column")
+        self.dtype = dtype
+        meta = dict(self.meta, created=time.time(), time_column=self.time_column, chunk_rows=self.chunk_rows,
+                    codec="zlib", shuffle=self.shuffle,
+                    columns=[[name, dtype[name].base.str, list(dtype[name].shape)] for name in dtype.names])
+        payload = json.dumps(meta).encode()
+        payload += b" " * (-(_HEADER.size + len(payload)) % ALIGN)
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._file = open(self.path, "wb")
+        self._file.write(_HEADER.pack(MAGIC, VERSION, len(payload)))
+        self._file.write(payload)
+        self._block = np.zeros(self.chunk_rows, dtype=dtype)
+
+    def write(self, records):
+        """追加多行: 结构化数组，或 {列名: 数组}；第一次写入决定列和类型，之后列名必须相同"""
+        dtype = records_dtype(records)
+        if self.dtype is None:
+            self._open(dtype)
+        elif dtype.names != self.dtype.names:
+            raise ValueError(f"columns {dtype.names} do not match {self.dtype.names}")
+        columns = [np.asarray(records[name]) for name in self.dtype.names]
+        rows = len(columns[0])
+        if any(len(column) != rows for column in columns):
+            raise ValueError("all columns must have the same number of rows")
+        t = columns[self.dtype.names.index(self.time_column)]
+        if rows and (t[0] < self._last_t or np.any(np.diff(t) < 0)):
+            raise ValueError(f"time column {self.time_column!r} must be non-decreasing")
+
+        done = 0
+        while done < rows:
+            take = min(self.chunk_rows - self._n, rows - done)
+            for name, column in zip(self.dtype.names, columns):
+                self._block[name][self._n:self._n + take] = column[done:done + take]
+            self._n += take
+            done += take
+            if self._n == self.chunk_rows:
+                self.flush()
+        if rows:
+            self._last_t = t[-1]
+        self.count += rows
+
+    def append(self, row):
+        """追加一行: 按列顺序的元组，或 {列名: 值}"""
+        if isinstance(row, dict):
+            self.write({name: np.asarray(value)[None] for name, value in row.items()})
+        else:
+            if self.dtype is None:
+                raise ValueError("the first row must be a dict to define the columns")
+            self.write(np.array([tuple(row)], dtype=self.dtype))
+
+    def flush(self):
+        """把未满的块也写出 (之后从新的一块开始)"""
+        if self._n == 0:
+            return
+        block = self._block[:self._n]
+        blobs = [_encode(block[name], self.level, self.shuffle) for name in self.dtype.names]
+        t = block[self.time_column]
+        offset = self._file.tell()
+        self._file.write(_CHUNK.pack(CHUNK_MARK, self._n, t[0], t[-1]))
+        self._file.write(np.array([len(blob) for blob in blobs], dtype="<u4").tobytes())
+        for blob in blobs:
+            self._file.write(blob)
+        self._file.flush()
+        self._index.append((offset, self._n, t[0], t[-1], [len(blob) for blob in blobs]))
+        self.bytes_raw += block.nbytes
+        self._n = 0
+
+    def close(self):
+        """写出最后一块和时间索引；没有写入任何行时只写头"""
+        if self._file is None:
+            if self.dtype is not None:
+                return
+            self._open(np.dtype([(self.time_column, "<f8")]))
+        self.flush()
+        index = np.array(self._index, dtype=index_dtype(len(self.dtype.names)))
+        offset = self._file.tell()
+        self._file.write(index.tobytes())
+        self._file.write(_TRAILER.pack(offset, len(index), TRAILER_MAGIC))
+        self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ColumnLogReader:
+    """只读打开一个 ColumnLogWriter 写的文件，按时间范围读取部分列
+
+    打开时只读取头和时间索引；read() 先在索引中二分找到与 [start, end] 重叠的块，
+    再只读取和解压这些块中所需列的数据。bytes_read 和 chunks_read 累计实际读取的量。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        magic, version, meta_len = _HEADER.unpack(self._file.read(_HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a column log")
+        if version != VERSION:
+            raise ValueError(f"{path}: unsupported column log version {version}")
+        self.meta = json.loads(self._file.read(meta_len))
+        self.data_offset = _HEADER.size + meta_len
+        self.time_column = self.meta["time_column"]
+        self.shuffle = self.meta["shuffle"]
+        self.dtype = np.dtype([(name, dtype, tuple(shape)) for name, dtype, shape in self.meta["columns"]])
+        self.columns = self.dtype.names
+        self.index = self._read_index()
+        self.complete = self._complete
+        # 每块第一行的行号，以及各列数据在文件中的偏移
+        self.row0 = np.concatenate([[0], np.cumsum(self.index["rows"], dtype=np.int64)])
+        sizes = self.index["sizes"].astype(np.int64)
+        self._column_offsets = (self.index["offset"].astype(np.int64)[:, None] + _CHUNK.size
+                                + 4 * len(self.columns) + np.cumsum(sizes, axis=1) - sizes)
+        self.bytes_read = 0
+        self.chunks_read = 0
+
+    def _read_index(self):
+        size = os.fstat(self._file.fileno()).st_size
+        dtype = index_dtype(len(self.dtype.names))
+        self._complete = False
+        if size >= self.data_offset + _TRAILER.size:
+            self._file.seek(size - _TRAILER.size)
+            offset, count, magic = _TRAILER.unpack(self._file.read(_TRAILER.size))
+            if magic == TRAILER_MAGIC and offset + count * dtype.itemsize + _TRAILER.size == size:
+                self._file.seek(offset)
+                self._complete = True
+                return np.frombuffer(self._file.read(count * dtype.itemsize), dtype=dtype)
+        # 没有文件尾 (写入端中途退出): 依次读取块头，丢弃不完整的最后一块
+        entries = []
+        offset = self.data_offset
+        ncols = len(self.dtype.names)
+        while offset + _CHUNK.size + 4 * ncols <= size:
+            self._file.seek(offset)
+            mark, rows, t0, t1 = _CHUNK.unpack(self._file.read(_CHUNK.size))
+            if mark != CHUNK_MARK:
+                break
+            sizes = np.frombuffer(self._file.read(4 * ncols), dtype="<u4")
+            end = offset + _CHUNK.size + 4 * ncols + int(sizes.sum())
+            if end > size:
+                break
+            entries.append((offset, rows, t0, t1, sizes))
+            offset = end
+        return np.array(entries, dtype=dtype)
+
+    def __len__(self):
+        return int(self.row0[-1])
+
+    @property
+    def start(self):
+        return float(self.index["t0"][0]) if len(self.index) else float("nan")
+
+    @property
+    def end(self):
+        return float(self.index["t1"][-1]) if len(self.index) else float("nan")
+
+    def chunks(self, start=None, end=None):
+        """与 [start, end] 重叠的块的下标范围 (lo, hi)"""
+        lo = 0 if start is None else int(np.searchsorted(self.index["t1"], start, side="left"))
+        hi = len(self.index) if end is None else int(np.searchsorted(self.index["t0"], end, side="right"))
+        return lo, max(lo, hi)
+
+    def _read_column(self, chunk, column):
+        j = self.columns.index(column)
+        size = int(self.index["sizes"][chunk, j])
+        self._file.seek(int(self._column_offsets[chunk, j]))
+        blob = self._file.read(size)
+        self.bytes_read += size
+        dtype = self.dtype[column]
+        return _decode(blob, dtype.base, dtype.shape, int(self.index["rows"][chunk]), self.shuffle)
+
+    def _selection(self, columns):
+        if columns is None:
+            return self.columns
+        columns = [columns] if isinstance(columns, str) else list(columns)
+        for name in columns:
+            if name not in self.columns:
+                raise KeyError(f"{name!r} not in {self.columns}")
+        if self.time_column not in columns:
+            columns.insert(0, self.time_column)
+        return tuple(columns)
+
+    def iter_chunks(self, columns=None, start=None, end=None):
+        """逐块返回 {列名: 数组}，包含时间列；不按 start/end 截取块内的行"""
+        columns = self._selection(columns)
+        lo, hi = self.chunks(start, end)
+        for chunk in range(lo, hi):
+            self.chunks_read += 1
+            yield {name: self._read_column(chunk, name) for name in columns}
+
+    def read(self, start=None, end=None, columns=None):
+        """时间在 [start, end] 内的行 (结构化数组)，只包含 columns 和时间列；None 表示不限/全部列"""
+        columns = self._selection(columns)
+        dtype = np.dtype([(name, self.dtype[name].base, self.dtype[name].shape) for name in columns])
+        parts = []
+        for part in self.iter_chunks(columns, start, end):
+            t = part[self.time_column]
+            lo = 0 if start is None else int(np.searchsorted(t, start, side="left"))
+            hi = len(t) if end is None else int(np.searchsorted(t, end, side="right"))
+            if hi > lo:
+                parts.append({name: values[lo:hi] for name, values in part.items()})
+        out = np.empty(sum(len(part[self.time_column]) for part in parts), dtype=dtype)
+        for name in columns:
+            if parts:
+                np.concatenate([part[name] for part in parts], out=out[name])
+        return out
+
+    def summary(self):
+        return {"path": self.path, "rows": len(self), "chunks": len(self.index), "start": self.start,
+                "end": self.end, "complete": self.complete, "columns": {name: list(self.dtype[name].shape)
+                                                                          for name in self.columns}}
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_log(path, records, **kwargs):
+    """一次写出全部记录 (结构化数组或 {列名: 数组})，其余参数见 ColumnLogWriter"""
+    with ColumnLogWriter(path, **kwargs) as writer:
+        writer.write(records)
+    return path
+
+
+def read_log(path, start=None, end=None, columns=None):
+    """读取 [start, end] 内所需的列，见 ColumnLogReader.read"""
+    with ColumnLogReader(path) as reader:
+        return reader.read(start, end, columns)
+
+
+def group_columns(names):
+    """CSV 表头 -> [(列名, 形状)]: 连续的 q_0, q_1, ... 或 q[0], q[1], ... 合并为一个形状 (n,) 的列，其余为标量列"""
+    groups = []
+    for name in names:
+        match = _INDEXED.match(name)
+        index = int(match[2] or match[3]) if match else None
+        if match and groups and groups[-1][0] == match[1] and groups[-1][1] == index:
+            groups[-1][1] += 1
+        elif index == 0:
+            groups.append([match[1], 1])
+        else:
+            groups.append([name, None])
+    return [(name, () if count is None else (count,)) for name, count in groups]
+
+
+def convert_csv(src, dst, columns=None, time_column="t", dt=None, delimiter=",", chunk_rows=4096, **kwargs):
+    """把 np.savetxt 导出的 CSV 逐块转换成按列分块压缩的文件，返回行数
+
+    Args:
+        columns: [(列名, 形状)]，按顺序对应 CSV 的各列；None 时从表头得到 (见 group_columns)，
+            没有表头时为 c0, c1, ... 标量列
+        time_column: 时间列名；CSV 中没有这一列时用 dt 生成 t = 行号 * dt
+        kwargs: 见 ColumnLogWriter
+    """
+    with open(src) as f:
+        first = f.readline()
+        tokens = [token.strip() for token in first.lstrip("#").strip().split(delimiter)]
+        try:
+            [float(token) for token in tokens]
+            pending = [first]
+        except ValueError:
+            pending = []
+        if columns is None:
+            columns = group_columns(tokens) if not pending else [(f"c{i}", ()) for i in range(len(tokens))]
+        columns = [(name, tuple(shape)) for name, shape in columns]
+        widths = [int(np.prod(shape)) for _, shape in columns]
+        if sum(widths) != len(tokens):
+            raise ValueError(f"columns cover {sum(widths)} values, {src} has {len(tokens)} per row")
+        names = [name for name, _ in columns]
+        if time_column not in names and dt is None:
+            raise ValueError(f"{src} has no {time_column!r} column, pass dt to generate it")
+        splits = np.cumsum(widths)[:-1]
+
+        rows = 0
+        with ColumnLogWriter(dst, time_column=time_column, chunk_rows=chunk_rows,
+                             meta={"source": os.path.basename(src)}, **kwargs) as writer:
+            while True:
+                lines = pending + list(islice(f, chunk_rows - len(pending)))
+                pending = []
+                if not lines:
+                    break
+                block = np.loadtxt(lines, delimiter=delimiter, ndmin=2)
+                if block.size == 0:
+                    continue
+                records = {}
+                if time_column not in names:
+                    records[time_column] = (rows + np.arange(len(block))) * dt
+                for (name, shape), values in zip(columns, np.split(block, splits, axis=1)):
+                    records[name] = values.reshape((len(block),) + shape)
+                writer.write(records)
+                rows += len(block)
+    return rows
@@ -0,0 +1,81 @@
+import time
+
+import numpy as np
+
+
+class CommandSource:
+    """速度命令来源
+
+    read(out) 把 (x_vel, y_vel, ang_vel) 写入预分配的 out (shape (3,), float64)，
+    控制循环每个控制周期调用一次，实现中不应分配新的数组。
+    """
+
+    def read(self, out):
+        raise NotImplementedError
+
+
+class ConstantCommandSource(CommandSource):
+    """固定命令，用于无界面运行"""
+
+    def __init__(self, cmd=(0.0, 0.0, 0.0)):
+        self.cmd = np.array(cmd, dtype=np.double)
+
+    def read(self, out):
+        np.copyto(out, self.cmd)
+
+
+class KeyboardCommandSource(CommandSource):
+    """utils.keyboard_controller.KeyboardController"""
+
+    def __init__(self, controller):
+        self.controller = controller
+
+    def read(self, out):
+        out[0] = self.controller.x_vel
+        out[1] = self.controller.y_vel
+        out[2] = self.controller.ang_vel
+
+
+class JoystickCommandSource(CommandSource):
+    """utils.joystick_controller.JoystickController / utils.threadjoystick.ThreadedJoystickController
+
+    poll=True 时每次读取前调用 controller.update()，用于没有后台线程的 JoystickController。
+    """
+
+    def __init__(self, controller, poll=False):
+        self.controller = controller
+        self.poll = poll
+
+    def read(self, out):
+        if self.poll:
+            self.controller.update()
+        out[0] = self.controller.x_vel
+        out[1] = self.controller.y_vel
+        out[2] = self.controller.ang_vel
+
+
+class WebSocketCommandSource(CommandSource):
+    """utils.websocket_bridge.WebSocketBridge 收到的 command 消息
+
+    桥接的事件循环线程每收到一条命令就新建一个不可变元组，整体替换 self.latest (一次引用赋值)；
+    控制线程只读取一次引用，因此不会读到一半新一半旧的命令，两边都不需要加锁。
+    控制循环第一次读到某条命令时，把从按键到应用的各段延迟记录到 bridge.command_latency。
+    """
+
+    def __init__(self, bridge):
+        self.bridge = bridge
+        # (x_vel, y_vel, ang_vel, msg)
+        self.latest = (0.0, 0.0, 0.0, None)
+        self._applied = self.latest
+        bridge.set_command_callback(self._on_command)
+
+    def _on_command(self, msg):
+        self.latest = (float(msg.get("x_vel", 0.0)), float(msg.get("y_vel", 0.0)),
+                       float(msg.get("ang_vel", 0.0)), msg)
+
+    def read(self, out):
+        latest = self.latest
+        out[0], out[1], out[2], msg = latest
+        if latest is not self._applied:
+            self._applied = latest
+            self.bridge.record_command_latency(msg, time.time())
@@ -0,0 +1,306 @@
+import threading
+import time
+
+import mujoco
+import mujoco.viewer
+import numpy as np
+import torch
+
+from utils.easy_math import GravityOrientation
+from utils.loop_scheduler import LoopScheduler
+from utils.obs_history import ObsHistory
+from utils.policy_registry import load_policy
+from utils.profiler import make_profiler
+from utils.render_thread import RenderThread
+
+
+class ControlLoop:
+    """DreamWaQ sim2sim 控制循环，键盘/网页/手柄等入口共用
+
+    命令来源 (utils.command_sources) 和状态输出 (utils.state_sinks) 可替换。
+    所有缓冲区和 MjData 视图在构造时分配，step() 只做原地运算，每步不分配内存。
+    启用 profiler 时 step 换成逐阶段计时的版本，未启用时的热路径与不带 profiler 时完全相同。
+    """
+
+    def __init__(self, cfg, command_source, state_sinks=(), policy=None, model_path=None, warmup_time=0.5,
+                 seed=None, profiler=None):
+        """
+        Args:
+            cfg: Sim2simCfg
+            command_source: CommandSource，每个控制周期读取一次
+            state_sinks: StateSink 序列，每个控制周期在策略推理之后调用
+            policy: 推理引擎，默认按 cfg.inference_config 从注册表加载
+            model_path: MuJoCo 场景文件，默认使用 cfg.sim_config.mujoco_model_path
+            warmup_time: 策略启动前零力矩下落的仿真时间 [s]
+            seed: reset 时设置的 torch 随机种子，DreamWaQ 的 VAE 采样隐变量，固定种子才能复现
+            profiler: utils.profiler.StageProfiler，默认按 cfg.profile_config 创建，未启用时为 None
+        """
+        self.cfg = cfg
+        self.command_source = command_source
+        self.state_sinks = tuple(state_sinks)
+        self.policy = policy if policy is not None else load_policy(cfg)
+        self.warmup_time = warmup_time
+        self.seed = seed
+        self.decimation = cfg.sim_config.decimation
+        self.lock = threading.Lock()
+        # 当前 run() 的 LoopScheduler，其它线程可读取其统计 (例如 WebSocketBridge 上报的 sim_metrics)
+        self.scheduler = None
+
+        self.model_path = model_path or cfg.sim_config.mujoco_model_path
+        self.model = mujoco.MjModel.from_xml_path(self.model_path)
+        self.model.opt.timestep = cfg.sim_config.dt
+        self.data = mujoco.MjData(self.model)
+
+        num_actions = cfg.env.num_actions
+        num_single_obs = cfg.env.num_single_obs
+        obs_scales = cfg.normalization.obs_scales
+
+        # MjData 的数组地址在整个生命周期内不变，视图只创建一次
+        self.qpos = self.data.qpos
+        self.qvel = self.data.qvel
+        self.ctrl = self.data.ctrl
+        self.base_pos = self.qpos[0:3]
+        self.base_quat = self.qpos[3:7]
+        self.base_lin_vel = self.qvel[0:3]
+        self.omega = self.qvel[3:6]
+        self.qj = self.qpos[7:7 + num_actions]
+        self.dqj = self.qvel[6:6 + num_actions]
+
+        # 标量系数也展开成数组，避免 ufunc 每次把 Python 标量转换成临时数组
+        self.kps = np.asarray(cfg.robot_config.kps, dtype=np.double)
+        self.kds = np.asarray(cfg.robot_config.kds, dtype=np.double)
+        self.default_angles = np.asarray(cfg.robot_config.default_angles, dtype=np.double)
+        self.cmd_scale = np.asarray(cfg.normalization.cmd_scale, dtype=np.double)
+        self.ang_vel_scale = np.full(3, obs_scales.ang_vel)
+        self.dof_vel_scale = np.full(num_actions, obs_scales.dof_vel)
+        self.action_scale = np.full(num_actions, cfg.control.action_scale)
+
+        self.cmd = np.zeros(3)
+        self.action = np.zeros(num_actions)
+        self.target_q = np.zeros(num_actions)
+        self.target_dq = np.zeros(num_actions)
+        self._pd_tmp = np.zeros(num_actions)
+        self._action_row = self.action.reshape(1, num_actions)
+        self._gravity = GravityOrientation()
+
+        # 观测先在 float64 中构建，再一次性拷贝到 float32，避免混合类型 ufunc 的临时缓冲
+        self.obs = np.zeros(num_single_obs, dtype=np.float32)
+        self._obs64 = np.zeros(num_single_obs)
+        self._obs_cmd = self._obs64[0:3]
+        self._obs_omega = self._obs64[3:6]
+        self._obs_gravity = self._obs64[6:9]
+        self._obs_dof_pos = self._obs64[9:9 + num_actions]
+        self._obs_dof_vel = self._obs64[9 + num_actions:9 + num_actions * 2]
+        self._obs_action = self._obs64[9 + num_actions * 2:9 + num_actions * 3]
+        self.obs_history = ObsHistory(num_single_obs, cfg.env.frame_stack)
+
+        self._phase = 1
+
+        self.profiler = profiler if profiler is not None else make_profiler(cfg)
+        if self.profiler is not None:
+            self._setup_profiling()
+
+    def _setup_profiling(self):
+        p = self.profiler
+        self._stage_command = p.stage("command")
+        self._stage_obs = p.stage("observation")
+        self._stage_policy = p.stage("policy")
+        self._stage_sinks = [p.stage(f"sink.{type(sink).__name__}") for sink in self.state_sinks]
+        self._stage_tick = p.stage("control_tick")
+        self._stage_lock = p.stage("lock_wait")
+        self._stage_pd = p.stage("pd_control")
+        self._stage_mj_step = p.stage("mj_step")
+        self._stage_step = p.stage("step")
+        self._report_interval = self.cfg.profile_config.report_interval
+        self._next_report = self._report_interval
+        # 实例属性覆盖同名方法，未启用时不经过任何判断
+        self.step = self._step_profiled
+
+    @property
+    def sim_time(self):
+        return self.data.time
+
+    def reset(self):
+        mujoco.mj_resetData(self.model, self.data)
+        mujoco.mj_step(self.model, self.data)
+        self.action[:] = 0.0
+        self.target_q[:] = 0.0
+        self.target_dq[:] = 0.0
+        self.obs_history.reset()
+        if self.seed is not None:
+            torch.manual_seed(self.seed)
+        # 与原脚本的 count_lowlevel 从 1 开始计数一致，第 decimation 步第一次推理
+        self._phase = 1
+
+    def _build_obs(self):
+        np.multiply(self.cmd, self.cmd_scale, out=self._obs_cmd)
+        np.multiply(self.omega, self.ang_vel_scale, out=self._obs_omega)
+        self._gravity.compute(self.base_quat, self._obs_gravity)
+        np.subtract(self.qj, self.default_angles, out=self._obs_dof_pos)
+        np.multiply(self.dqj, self.dof_vel_scale, out=self._obs_dof_vel)
+        np.copyto(self._obs_action, self.action)
+        np.copyto(self.obs, self._obs64)
+        self.obs_history.push(self.obs)
+
+    def _infer(self):
+        np.copyto(self._action_row, self.policy(self.obs_history.tensor))
+        np.multiply(self.action, self.action_scale, out=self.target_q)
+        np.add(self.target_q, self.default_angles, out=self.target_q)
+
+    def _pd_control(self):
+        # tau = (target_q - q) * kps + (target_dq - dq) * kds，直接写入 data.ctrl
+        np.subtract(self.target_q, self.qj, out=self._pd_tmp)
+        np.multiply(self._pd_tmp, self.kps, out=self.ctrl)
+        np.subtract(self.target_dq, self.dqj, out=self._pd_tmp)
+        np.multiply(self._pd_tmp, self.kds, out=self._pd_tmp)
+        np.add(self.ctrl, self._pd_tmp, out=self.ctrl)
+
+    def _control_tick(self):
+        self.command_source.read(self.cmd)
+        self._build_obs()
+        self._infer()
+
+        if self.state_sinks:
+            for sink in self.state_sinks:
+                sink.publish(self)
+
+    def step(self):
+        """推进一个物理步，每 decimation 步做一次策略推理
+
+        只有 PD 控制和 mj_step 持有 lock: MjData 只由本线程写入，策略推理和状态输出只读，在锁外进行，
+        渲染线程的 viewer.sync() 不会被推理拖住，物理步也只在 sync 期间等待。
+        """
+        if self._phase == 0:
+            self._control_tick()
+
+        # 不用 with: 3.11 中 with 每次为 __exit__ 创建绑定方法，acquire/release 不分配内存
+        self.lock.acquire()
+        try:
+            self._pd_control()
+            mujoco.mj_step(self.model, self.data)
+        finally:
+            self.lock.release()
+
+        self._phase += 1
+        if self._phase == self.decimation:
+            self._phase = 0
+
+    def _control_tick_profiled(self):
+        p = self.profiler
+        clock = time.perf_counter
+        t0 = clock()
+        self.command_source.read(self.cmd)
+        t1 = clock()
+        p.record(self._stage_command, t0, t1)
+        self._build_obs()
+        t2 = clock()
+        p.record(self._stage_obs, t1, t2)
+        self._infer()
+        t3 = clock()
+        p.record(self._stage_policy, t2, t3)
+        for sink, stage in zip(self.state_sinks, self._stage_sinks):
+            sink.publish(self)
+            t4 = clock()
+            p.record(stage, t3, t4)
+            t3 = t4
+        p.record(self._stage_tick, t0, t3)
+
+        if self._report_interval > 0 and self.data.time >= self._next_report:
+            self._next_report += self._report_interval
+            print(p.report())
+
+    def _step_profiled(self):
+        p = self.profiler
+        clock = time.perf_counter
+        t0 = clock()
+        if self._phase == 0:
+            self._control_tick_profiled()
+
+        t1 = clock()
+        self.lock.acquire()
+        try:
+            t_locked = clock()
+            self._pd_control()
+            t2 = clock()
+            mujoco.mj_step(self.model, self.data)
+            t3 = clock()
+        finally:
+            self.lock.release()
+        # 等待渲染线程释放 lock 的时间，即渲染造成的物理步停顿
+        p.record(self._stage_lock, t1, t_locked)
+        p.record(self._stage_pd, t_locked, t2)
+        p.record(self._stage_mj_step, t2, t3)
+        p.record(self._stage_step, t0, t3)
+
+        self._phase += 1
+        if self._phase == self.decimation:
+            self._phase = 0
+
+    def _warmup(self, scheduler, is_running):
+        while is_running() and scheduler.sim_time < self.warmup_time:
+            with self.lock:
+                mujoco.mj_step(self.model, self.data)
+            scheduler.wait()
+
+    def _loop(self, scheduler, is_running, duration):
+        while is_running() and scheduler.sim_time < duration:
+            self.step()
+            scheduler.wait()
+
+    def run(self, viewer=True, duration=None, speed=None, until=None):
+        """运行控制循环
+
+        Args:
+            viewer: 是否打开 MuJoCo viewer，False 时无界面运行
+            duration: 仿真时长 [s]，默认 cfg.sim_config.sim_duration
+            speed: 实时倍率，0 表示不限速，默认 cfg.sim_config.real_time_factor
+            until: 可选的 callable，返回 True 时提前结束，例如回放完最后一帧
+
+        Returns:
+            调度统计 (LoopScheduler.stats)，有 viewer 时包含 render 统计
+        """
+        sim_config = self.cfg.sim_config
+        duration = sim_config.sim_duration if duration is None else duration
+        speed = sim_config.real_time_factor if speed is None else speed
+        until = until or (lambda: False)
+
+        self.reset()
+        if self.profiler is not None:
+            self.profiler.reset()
+            self._next_report = self._report_interval
+        scheduler = self.scheduler = LoopScheduler(sim_config.dt, speed=speed)
+        try:
+            if not viewer:
+                is_running = lambda: not until()
+                self._warmup(scheduler, is_running)
+                scheduler.reset()
+                self._loop(scheduler, is_running, duration)
+                print(scheduler.report())
+                return scheduler.stats()
+
+            with mujoco.viewer.launch_passive(self.model, self.data) as handle:
+                render_thread = RenderThread(handle, self.lock, fps=sim_config.render_fps, profiler=self.profiler)
+                render_thread.start()
+                is_running = lambda: handle.is_running() and not until()
+                self._warmup(scheduler, is_running)
+                scheduler.reset()
+                self._loop(scheduler, is_running, duration)
+                render_thread.stop()
+
+            print(scheduler.report())
+            print(render_thread.report())
+            stats = scheduler.stats()
+            stats["render"] = render_thread.stats()
+            return stats
+        finally:
+            for sink in self.state_sinks:
+                sink.close()
+            if self.profiler is not None:
+                self._finish_profiling()
+
+    def _finish_profiling(self):
+        print(self.profiler.report())
+        trace_path = self.cfg.profile_config.trace_path
+        if trace_path and self.profiler.trace_events:
+            self.profiler.export_trace(trace_path)
+            print(f"trace written to {trace_path}")
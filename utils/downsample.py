@@ -0,0 +1,126 @@
+import numpy as np
+
+
+def _reduce(block, start, size):
+    """block 按每 size 行一个桶，返回各桶 (最小值, 其下标, 最大值, 其下标)，每项形状 (桶数, 列数)"""
+    buckets = block.reshape(-1, size, block.shape[1])
+    offsets = start + np.arange(len(buckets))[:, None] * size
+    amin = buckets.argmin(axis=1)
+    amax = buckets.argmax(axis=1)
+    lo = np.take_along_axis(buckets, amin[:, None, :], axis=1)[:, 0]
+    hi = np.take_along_axis(buckets, amax[:, None, :], axis=1)[:, 0]
+    return lo, offsets + amin, hi, offsets + amax
+
+
+def _combine(a, b):
+    """合并相邻的两组桶 (a 在前)，相等时保留前面的点"""
+    take_lo = b[0] < a[0]
+    take_hi = b[2] > a[2]
+    return (np.where(take_lo, b[0], a[0]), np.where(take_lo, b[1], a[1]),
+            np.where(take_hi, b[2], a[2]), np.where(take_hi, b[3], a[3]))
+
+
+class MinMaxDownsampler:
+    """把一条 (可以多列的) 时间序列增量地压缩到最多 max_buckets 个桶，每个桶保留最小值和最大值两个点
+
+    每个桶保留的是原始样本 (下标和值)，所以峰值不会被平均掉；max_buckets 取绘图区域的像素宽度时，
+    画出的折线与画全部样本在屏幕上看起来一样。每列独立选点，12 个关节的 dof_pos 可以一次处理。
+
+    桶宽 (样本数) 为 2 的幂，update() 只处理新样本；样本数超过 max_buckets 个桶时相邻桶两两合并、桶宽加倍，
+    两个桶的最小/最大值合并后仍然精确，不需要原始数据。最后一个未满的桶以同样的摘要形式保存。
+    """
+
+    def __init__(self, max_buckets=1000):
+        self.max_buckets = max_buckets
+        self.bucket = 1
+        self.count = 0
+        self._squeeze = None
+        self._full = None
+        self._nb = 0
+        self._partial = None
+        self._partial_n = 0
+
+    def update(self, values):
+        """追加新样本，values 形状 (n,) 或 (n, 列数)"""
+        values = np.asarray(values, dtype=np.float64)
+        if self._squeeze is None:
+            self._squeeze = values.ndim == 1
+        if values.ndim == 1:
+            values = values[:, None]
+        n = len(values)
+        if n == 0:
+            return
+        if self._full is None:
+            self._full = [np.empty((self.max_buckets, values.shape[1]), dtype=dtype)
+                          for dtype in (np.float64, np.int64, np.float64, np.int64)]
+        # 先把桶宽加倍到能容纳全部样本，新样本只按最终的桶宽处理一次
+        while self.count + n > self.max_buckets * self.bucket:
+            self._merge()
+
+        start = self.count
+        offset = 0
+        if self._partial_n:
+            offset = min(self.bucket - self._partial_n, n)
+            self._partial = _combine(self._partial, _reduce(values[:offset], start, offset))
+            self._partial_n += offset
+            if self._partial_n == self.bucket:
+                self._append(self._partial)
+                self._partial, self._partial_n = None, 0
+        k = (n - offset) // self.bucket
+        if k:
+            end = offset + k * self.bucket
+            self._append(_reduce(values[offset:end], start + offset, self.bucket))
+            offset = end
+        if offset < n:
+            self._partial = _reduce(values[offset:], start + offset, n - offset)
+            self._partial_n = n - offset
+        self.count += n
+
+    def _append(self, parts):
+        m = len(parts[0])
+        for array, part in zip(self._full, parts):
+            array[self._nb:self._nb + m] = part
+        self._nb += m
+
+    def _merge(self):
+        """相邻桶两两合并，桶数为奇数时最后一个桶并入未满的桶"""
+        nb = self._nb
+        if nb % 2:
+            last = tuple(array[nb - 1:nb].copy() for array in self._full)
+            self._partial = last if self._partial is None else _combine(last, self._partial)
+            self._partial_n += self.bucket
+            nb -= 1
+        pairs = _combine(tuple(array[0:nb:2] for array in self._full),
+                         tuple(array[1:nb:2] for array in self._full))
+        self._nb = 0
+        self._append(pairs)
+        self.bucket *= 2
+
+    def points(self):
+        """按时间顺序的 (下标, 值)，每列各自的点，形状 (点数, 列数)；一维输入返回一维"""
+        if self._full is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        parts = [array[:self._nb] for array in self._full]
+        if self._partial is not None:
+            parts = [np.concatenate([array, part]) for array, part in zip(parts, self._partial)]
+        lo, lo_idx, hi, hi_idx = parts
+        if self.bucket == 1:
+            index, values = lo_idx, lo
+        else:
+            first = lo_idx <= hi_idx
+            index = np.empty((2 * len(lo), lo.shape[1]), dtype=np.int64)
+            values = np.empty(index.shape)
+            index[0::2] = np.where(first, lo_idx, hi_idx)
+            index[1::2] = np.where(first, hi_idx, lo_idx)
+            values[0::2] = np.where(first, lo, hi)
+            values[1::2] = np.where(first, hi, lo)
+        if self._squeeze:
+            return index[:, 0], values[:, 0]
+        return index, values
+
+
+def minmax_downsample(values, max_buckets=1000):
+    """一次性压缩，等价于新建 MinMaxDownsampler 后 update(values)"""
+    downsampler = MinMaxDownsampler(max_buckets)
+    downsampler.update(values)
+    return downsampler.points()
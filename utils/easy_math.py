@@ -15,6 +15,76 @@ def get_gravity_orientation(quaternion):
 
     return gravity_orientation
 
+def get_gravity_orientation_batch(quaternions, out=None):
+    """批量版本的 get_gravity_orientation
+
+    Args:
+        quaternions: (N, 4) 四元数，顺序 (w, x, y, z)
+        out: 可选的 (N, 3) 输出数组，避免重复分配
+
+    Returns:
+        (N, 3) projected gravity
+    """
+    qw = quaternions[:, 0]
+    qx = quaternions[:, 1]
+    qy = quaternions[:, 2]
+    qz = quaternions[:, 3]
+
+    if out is None:
+        out = np.zeros((quaternions.shape[0], 3))
+
+    out[:, 0] = 2 * (-qz * qx + qw * qy)
+    out[:, 1] = -2 * (qz * qy + qw * qx)
+    out[:, 2] = 1 - 2 * (qw * qw + qz * qz)
+
+    return out
+
+def quat_rotate_inverse_batch(quaternions, vectors):
+    """将世界系向量批量旋转到机体系
+
+    Args:
+        quaternions: (N, 4) 四元数，顺序 (w, x, y, z)
+        vectors: (N, 3) 世界系向量
+
+    Returns:
+        (N, 3) 机体系向量
+    """
+    q_w = quaternions[:, 0:1]
+    q_vec = quaternions[:, 1:4]
+    a = vectors * (2.0 * q_w ** 2 - 1.0)
+    b = np.cross(q_vec, vectors) * q_w * 2.0
+    c = q_vec * np.sum(q_vec * vectors, axis=1, keepdims=True) * 2.0
+    return a - b + c
+
+class GravityOrientation:
+    """get_gravity_orientation 的无内存分配版本，供控制循环每步调用
+
+    projected gravity 的每个分量都是四元数的二次型 q^T A_i q (+ c_i)，
+    用两次写入预分配数组的 np.dot 完成计算，结果与 get_gravity_orientation 逐位一致。
+    """
+
+    def __init__(self):
+        A = np.zeros((3, 4, 4))
+        # g0 = 2 * (qw * qy - qz * qx)
+        A[0, 0, 2] = A[0, 2, 0] = 1.0
+        A[0, 3, 1] = A[0, 1, 3] = -1.0
+        # g1 = -2 * (qz * qy + qw * qx)
+        A[1, 3, 2] = A[1, 2, 3] = -1.0
+        A[1, 0, 1] = A[1, 1, 0] = -1.0
+        # g2 = 1 - 2 * (qw * qw + qz * qz)
+        A[2, 0, 0] = A[2, 3, 3] = -2.0
+        self._A = A.reshape(12, 4)
+        self._c = np.array([0.0, 0.0, 1.0])
+        self._Aq = np.zeros(12)
+        self._Aq_rows = self._Aq.reshape(3, 4)
+
+    def compute(self, quaternion, out):
+        """quaternion: (4,) (w, x, y, z)，out: (3,) float64"""
+        np.dot(self._A, quaternion, out=self._Aq)
+        np.dot(self._Aq_rows, quaternion, out=out)
+        np.add(out, self._c, out=out)
+        return out
+
 def euler_to_projected_gravity(roll, pitch, yaw, g=1):
     """
     将欧拉角（滚转、俯仰、偏航）转换为 projected_gravity
@@ -29,25 +29,112 @@
 #
 # Copyright (c) 2024 Beijing RobotEra TECHNOLOGY CO.,LTD. All rights reserved.
 
-import matplotlib.pyplot as plt
-import numpy as np
+import multiprocessing
+import os
+import time
 from collections import defaultdict
-from multiprocessing import Process, Value
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from utils.column_log import write_log
+from utils.downsample import MinMaxDownsampler, minmax_downsample
+
+# (title, y label, [(key, label), ...]) of the 2x3 state plot, shared by plot_states() and the live plot
+PANELS = (
+    ("Orientation", "Euler [rad]", (("roll", "roll"), ("pitch", "pitch"), ("yaw", "yaw"))),
+    ("Omega", "Omega [rad/s]", (("angle_vel_x", "angle_vel_x"), ("angle_vel_y", "angle_vel_y"),
+                                ("angle_vel_z", "angle_vel_z"))),
+    ("Power", "power [w]", (("power", "power"),)),
+    ("DOF Position", "Position [rad]", (("dof_pos", "measured"), ("dof_pos_target", "target"))),
+    ("Torque", "Joint Torque [Nm]", (("dof_torque", "measured"),)),
+    ("Base velocity z", "base lin vel [m/s]", (("base_vel_z", "measured"),)),
+)
+PLOT_KEYS = tuple(key for _, _, series in PANELS for key, _ in series)
+
+
+class Column:
+    """Growable typed array of one logged key
+
+    Rows are written in place; when the buffer is full its capacity doubles,
+    so appending is amortized O(1) and never creates per-sample objects.
+    """
+
+    def __init__(self, value, capacity=1024):
+        value = np.asarray(value)
+        dtype = value.dtype if value.dtype.kind in "fb" else np.float64
+        self.data = np.empty((capacity, *value.shape), dtype=dtype)
+        self.size = 0
+
+    def append(self, value):
+        if self.size == len(self.data):
+            grown = np.empty((2 * len(self.data), *self.data.shape[1:]), dtype=self.data.dtype)
+            grown[:self.size] = self.data
+            self.data = grown
+        self.data[self.size] = value
+        self.size += 1
+
+    @property
+    def values(self):
+        return self.data[:self.size]
+
+    def __len__(self):
+        return self.size
+
 
 class Logger:
-    def __init__(self, dt):
-        self.state_log = defaultdict(list)
+    def __init__(self, dt, capacity=1024):
+        self.state_log = {}
         self.rew_log = defaultdict(list)
         self.dt = dt
+        self.capacity = capacity
         self.num_episodes = 0
-        self.plot_process = None
+        self.live_plot = None
+        # Per-key min/max downsampling for plots, fed only with samples logged since the last plot
+        self._downsamplers = {}
 
     def log_state(self, key, value):
-        self.state_log[key].append(value)
+        column = self.state_log.get(key)
+        if column is None:
+            column = self.state_log[key] = Column(value, self.capacity)
+        column.append(value)
 
     def log_states(self, dict):
         for key, value in dict.items():
             self.log_state(key, value)
+        if self.live_plot is not None:
+            self.live_plot.push(dict)
+
+    def get(self, key):
+        """Logged values of key as an array (a view, valid until the next log call), None if never logged"""
+        column = self.state_log.get(key)
+        return column.values if column is not None else None
+
+    def downsampled(self, key, max_points=2000):
+        """(time, values) of key reduced to at most max_points points that keep every peak, None if never logged"""
+        column = self.state_log.get(key)
+        if column is None:
+            return None
+        buckets = max(max_points // 2, 1)
+        downsampler = self._downsamplers.get(key)
+        if downsampler is None or downsampler.max_buckets != buckets or downsampler.count > len(column):
+            downsampler = self._downsamplers[key] = MinMaxDownsampler(buckets)
+        downsampler.update(column.values[downsampler.count:])
+        index, values = downsampler.points()
+        return index * self.dt, values
+
+    def save(self, path, **kwargs):
+        """Write the state log to a utils/column_log.py file with a "t" column, readable by time window
+
+        kwargs go to ColumnLogWriter (chunk_rows, level, ...). All keys must have the same number of samples.
+        """
+        lengths = {key: len(column) for key, column in self.state_log.items()}
+        if len(set(lengths.values())) > 1:
+            raise ValueError(f"state keys have different lengths: {lengths}")
+        count = next(iter(lengths.values()), 0)
+        records = {"t": np.arange(count) * self.dt}
+        records.update((key, column.values) for key, column in self.state_log.items())
+        return write_log(path, records, meta={"source": "Logger", "dt": self.dt}, **kwargs)
 
     def log_rewards(self, dict, num_episodes):
         for key, value in dict.items():
@@ -58,90 +145,39 @@ class Logger:
     def reset(self):
         self.state_log.clear()
         self.rew_log.clear()
+        self._downsamplers.clear()
 
-    def plot_states(self):
-        # self.plot_process = Process(target=self._plot)
-        # self.plot_process.start()
-        # self.plot_process.join()
-        self._plot()
-
-    def _plot(self):
-        nb_rows = 2
-        nb_cols = 3
-        fig, axs = plt.subplots(nb_rows, nb_cols)
-        for key, value in self.state_log.items():
-            time = np.linspace(0, len(value)*self.dt, len(value))
-            break
-        log = self.state_log
-
-        # plot base vel x
-        a = axs[0, 0]
-        if log["roll"]: a.plot(time, log["roll"], label='roll')
-        if log["pitch"]: a.plot(time, log["pitch"], label='pitch')
-        if log["yaw"]: a.plot(time, log["yaw"], label='yaw')
-        a.set(xlabel='time [s]', ylabel='Euler [rad]', title='Orientation')
-        # a.set_ylim(bottom=-3.14, top=3.14)
-        a.legend()
-
-        # plot base vel y
-        a = axs[0, 1]
-        if log["angle_vel_x"]: a.plot(time, log["angle_vel_x"], label='angle_vel_x')
-        if log["angle_vel_y"]: a.plot(time, log["angle_vel_y"], label='angle_vel_y')
-        if log["angle_vel_z"]: a.plot(time, log["angle_vel_z"], label='angle_vel_z')
-        a.set(xlabel='time [s]', ylabel='Omega [rad/s]', title='Omega')
-        a.legend()
-
-        # plot base vel yaw
-        a = axs[0, 2]
-        if log["power"]: a.plot(time, log["power"], label='power')
-        a.set(xlabel='time [s]', ylabel='power [w]', title='Power')
-        a.legend()
-
-        # plot joint targets and measured positions
-        a = axs[1, 0]
-        if log["dof_pos"]: a.plot(time, log["dof_pos"], label='measured')
-        if log["dof_pos_target"]: a.plot(time, log["dof_pos_target"], label='target')
-        a.set(xlabel='time [s]', ylabel='Position [rad]', title='DOF Position')
-        a.legend()
-
-        # plot torques
-        a = axs[1, 1]
-        if log["dof_torque"] != []: a.plot(time, log["dof_torque"], label='measured')
-        a.set(xlabel='time [s]', ylabel='Joint Torque [Nm]', title='Torque')
-        a.legend()
-
-        # plot base vel z
-        a = axs[1, 2]
-        if log["base_vel_z"]: a.plot(time, log["base_vel_z"], label='measured')
-        a.set(xlabel='time [s]', ylabel='base lin vel [m/s]', title='Base velocity z')
-        a.legend()
+    def start_live_plot(self, window=10.0, rate=10.0, keys=PLOT_KEYS):
+        """Plot the last window seconds of keys in a separate process, redrawn rate times per second
 
-        plt.show()
+        The process starts with the first log_states() call, once the size of
+        every key is known. Samples reach it through shared memory, so
+        log_states() never waits on the plot.
+        """
+        self.live_plot = LivePlot(self.dt, window, rate, keys)
 
+    def close(self):
+        if self.live_plot is not None:
+            self.live_plot.close()
+            self.live_plot = None
 
-        # plot joint velocity
-        # a = axs[1, 1]
-        # if log["dof_vel"]: a.plot(time, log["dof_vel"], label='measured')
-        # if log["dof_vel_target"]: a.plot(time, log["dof_vel_target"], label='target')
-        # a.set(xlabel='time [s]', ylabel='Velocity [rad/s]', title='Joint Velocity')
-        # a.legend()
+    def plot_states(self, max_points=None):
+        self._plot(max_points)
 
+    def _plot(self, max_points=None):
+        """max_points: points per series, default two per horizontal pixel of each axes"""
+        import matplotlib.pyplot as plt
 
-        # plot contact forces
-        # a = axs[2, 0]
-        # if log["contact_forces_z"]:
-        #     forces = np.array(log["contact_forces_z"])
-        #     for i in range(forces.shape[1]):
-        #         a.plot(time, forces[:, i], label=f'force {i}')
-        # a.set(xlabel='time [s]', ylabel='Forces z [N]', title='Vertical Contact forces')
-        # a.legend()
-
-        # plot torque/vel curves
-        # a = axs[2, 1]
-        # if log["dof_vel"]!=[] and log["dof_torque"]!=[]: a.plot(log["dof_vel"], log["dof_torque"], 'x', label='measured')
-        # a.set(xlabel='Joint vel [rad/s]', ylabel='Joint Torque [Nm]', title='Torque/velocity curves')
-        # a.legend()
-
+        _, axs = plt.subplots(2, 3)
+        for a, (title, ylabel, series) in zip(axs.flat, PANELS):
+            points = max_points or 2 * int(a.get_window_extent().width)
+            for key, label in series:
+                if key in self.state_log and len(self.state_log[key]):
+                    time, values = self.downsampled(key, points)
+                    a.plot(time, values, label=label)
+            a.set(xlabel='time [s]', ylabel=ylabel, title=title)
+            a.legend()
+        plt.show()
 
     def print_rewards(self):
         print("Average rewards per second:")
@@ -149,7 +185,119 @@ class Logger:
             mean = np.sum(np.array(values)) / self.num_episodes
             print(f" - {key}: {mean}")
         print(f"Total number of episodes: {self.num_episodes}")
-    
+
     def __del__(self):
-        if self.plot_process is not None:
-            self.plot_process.kill()
\ No newline at end of file
+        self.close()
+
+
+class LivePlot:
+    """Writer side of the live plot: a ring buffer of the last window seconds in shared memory
+
+    push() copies one sample into the next ring row and then bumps the
+    sample counter at the start of the block, about 1 us per key and
+    without system calls. The plot process reads the ring at its own rate
+    and uses the counter to skip rows that were overwritten while it
+    copied them.
+    """
+
+    def __init__(self, dt, window, rate, keys):
+        self.dt = dt
+        self.rate = rate
+        self.keys = tuple(keys)
+        self.capacity = max(int(round(window / dt)), 2)
+        self.layout = None
+        self.shm = None
+        self.process = None
+
+    def _start(self, sample):
+        # key -> (first column, width); keys missing from the first sample are not plotted
+        self.layout = {}
+        width = 0
+        for key in self.keys:
+            if key in sample:
+                size = int(np.size(sample[key]))
+                self.layout[key] = (width, size)
+                width += size
+        self.shm = shared_memory.SharedMemory(create=True, size=8 + self.capacity * max(width, 1) * 8)
+        self.count = np.ndarray((1,), dtype=np.int64, buffer=self.shm.buf)
+        self.count[0] = 0
+        self.ring = np.ndarray((self.capacity, max(width, 1)), dtype=np.float64, buffer=self.shm.buf, offset=8)
+        self.ring[:] = np.nan
+        self._slices = [(key, slice(start, start + size)) for key, (start, size) in self.layout.items()]
+        # spawn so the plot process does not inherit the simulation's threads
+        context = multiprocessing.get_context("spawn")
+        self.process = context.Process(target=_live_plot_main, name="live-plot", daemon=True,
+                                       args=(self.shm.name, self.capacity, width, self.layout, self.dt, self.rate))
+        self.process.start()
+
+    def push(self, sample):
+        if self.layout is None:
+            self._start(sample)
+        n = int(self.count[0])
+        row = self.ring[n % self.capacity]
+        for key, columns in self._slices:
+            value = sample.get(key)
+            row[columns] = np.nan if value is None else value
+        self.count[0] = n + 1
+
+    def close(self):
+        if self.process is not None:
+            self.process.kill()
+            self.process.join()
+            self.process = None
+        if self.shm is not None:
+            del self.count, self.ring
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+
+def _live_plot_main(name, capacity, width, layout, dt, rate):
+    """Plot process: redraw the ring buffer rate times per second until the window is closed"""
+    import matplotlib.pyplot as plt
+
+    # Lower priority, so on a loaded machine redraws do not preempt the control loop
+    os.nice(10)
+    shm = shared_memory.SharedMemory(name=name)
+    count = np.ndarray((1,), dtype=np.int64, buffer=shm.buf)
+    ring = np.ndarray((capacity, max(width, 1)), dtype=np.float64, buffer=shm.buf, offset=8)
+
+    plt.ion()
+    fig, axs = plt.subplots(2, 3)
+    # Min/max buckets per redraw, one per horizontal pixel of an axes
+    buckets = max(int(axs.flat[0].get_window_extent().width), 1)
+    lines = []
+    for a, (title, ylabel, series) in zip(axs.flat, PANELS):
+        for key, label in series:
+            if key in layout:
+                start, size = layout[key]
+                for j in range(size):
+                    line, = a.plot([], [], label=label if j == 0 else None)
+                    lines.append((a, line, start + j))
+        a.set(xlabel='time [s]', ylabel=ylabel, title=title)
+        if a.lines:
+            a.legend(loc="upper left")
+
+    period = 1.0 / rate
+    while plt.fignum_exists(fig.number):
+        start_time = time.perf_counter()
+        before = int(count[0])
+        n = min(before, capacity)
+        rows = np.arange(before - n, before)
+        data = ring[rows % capacity]
+        # Rows the writer may have overwritten while they were copied
+        after = int(count[0])
+        valid = rows > after - capacity
+        rows, data = rows[valid], data[valid]
+        if len(rows):
+            index, values = minmax_downsample(data, buckets)
+            t = rows[index] * dt
+            for a, line, column in lines:
+                line.set_data(t[:, column], values[:, column])
+            for a in axs.flat:
+                if a.lines:
+                    a.relim()
+                    a.autoscale_view()
+            fig.canvas.draw_idle()
+        plt.pause(max(period - (time.perf_counter() - start_time), 1e-3))
+    shm.close()
@@ -0,0 +1,125 @@
+import time
+
+
+class LoopScheduler:
+    """按绝对截止时间调度的定频循环
+
+    第 k 步的截止时间为 start + k * dt / speed，睡眠时间总是相对于截止时间计算，
+    因此 viewer.sync、策略推理等耗时不会累积成漂移。
+
+    speed:
+        1.0  实时
+        N    N 倍实时
+        0    不限速 (尽可能快)
+    """
+
+    def __init__(self, dt, speed=1.0, max_lag_steps=20, spin_time=0.0002):
+        """
+        Args:
+            dt: 仿真步长 [s]
+            speed: 仿真时间与墙钟时间的目标比例，<= 0 表示不限速
+            max_lag_steps: 落后超过这么多步时放弃追赶，重新对齐截止时间
+            spin_time: 截止时间前最后这段时间忙等，提高定时精度 [s]
+        """
+        self.dt = dt
+        self.speed = speed
+        self.max_lag_steps = max_lag_steps
+        self.spin_time = spin_time
+        self.reset()
+
+    @property
+    def throttled(self):
+        return self.speed > 0
+
+    @property
+    def period(self):
+        """每一步对应的墙钟时间 [s]"""
+        return self.dt / self.speed if self.throttled else 0.0
+
+    @property
+    def sim_time(self):
+        """已经调度的仿真时间 [s]"""
+        return self.steps * self.dt
+
+    @property
+    def wall_time(self):
+        return time.perf_counter() - self.start_time
+
+    def reset(self):
+        self.steps = 0
+        self.overruns = 0
+        self.resyncs = 0
+        self.max_lateness = 0.0
+        self.total_lateness = 0.0
+        self.total_work = 0.0
+        self.max_work = 0.0
+        self.start_time = time.perf_counter()
+        self._origin = self.start_time
+        self._origin_step = 0
+        self._last_wake = self.start_time
+
+    def wait(self):
+        """结束当前一步，等待到下一步的截止时间
+
+        Returns:
+            本步相对截止时间的延迟 [s]，未超时为 0
+        """
+        now = time.perf_counter()
+        work = now - self._last_wake
+        self.total_work += work
+        if work > self.max_work:
+            self.max_work = work
+        self.steps += 1
+        if not self.throttled:
+            self._last_wake = now
+            return 0.0
+
+        period = self.dt / self.speed
+        deadline = self._origin + (self.steps - self._origin_step) * period
+        lateness = now - deadline
+
+        if lateness > 0:
+            self.overruns += 1
+            self.total_lateness += lateness
+            if lateness > self.max_lateness:
+                self.max_lateness = lateness
+            if lateness > self.max_lag_steps * period:
+                # 落后太多时不再突发追赶，以当前时刻为新的起点
+                self._origin = now
+                self._origin_step = self.steps
+                self.resyncs += 1
+            self._last_wake = now
+            return lateness
+
+        remaining = deadline - now
+        if remaining > self.spin_time:
+            time.sleep(remaining - self.spin_time)
+        while time.perf_counter() < deadline:
+            pass
+        self._last_wake = time.perf_counter()
+        return 0.0
+
+    def stats(self):
+        wall_time = self.wall_time
+        return {
+            "steps": self.steps,
+            "sim_time": self.sim_time,
+            "wall_time": wall_time,
+            "real_time_factor": self.sim_time / wall_time if wall_time > 0 else 0.0,
+            "target_speed": self.speed if self.throttled else float("inf"),
+            "overruns": self.overruns,
+            "overrun_ratio": self.overruns / self.steps if self.steps else 0.0,
+            "max_lateness_ms": self.max_lateness * 1000,
+            "mean_lateness_ms": self.total_lateness / self.overruns * 1000 if self.overruns else 0.0,
+            "resyncs": self.resyncs,
+            "mean_step_ms": self.total_work / self.steps * 1000 if self.steps else 0.0,
+            "max_step_ms": self.max_work * 1000,
+        }
+
+    def report(self):
+        s = self.stats()
+        return (f"sim {s['sim_time']:.2f}s / wall {s['wall_time']:.2f}s "
+                f"(RTF {s['real_time_factor']:.2f}, target {s['target_speed']}), "
+                f"overruns {s['overruns']}/{s['steps']} ({s['overrun_ratio'] * 100:.1f}%), "
+                f"max late {s['max_lateness_ms']:.2f}ms, resyncs {s['resyncs']}, "
+                f"step mean {s['mean_step_ms']:.3f}ms max {s['max_step_ms']:.3f}ms")
@@ -0,0 +1,219 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+import struct
+
+import numpy as np
+
+try:
+    import brotli
+except ImportError:  # brotli 是可选依赖，没有时只生成 gzip 版本
+    brotli = None
+
+MAGIC_MESH = b"DWQM"
+MESH_VERSION = 1
+# 转换流程的版本，参与缓存键的计算；修改编码方式时加一，旧缓存自动失效
+PIPELINE_VERSION = 1
+# magic | version u16 | flags u16 | vertex_count u32 | index_count u32 | bounds_min f32[3] | bounds_max f32[3]
+_HEADER = struct.Struct("<4sHHII3f3f")
+FLAG_INDEX_U32 = 0x1
+SUFFIX = ".dwqm"
+# Content-Encoding -> 预压缩文件的后缀，按优先顺序
+ENCODINGS = {"br": ".br", "gzip": ".gz"} if brotli is not None else {"gzip": ".gz"}
+
+
+def _align(n, alignment=4):
+    return -n % alignment
+
+
+def parse_obj(text):
+    """解析 OBJ 文本，返回每个三角形顶点 (corner) 的位置和法向量 (M*3, 3)
+
+    纹理坐标和材质被忽略 (网页端的材质在 robot_renderer.js 中指定)，多边形按扇形拆成三角形。
+    """
+    positions = []
+    normals = []
+    corners = []
+    for line in text.splitlines():
+        if line.startswith("v "):
+            positions.append(line.split()[1:4])
+        elif line.startswith("vn "):
+            normals.append(line.split()[1:4])
+        elif line.startswith("f "):
+            face = []
+            for corner in line.split()[1:]:
+                parts = corner.split("/")
+                if len(parts) < 3 or not parts[2]:
+                    raise ValueError("OBJ faces without normals are not supported")
+                face.append((int(parts[0]), int(parts[2])))
+            for k in range(1, len(face) - 1):
+                corners.extend((face[0], face[k], face[k + 1]))
+    positions = np.array(positions, dtype=np.float32).reshape(-1, 3)
+    normals = np.array(normals, dtype=np.float32).reshape(-1, 3)
+    corners = np.array(corners, dtype=np.int64).reshape(-1, 2)
+    # OBJ 下标从 1 开始，负数表示相对末尾
+    v = np.where(corners[:, 0] < 0, corners[:, 0] + len(positions), corners[:, 0] - 1)
+    n = np.where(corners[:, 1] < 0, corners[:, 1] + len(normals), corners[:, 1] - 1)
+    return positions[v], normals[n]
+
+
+def encode_mesh(positions, normals):
+    """三角形顶点 (M*3, 3) 编码成带索引的紧凑二进制网格
+
+    位置按包围盒量化为 uint16 (Go2 的网格尺寸下误差在 10 µm 以内)，法向量量化为 int8，
+    量化后完全相同的顶点合并，顶点按首次出现的顺序排列以保持 GPU 顶点缓存的局部性。
+    布局: 头 | positions u16[V*3] | normals i8[V*3] | 补齐到 4 字节 | indices u16/u32[I]
+    """
+    lo = positions.min(axis=0)
+    hi = positions.max(axis=0)
+    extent = np.maximum(hi - lo, 1e-9)
+    qpos = np.rint((positions - lo) / extent * 65535).astype(np.uint16)
+    length = np.linalg.norm(normals, axis=1, keepdims=True)
+    qnormal = np.rint(normals / np.maximum(length, 1e-12) * 127).astype(np.int8)
+
+    keys = np.hstack([qpos.astype(np.int32), qnormal.astype(np.int32)])
+    _, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    remap = np.empty(len(order), dtype=np.int64)
+    remap[order] = np.arange(len(order))
+    indices = remap[inverse.reshape(-1)]
+    vertices = first[order]
+
+    flags = FLAG_INDEX_U32 if len(vertices) > 0xFFFF else 0
+    header = _HEADER.pack(MAGIC_MESH, MESH_VERSION, flags, len(vertices), len(indices), *lo, *hi)
+    body = qpos[vertices].tobytes() + qnormal[vertices].tobytes()
+    body += b"\0" * _align(_HEADER.size + len(body))
+    body += indices.astype("<u4" if flags & FLAG_INDEX_U32 else "<u2").tobytes()
+    return header + body
+
+
+def decode_mesh(data):
+    """encode_mesh() 的逆过程 (用于检查)，返回 (positions (V, 3), normals (V, 3), indices)"""
+    magic, version, flags, vertex_count, index_count, *bounds = _HEADER.unpack_from(data)
+    if magic != MAGIC_MESH:
+        raise ValueError("not a mesh asset")
+    if version != MESH_VERSION:
+        raise ValueError(f"unsupported mesh asset version {version}")
+    lo = np.array(bounds[:3], dtype=np.float32)
+    hi = np.array(bounds[3:], dtype=np.float32)
+    offset = _HEADER.size
+    qpos = np.frombuffer(data, dtype="<u2", count=vertex_count * 3, offset=offset).reshape(-1, 3)
+    offset += qpos.nbytes
+    qnormal = np.frombuffer(data, dtype=np.int8, count=vertex_count * 3, offset=offset).reshape(-1, 3)
+    offset += qnormal.nbytes
+    offset += _align(offset)
+    indices = np.frombuffer(data, dtype="<u4" if flags & FLAG_INDEX_U32 else "<u2", count=index_count,
+                            offset=offset)
+    positions = lo + qpos.astype(np.float32) / 65535 * np.maximum(hi - lo, 1e-9)
+    return positions, qnormal.astype(np.float32) / 127, indices
+
+
+def source_hash(data):
+    """缓存键: 源文件内容和 PIPELINE_VERSION 的 sha256 前 16 个十六进制字符"""
+    return hashlib.sha256(data + f"|pipeline={PIPELINE_VERSION}".encode()).hexdigest()[:16]
+
+
+class MeshAssetCache:
+    """OBJ 网格一次性转换成二进制网格及其预压缩版本，按源文件哈希缓存在磁盘上
+
+    缓存文件名为 <网格名>.<哈希>.dwqm (以及 .gz / .br)，内容随名字固定，可以永久缓存；
+    源文件不变时 build() 只计算哈希，不重新转换。manifest 记录网格名到文件名的映射，
+    网页端先取 manifest，再按其中带哈希的文件名请求网格。
+    """
+
+    def __init__(self, source_dir, cache_dir):
+        self.source_dir = source_dir
+        self.cache_dir = cache_dir
+        # 网格名 -> {"file", "hash", "size", "source_size", "encoded": {encoding: size}}
+        self.manifest = {}
+        self.manifest_etag = None
+        self.converted = 0
+
+    def build(self):
+        """转换 source_dir 中缺少缓存的 OBJ，删除同名网格的过期缓存，返回 manifest"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        manifest = {}
+        for name in sorted(os.listdir(self.source_dir)):
+            stem, ext = os.path.splitext(name)
+            if ext.lower() != ".obj":
+                continue
+            with open(os.path.join(self.source_dir, name), "rb") as f:
+                source = f.read()
+            digest = source_hash(source)
+            file_name = f"{stem}.{digest}{SUFFIX}"
+            path = os.path.join(self.cache_dir, file_name)
+            if not all(os.path.exists(path + suffix) for suffix in ["", *ENCODINGS.values()]):
+                try:
+                    data = encode_mesh(*parse_obj(source.decode()))
+                except ValueError as e:
+                    print(f"[MeshAssets] Skipping {name}: {e}")
+                    continue
+                self._write(path, data)
+                for encoding, suffix in ENCODINGS.items():
+                    self._write(path + suffix, compress(data, encoding))
+                self.converted += 1
+            self._prune(stem, digest)
+            manifest[stem] = {
+                "file": file_name,
+                "hash": digest,
+                "size": os.path.getsize(path),
+                "source_size": len(source),
+                "encoded": {encoding: os.path.getsize(path + suffix) for encoding, suffix in ENCODINGS.items()},
+            }
+        self.manifest = manifest
+        self.manifest_etag = hashlib.sha256(json.dumps(manifest, sort_keys=True).encode()).hexdigest()[:16]
+        return manifest
+
+    @staticmethod
+    def _write(path, data):
+        # 先写临时文件再改名，读者不会看到写了一半的缓存
+        tmp = f"{path}.tmp{os.getpid()}"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _prune(self, stem, digest):
+        pattern = re.compile(re.escape(stem) + r"\.([0-9a-f]{16})" + re.escape(SUFFIX) + r"(\.gz|\.br)?$")
+        for name in os.listdir(self.cache_dir):
+            match = pattern.match(name)
+            if match and match.group(1) != digest:
+                os.remove(os.path.join(self.cache_dir, name))
+
+    def lookup(self, file_name):
+        """带哈希的文件名 -> manifest 项，不在 manifest 中时返回 None"""
+        stem = file_name.split(".", 1)[0]
+        entry = self.manifest.get(stem)
+        return entry if entry is not None and entry["file"] == file_name else None
+
+    def path(self, entry, encoding=None):
+        return os.path.join(self.cache_dir, entry["file"] + (ENCODINGS[encoding] if encoding else ""))
+
+
+def compress(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=11)
+    if encoding == "gzip":
+        # mtime=0 使输出只取决于内容
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    raise ValueError(f"unknown encoding '{encoding}'")
+
+
+def negotiate(accept_encoding):
+    """按 Accept-Encoding 选择预压缩版本，返回 ENCODINGS 中的一个或 None (不压缩)"""
+    accepted = {}
+    for item in (accept_encoding or "").split(","):
+        token, _, params = item.strip().partition(";")
+        q = 1.0
+        match = re.search(r"q\s*=\s*([0-9.]+)", params)
+        if match:
+            try:
+                q = float(match.group(1))
+            except ValueError:
+                q = 0.0
+        accepted[token.strip().lower()] = q
+    for encoding in ENCODINGS:
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
@@ -1,59 +1,203 @@
+import json
+import zipfile
+
 import numpy as np
 
+# AMP 帧的字段，按列顺序；每个字段的列数在第一次采样时确定
+AMP_FIELDS = ("pos", "quat", "q", "foot_pos", "vel", "omega", "dq", "foot_vel")
+# 流式导出时每次格式化 / 写入的行数
+EXPORT_CHUNK_ROWS = 8192
+
+
+# 行之间的分隔，每行以它开头，输出时去掉第一行的
+_ROW_SEPARATOR = ",\n  "
+_SEPARATOR_BYTES = np.frombuffer((_ROW_SEPARATOR + "[").encode(), dtype=np.uint8)
+
+
+def _format_chunk_exact(chunk, decimals):
+    """所有行用同一个 % 格式串一次格式化，结果与逐个元素 f"{x:.{decimals}f}" 相同"""
+    row_format = _ROW_SEPARATOR + "[" + ", ".join([f"%.{decimals}f"] * chunk.shape[1]) + "]"
+    return (row_format * len(chunk)) % tuple(chunk.ravel().tolist())
+
+
+def _format_chunk_fast(chunk, decimals):
+    """向量化的定点数格式化，结果与 _format_chunk_exact 逐字节相同，无法保证时返回 None
+
+    每个元素先放进定宽的字节字段 (符号、整数位、小数点、小数位、", ")，不需要的前导位置填 0，
+    最后整块去掉填充字节。四舍五入由 np.rint(x * 10^decimals) 完成，乘法的舍入误差可能越过 .5 的
+    边界时，以及非有限值、超过 uint32 的值和 10^decimals 超过 uint32 (decimals >= 10) 时，整块交给 _format_chunk_exact。
+    """
+    if 10 ** decimals >= 2 ** 32:
+        return None
+    n, w = chunk.shape
+    values = chunk.ravel()
+    scaled = values * 10.0 ** decimals
+    rounded = np.rint(scaled)
+    magnitude = np.abs(rounded)
+    top = magnitude.max(initial=0.0)
+    if not top < 2 ** 32:
+        return None
+    if (np.abs(scaled - rounded) >= 0.5 - 2 * np.spacing(top + 1.0)).any():
+        return None
+    magnitude = magnitude.astype(np.uint32)
+    int_part, frac_part = np.divmod(magnitude, np.uint32(10 ** decimals))
+    int_digits = len(str(int(int_part.max(initial=0))))
+    width = 1 + int_digits + (1 + decimals if decimals else 0) + 2
+    fields = np.zeros((n * w, width), dtype=np.uint8)
+    # 符号取自原值，-0.0 和舍入到 0 的负数也输出 "-"，与 % 格式化一致
+    fields[:, 0] = np.signbit(values) * np.uint8(ord("-"))
+    rest = int_part
+    for k in range(int_digits):
+        rest, digit = np.divmod(rest, np.uint32(10))
+        chars = digit.astype(np.uint8) + np.uint8(ord("0"))
+        fields[:, int_digits - k] = chars if k == 0 else chars * (int_part >= 10 ** k)
+    if decimals:
+        fields[:, 1 + int_digits] = ord(".")
+        rest = frac_part
+        for k in range(decimals):
+            rest, digit = np.divmod(rest, np.uint32(10))
+            fields[:, 1 + int_digits + decimals - k] = digit.astype(np.uint8) + np.uint8(ord("0"))
+    fields[:, -2:] = np.frombuffer(b", ", dtype=np.uint8)
+    # 每行: ",\n  [" + 各字段 (去掉最后一个 ", " 中的空格，逗号位置换成 "]")
+    rows = np.empty((n, len(_SEPARATOR_BYTES) + w * width - 1), dtype=np.uint8)
+    rows[:, :len(_SEPARATOR_BYTES)] = _SEPARATOR_BYTES
+    rows[:, len(_SEPARATOR_BYTES):] = fields.reshape(n, w * width)[:, :-1]
+    rows[:, -1] = ord("]")
+    out = rows.ravel()
+    return out[out != 0].tobytes().decode("ascii")
+
+
+def iter_formatted(chunks, decimals=5):
+    """按块生成 numpy_to_formatted_list 格式的文本片段
+
+    chunks: 二维数组的可迭代对象，列数相同
+    """
+    yield "["
+    first = True
+    for chunk in chunks:
+        chunk = np.asarray(chunk, dtype=np.float64)
+        if len(chunk) == 0:
+            continue
+        text = _format_chunk_fast(chunk, decimals)
+        if text is None:
+            text = _format_chunk_exact(chunk, decimals)
+        yield text[len(_ROW_SEPARATOR):] if first else text
+        first = False
+    yield "]" if first else "\n]"
+
 
 def numpy_to_formatted_list(arr, decimals=5):
     """
     将 NumPy 数组转换为带有特定格式的字符串列表。
     """
-    # 开始构建字符串
-    formatted_str = "["
+    arr = np.asarray(arr)
+    chunks = (arr[i:i + EXPORT_CHUNK_ROWS] for i in range(0, len(arr), EXPORT_CHUNK_ROWS))
+    return "".join(iter_formatted(chunks, decimals))
+
+
+def field_offsets(widths, fields=AMP_FIELDS):
+    """字段名 -> [起始列, 结束列)"""
+    offsets = {}
+    start = 0
+    for name, width in zip(fields, widths):
+        offsets[name] = (start, start + width)
+        start += width
+    return offsets
+
 
-    # 遍历每一行
-    for i, row in enumerate(arr):
-        if i > 0:
-            formatted_str += "  "  # 除了第一行，其他行前面加两个空格
+def export_text(path, chunks, decimals=5):
+    """以 numpy_to_formatted_list 的格式逐块写入文本文件，内存中只保留一块"""
+    with open(path, "w") as f:
+        for text in iter_formatted(chunks, decimals):
+            f.write(text)
 
-        formatted_str += "["
 
-        # 遍历行中的每个元素
-        for j, elem in enumerate(row):
-            # 格式化数字，保留指定小数位数
-            formatted_str += f"{elem:.{decimals}f}"
-            if j < len(row) - 1:
-                formatted_str += ", "  # 元素之间加逗号和空格
+def _write_npy(f, chunks, dtype, rows, width=None):
+    """写 .npy 头和各块的数据，rows 为总行数，width 为 None 时写一维的 structured 数组"""
+    shape = (rows,) if width is None else (rows, width)
+    header = {"descr": np.lib.format.dtype_to_descr(dtype), "fortran_order": False, "shape": shape}
+    np.lib.format.write_array_header_1_0(f, header)
+    for chunk in chunks:
+        f.write(np.ascontiguousarray(chunk, dtype=np.float64).tobytes())
 
-        formatted_str += "]"
-        if i < len(arr) - 1:
-            formatted_str += ","  # 行之间加逗号
 
-        formatted_str += "\n"  # 每行结束后换行
+def export_npy(path, chunks, rows, offsets):
+    """写成一维 structured 数组的 .npy，字段名和列范围保存在文件头的 dtype 中，
+    np.load(path)["foot_pos"] 即为 (rows, 12) 的数组"""
+    dtype = np.dtype([(name, "<f8", (end - start,)) for name, (start, end) in offsets.items()])
+    with open(path, "wb") as f:
+        _write_npy(f, chunks, dtype, rows)
+
+
+def export_npz(path, chunks, rows, offsets):
+    """写成 .npz: data 为 (rows, 列数) 的二维数组，fields 为 JSON 格式的字段列范围
+
+    data 逐块写入 zip，不在内存中拼接完整数组。
+    """
+    width = max(end for _, end in offsets.values())
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED, allowZip64=True) as archive:
+        with archive.open("data.npy", "w", force_zip64=True) as f:
+            _write_npy(f, chunks, np.dtype("<f8"), rows, width)
+        with archive.open("fields.npy", "w") as f:
+            np.lib.format.write_array(f, np.array(json.dumps(offsets)))
+
+
+def load_fields(path):
+    """读取 export_npz / export_npy 的输出，返回字段名 -> (rows, n) 数组"""
+    if str(path).endswith(".npz"):
+        with np.load(path) as archive:
+            data = archive["data"]
+            offsets = json.loads(archive["fields"].item())
+        return {name: data[:, start:end] for name, (start, end) in offsets.items()}
+    data = np.load(path)
+    return {name: data[name] for name in data.dtype.names}
 
-    formatted_str += "]"
-    return formatted_str
 
 class AMPCollector:
-    def __init__(self, interval=0.02):
-        self.data_list = []
+    """按时间间隔采样 AMP 动作数据，写入预分配的块 (每块 chunk_size 行)，不为每帧创建数组"""
+
+    def __init__(self, interval=0.02, chunk_size=EXPORT_CHUNK_ROWS):
         self.last_stack_time = 0
         self.interval = interval
+        self.chunk_size = chunk_size
+        self.chunks = []
+        self.offsets = None
+        self.count = 0
+        self._n = 0
 
     def amp_collector(self, t, pos, quat, q, foot_pos, vel, omega, dq, foot_vel):
         if t - self.last_stack_time > self.interval:
-            data = np.concatenate([
-                pos,
-                quat,
-                q,
-                foot_pos,
-                vel,
-                omega,
-                dq,
-                foot_vel
-            ])
-            self.data_list.append(data)
+            values = (pos, quat, q, foot_pos, vel, omega, dq, foot_vel)
+            if self.offsets is None:
+                self.offsets = field_offsets([np.size(value) for value in values])
+            if not self.chunks or self._n == self.chunk_size:
+                self.chunks.append(np.empty((self.chunk_size, max(end for _, end in self.offsets.values()))))
+                self._n = 0
+            row = self.chunks[-1][self._n]
+            for (start, end), value in zip(self.offsets.values(), values):
+                row[start:end] = value
+            self._n += 1
+            self.count += 1
             self.last_stack_time = t
 
+    def iter_chunks(self):
+        """已采样的数据，按块返回视图"""
+        for i, chunk in enumerate(self.chunks):
+            yield chunk if i < len(self.chunks) - 1 else chunk[:self._n]
+
+    def export(self, path, decimals=5):
+        """按扩展名导出: .npy / .npz 为带字段列范围的二进制，其它为 get_data() 的文本格式"""
+        binary = path.endswith((".npy", ".npz"))
+        if binary and self.offsets is None:
+            # 字段的列范围由第一条样本决定，没有样本时无法写出结构化的二进制格式
+            raise ValueError("AMPCollector has no samples")
+        if path.endswith(".npy"):
+            export_npy(path, self.iter_chunks(), self.count, self.offsets)
+        elif path.endswith(".npz"):
+            export_npz(path, self.iter_chunks(), self.count, self.offsets)
+        else:
+            export_text(path, self.iter_chunks(), decimals)
+
     def get_data(self):
-        data = np.array(self.data_list)
-        print("shape of data:",data.shape)
-        formatted_data = numpy_to_formatted_list(data)
-        return formatted_data
+        print("shape of data:", (self.count, max((end for _, end in (self.offsets or {}).values()), default=0)))
+        return "".join(iter_formatted(self.iter_chunks()))
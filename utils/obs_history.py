@@ -0,0 +1,70 @@
+import numpy as np
+import torch
+
+
+class ObsHistory:
+    """预分配的观测历史环形缓冲区
+
+    缓冲区按帧存储两份 (镜像写入)，因此最近 frame_stack 帧总是一段连续内存，
+    顺序为从旧到新，与训练时 obs_history 的拼接顺序一致：
+        [obs_{t-frame_stack+1}, ..., obs_{t-1}, obs_t]
+
+    numpy 缓冲区与 torch 张量共享内存，每个可能的起始位置的视图在构造时创建好，
+    push 之后直接取 tensor 作为策略输入，不会再分配新的数组或张量。
+    """
+
+    def __init__(self, num_single_obs, frame_stack, num_envs=1, dtype=np.float32):
+        self.num_single_obs = num_single_obs
+        self.frame_stack = frame_stack
+        self.num_envs = num_envs
+        self.num_observations = num_single_obs * frame_stack
+
+        self._buf = np.zeros((num_envs, 2 * frame_stack, num_single_obs), dtype=dtype)
+        flat = self._buf.reshape(num_envs, 2 * frame_stack * num_single_obs)
+        flat_tensor = torch.from_numpy(flat)
+
+        self._arrays = []
+        self._tensors = []
+        for start in range(frame_stack):
+            lo = start * num_single_obs
+            hi = lo + self.num_observations
+            self._arrays.append(flat[:, lo:hi])
+            self._tensors.append(flat_tensor[:, lo:hi])
+        self._frames = [self._buf[:, start:start + frame_stack] for start in range(frame_stack)]
+        self._slots = [(self._buf[:, slot], self._buf[:, slot + frame_stack]) for slot in range(frame_stack)]
+        self._head = 0
+
+    def push(self, obs):
+        """写入最新一帧
+
+        Args:
+            obs: (num_single_obs,) 或 (num_envs, num_single_obs)
+        """
+        slot, mirror = self._slots[self._head]
+        np.copyto(slot, obs)
+        np.copyto(mirror, obs)
+        self._head += 1
+        if self._head == self.frame_stack:
+            self._head = 0
+
+    def reset(self, env_ids=None, fill=0.0):
+        """清空历史，env_ids 为 None 时清空全部环境"""
+        if env_ids is None:
+            self._buf[:] = fill
+        else:
+            self._buf[env_ids] = fill
+
+    @property
+    def tensor(self):
+        """(num_envs, frame_stack * num_single_obs) 的 torch 视图，可直接作为策略输入"""
+        return self._tensors[self._head]
+
+    @property
+    def array(self):
+        """与 tensor 共享内存的 numpy 视图"""
+        return self._arrays[self._head]
+
+    @property
+    def frames(self):
+        """(num_envs, frame_stack, num_single_obs) 的 numpy 视图，从旧到新"""
+        return self._frames[self._head]
@@ -0,0 +1,199 @@
+import os
+
+import numpy as np
+import torch
+
+BACKENDS = ("reference", "torchscript", "onnx")
+
+
+def _to_eager(module):
+    """把导出的 TorchScript MLP (Sequential/Linear/激活函数) 还原为 eager nn.Module"""
+    kind = module.original_name
+    if kind == "Sequential":
+        return torch.nn.Sequential(*[_to_eager(child) for _, child in module.named_children()])
+    if kind == "Linear":
+        out_features, in_features = module.weight.shape
+        linear = torch.nn.Linear(in_features, out_features)
+        linear.load_state_dict({"weight": module.weight.detach(), "bias": module.bias.detach()})
+        return linear
+    if kind in ("ELU", "ReLU", "Tanh", "Sigmoid"):
+        return getattr(torch.nn, kind)()
+    raise TypeError(f"unsupported module in exported policy: {kind}")
+
+
+class ExplicitNoisePolicy(torch.nn.Module):
+    """与导出的 DreamWaQ 策略等价，但 VAE 的采样噪声作为输入
+
+    原模型在 reparameterize 里调用 randn_like，无法在 ONNX 等后端中复现同样的随机数。
+    这里按相同顺序从 torch 的随机数发生器取噪声 (sample_noise)，
+    因此在同一个随机种子下各后端的输出可以逐元素对比。
+    """
+
+    def __init__(self, scripted):
+        super().__init__()
+        vae = scripted.vae
+        self.encoder = _to_eager(vae.encoder.encoder)
+        self.latent_mu = _to_eager(vae.latent_mu)
+        self.latent_var = _to_eager(vae.latent_var)
+        self.vel_mu = _to_eager(vae.vel_mu)
+        self.vel_var = _to_eager(vae.vel_var)
+        self.actor = _to_eager(scripted.actor)
+        self.sigma_min = float(vae.sigma_min)
+        self.sigma_max = float(vae.sigma_max)
+        self.num_obs = int(scripted.num_obs)
+        self.num_obs_hist = int(scripted.num_obs_hist)
+        self.latent_dim = self.latent_mu.out_features
+        self.vel_dim = self.vel_mu.out_features
+        self.eval()
+
+    def _constrain_logvar(self, logvar):
+        sigma = torch.clamp(torch.exp(logvar * 0.5), self.sigma_min, self.sigma_max)
+        return torch.log(sigma + 1e-8) * 2
+
+    def forward(self, obs_history, eps_z, eps_v):
+        encoded = self.encoder(obs_history)
+        latent_var = self._constrain_logvar(self.latent_var(encoded))
+        vel_var = self._constrain_logvar(self.vel_var(encoded))
+        z = eps_z * torch.exp(latent_var * 0.5) + self.latent_mu(encoded)
+        v = eps_v * torch.exp(vel_var * 0.5) + self.vel_mu(encoded)
+        current = obs_history[:, self.num_obs * (self.num_obs_hist - 1):self.num_obs * self.num_obs_hist]
+        return self.actor(torch.cat([z, v, current], 1))
+
+    def sample_noise(self, batch_size):
+        eps_z = torch.randn(batch_size, self.latent_dim)
+        eps_v = torch.randn(batch_size, self.vel_dim)
+        return eps_z, eps_v
+
+
+class PolicyEngine:
+    """策略推理后端的基类
+
+    调用方式: actions = engine(obs_history)
+        obs_history: (N, num_observations) 的 torch.Tensor 或 np.ndarray (float32)
+        actions: (N, num_actions) 的 np.ndarray (float32)
+    """
+    name = "base"
+
+    def __init__(self, num_threads=None):
+        self.num_threads = num_threads
+        if num_threads:
+            torch.set_num_threads(num_threads)
+
+    def __call__(self, obs_history):
+        raise NotImplementedError
+
+
+class ReferenceEngine(PolicyEngine):
+    """与原脚本一致的调用方式，作为数值对比的基准"""
+    name = "reference"
+
+    def __init__(self, module, num_threads=None):
+        super().__init__(num_threads)
+        self.module = module
+
+    def __call__(self, obs_history):
+        if isinstance(obs_history, np.ndarray):
+            obs_history = torch.from_numpy(obs_history)
+        return self.module(obs_history).detach().numpy()
+
+
+class TorchScriptEngine(PolicyEngine):
+    """冻结并优化后的 TorchScript，在 inference_mode 下运行"""
+    name = "torchscript"
+
+    def __init__(self, module, num_threads=None, optimize=True):
+        super().__init__(num_threads)
+        module = module.eval()
+        if optimize:
+            module = torch.jit.optimize_for_inference(torch.jit.freeze(module))
+        self.module = module
+
+    def __call__(self, obs_history):
+        if isinstance(obs_history, np.ndarray):
+            obs_history = torch.from_numpy(obs_history)
+        with torch.inference_mode():
+            return self.module(obs_history).numpy()
+
+
+class OnnxEngine(PolicyEngine):
+    """导出为 ONNX 并使用 ONNX Runtime CPU 推理，需要安装 onnx 和 onnxruntime
+
+    onnx_path 已存在时直接加载，不需要原始 TorchScript 模块。
+    """
+    name = "onnx"
+
+    def __init__(self, onnx_path, module=None, num_threads=None):
+        super().__init__(num_threads)
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("ONNX backend requires onnxruntime: pip install onnx onnxruntime") from e
+
+        if not os.path.exists(onnx_path):
+            if module is None:
+                raise FileNotFoundError(f"{onnx_path} does not exist and no policy module to export")
+            export_onnx(ExplicitNoisePolicy(module), onnx_path)
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+        inputs = {i.name: i.shape for i in self.session.get_inputs()}
+        self.latent_dim = inputs["eps_z"][1]
+        self.vel_dim = inputs["eps_v"][1]
+
+    def __call__(self, obs_history):
+        if isinstance(obs_history, torch.Tensor):
+            obs_history = obs_history.numpy()
+        # 与 ExplicitNoisePolicy.sample_noise 相同的取数顺序
+        batch_size = obs_history.shape[0]
+        eps_z = torch.randn(batch_size, self.latent_dim)
+        eps_v = torch.randn(batch_size, self.vel_dim)
+        return self.session.run(None, {
+            "obs_history": np.ascontiguousarray(obs_history),
+            "eps_z": eps_z.numpy(),
+            "eps_v": eps_v.numpy(),
+        })[0]
+
+
+def export_onnx(policy, onnx_path):
+    """导出 ExplicitNoisePolicy，batch 维度为动态"""
+    num_observations = policy.num_obs * policy.num_obs_hist
+    dummy = (torch.zeros(1, num_observations), *policy.sample_noise(1))
+    os.makedirs(os.path.dirname(os.path.abspath(onnx_path)), exist_ok=True)
+    torch.onnx.export(
+        policy, dummy, onnx_path,
+        input_names=["obs_history", "eps_z", "eps_v"],
+        output_names=["actions"],
+        dynamic_axes={name: {0: "batch"} for name in ("obs_history", "eps_z", "eps_v", "actions")},
+        dynamo=False,
+    )
+
+
+def make_engine(module, backend="torchscript", num_threads=None, policy_path=None, onnx_path=None):
+    """根据后端名称构建推理引擎
+
+    Args:
+        module: torch.jit.load 得到的策略
+        backend: "reference" | "torchscript" | "onnx"
+        num_threads: intra-op 线程数，None 表示使用 torch 默认值
+        policy_path: 策略文件路径，用于推导默认的 ONNX 文件路径
+        onnx_path: ONNX 文件路径，不存在时自动导出
+    """
+    if backend == "reference":
+        return ReferenceEngine(module, num_threads)
+    if backend == "torchscript":
+        return TorchScriptEngine(module, num_threads)
+    if backend == "onnx":
+        if onnx_path is None:
+            if policy_path is None:
+                raise ValueError("onnx backend needs onnx_path or policy_path")
+            onnx_path = os.path.splitext(policy_path)[0] + ".onnx"
+        return OnnxEngine(onnx_path, module, num_threads)
+    raise ValueError(f"unknown policy backend '{backend}', expected one of {BACKENDS}")
+
+
+def load_engine(policy_path, backend="torchscript", num_threads=None, onnx_path=None):
+    module = torch.jit.load(policy_path)
+    return make_engine(module, backend, num_threads, policy_path=policy_path, onnx_path=onnx_path)
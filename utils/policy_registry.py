@@ -0,0 +1,145 @@
+import hashlib
+import os
+import threading
+
+import torch
+
+from utils.policy_engine import BACKENDS, OnnxEngine, ReferenceEngine, TorchScriptEngine, export_onnx, \
+    ExplicitNoisePolicy
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "DREAMWAQ_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "dreamwaq", "policies"))
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class PolicyRegistry:
+    """按文件内容哈希索引的策略注册表
+
+    - 进程内: 同一份策略文件 (按内容而非路径判断) 只反序列化一次，引擎按 (哈希, 后端, 线程数) 复用
+    - 磁盘: 冻结/优化后的 TorchScript 与导出的 ONNX 以哈希命名缓存在 cache_dir，
+      再次启动或 worker 进程直接加载优化后的产物，跳过原始模型的加载和 freeze
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self._digests = {}
+        self._modules = {}
+        self._engines = {}
+        self._lock = threading.RLock()
+
+    def digest(self, path):
+        """策略文件的 sha256，按 (路径, 大小, 修改时间) 记忆避免重复计算"""
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        key = (path, st.st_size, st.st_mtime_ns)
+        digest = self._digests.get(key)
+        if digest is None:
+            digest = file_sha256(path)
+            self._digests[key] = digest
+        return digest
+
+    def module(self, path):
+        """原始的 TorchScript 策略 (与 torch.jit.load 的结果相同)"""
+        with self._lock:
+            digest = self.digest(path)
+            module = self._modules.get(digest)
+            if module is None:
+                module = torch.jit.load(path)
+                self._modules[digest] = module
+            return module
+
+    def engine(self, path, backend="torchscript", num_threads=None):
+        if backend not in BACKENDS:
+            raise ValueError(f"unknown policy backend '{backend}', expected one of {BACKENDS}")
+        with self._lock:
+            digest = self.digest(path)
+            key = (digest, backend, num_threads)
+            engine = self._engines.get(key)
+            if engine is None:
+                engine = self._build(path, digest, backend, num_threads)
+                self._engines[key] = engine
+            return engine
+
+    def artifact_path(self, digest, backend):
+        if backend == "torchscript":
+            # 冻结后的图与 torch 版本相关
+            name = f"{digest[:32]}-frozen-torch{torch.__version__}.pt"
+        elif backend == "onnx":
+            name = f"{digest[:32]}.onnx"
+        else:
+            return None
+        return os.path.join(self.cache_dir, name)
+
+    def _build(self, path, digest, backend, num_threads):
+        if backend == "reference":
+            return ReferenceEngine(self.module(path), num_threads)
+
+        artifact = self.artifact_path(digest, backend)
+        if backend == "torchscript":
+            if os.path.exists(artifact):
+                try:
+                    return TorchScriptEngine(torch.jit.load(artifact), num_threads, optimize=False)
+                except RuntimeError as e:
+                    print(f"Ignoring unreadable policy cache {artifact}: {e}")
+            engine = TorchScriptEngine(self.module(path), num_threads)
+            self._atomic_write(artifact, lambda tmp: torch.jit.save(engine.module, tmp))
+            return engine
+
+        if not os.path.exists(artifact):
+            policy = ExplicitNoisePolicy(self.module(path))
+            self._atomic_write(artifact, lambda tmp: export_onnx(policy, tmp))
+        return OnnxEngine(artifact, num_threads=num_threads)
+
+    def _atomic_write(self, target, write):
+        # 多个 worker 进程可能同时写同一个缓存文件，先写临时文件再原子替换
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            write(tmp)
+            os.replace(tmp, target)
+        except OSError as e:
+            print(f"Could not write policy cache {target}: {e}")
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def clear(self):
+        """清空进程内缓存，磁盘缓存保留"""
+        with self._lock:
+            self._digests.clear()
+            self._modules.clear()
+            self._engines.clear()
+
+
+_registry = None
+
+
+def get_registry():
+    global _registry
+    if _registry is None:
+        _registry = PolicyRegistry()
+    return _registry
+
+
+def load_policy(cfg):
+    """按 cfg.inference_config 从全局注册表获取推理引擎"""
+    return get_registry().engine(cfg.policy_root, cfg.inference_config.backend,
+                                 cfg.inference_config.num_threads)
+
+
+class LazyPolicy:
+    """Sim2simCfg.whole_policy 的描述符，第一次访问时才通过注册表加载 policy_root"""
+
+    def __get__(self, instance, owner):
+        policy_root = getattr(instance if instance is not None else owner, "policy_root")
+        return get_registry().module(policy_root)
@@ -0,0 +1,185 @@
+import json
+import math
+import os
+import threading
+import time
+
+
+class StageProfiler:
+    """控制循环各阶段耗时的直方图和 Chrome trace 时间线
+
+    每个阶段一个定长的对数直方图 (min_time 到 max_time，每个数量级 bins_per_decade 个桶)，
+    record() 只做一次 log10 和几次列表写入，不分配数组；分位数由直方图估计，
+    误差不超过一个桶的宽度 (默认约 6%)，最大值精确记录。
+
+    trace_events > 0 时另外保留最近 trace_events 个事件的环形缓冲，可以导出为
+    Chrome trace / Perfetto 可直接打开的 JSON。
+
+    每个阶段只由一个线程记录 (stage() 的 thread 参数)，直方图按阶段分开，不需要加锁；
+    环形缓冲由所有线程共用 (控制线程和渲染线程)，写入和导出在 _lock 内进行。
+    """
+
+    def __init__(self, min_time=1e-7, max_time=1.0, bins_per_decade=40, trace_events=0, max_stages=32):
+        """
+        Args:
+            min_time: 直方图最小桶的下界 [s]，更短的耗时计入第一个桶
+            max_time: 直方图最大桶的上界 [s]，更长的耗时计入最后一个桶
+            bins_per_decade: 每个数量级的桶数
+            trace_events: 时间线环形缓冲的事件数，0 表示不记录时间线
+            max_stages: 阶段数上限，所有缓冲区在构造时按该上限分配
+        """
+        self.min_time = min_time
+        self.bins_per_decade = bins_per_decade
+        self.num_bins = int(math.ceil(math.log10(max_time / min_time) * bins_per_decade))
+        self.max_stages = max_stages
+        self._log_min = math.log10(min_time)
+        self._lock = threading.Lock()
+
+        self.names = []
+        self.threads = []
+        self._hist = [[0] * self.num_bins for _ in range(max_stages)]
+        self._count = [0] * max_stages
+        self._total = [0.0] * max_stages
+        self._max = [0.0] * max_stages
+
+        self.trace_events = trace_events
+        self._trace_stage = [0] * trace_events
+        self._trace_start = [0.0] * trace_events
+        self._trace_dur = [0.0] * trace_events
+        self._trace_n = 0
+        self.origin = time.perf_counter()
+
+    def stage(self, name, thread="control"):
+        """注册阶段并返回其编号，同名阶段返回已有编号；应在进入循环之前调用"""
+        with self._lock:
+            if name in self.names:
+                return self.names.index(name)
+            if len(self.names) == self.max_stages:
+                raise ValueError(f"too many profiler stages (max_stages={self.max_stages})")
+            self.names.append(name)
+            self.threads.append(thread)
+            return len(self.names) - 1
+
+    def record(self, stage, start, end):
+        """记录一次耗时，start/end 为 time.perf_counter() 的读数"""
+        dt = end - start
+        self._count[stage] += 1
+        self._total[stage] += dt
+        if dt > self._max[stage]:
+            self._max[stage] = dt
+        if dt > self.min_time:
+            b = int((math.log10(dt) - self._log_min) * self.bins_per_decade)
+            if b >= self.num_bins:
+                b = self.num_bins - 1
+        else:
+            b = 0
+        self._hist[stage][b] += 1
+
+        if self.trace_events:
+            with self._lock:
+                i = self._trace_n % self.trace_events
+                self._trace_stage[i] = stage
+                self._trace_start[i] = start
+                self._trace_dur[i] = dt
+                self._trace_n += 1
+
+    def count(self, stage):
+        """阶段已记录的次数"""
+        return self._count[stage]
+
+    def reset(self):
+        for stage in range(len(self.names)):
+            self._hist[stage][:] = [0] * self.num_bins
+            self._count[stage] = 0
+            self._total[stage] = 0.0
+            self._max[stage] = 0.0
+        with self._lock:
+            self._trace_n = 0
+        self.origin = time.perf_counter()
+
+    def _bin_upper(self, b):
+        return 10 ** (self._log_min + (b + 1) / self.bins_per_decade)
+
+    def _quantiles(self, hist, count, qs):
+        targets = [q * count for q in qs]
+        out = [0.0] * len(qs)
+        acc = 0
+        k = 0
+        for b, n in enumerate(hist):
+            acc += n
+            while k < len(qs) and acc >= targets[k] and acc > 0:
+                out[k] = self._bin_upper(b)
+                k += 1
+            if k == len(qs):
+                break
+        return out
+
+    def stats(self):
+        """各阶段的 count / mean / p50 / p95 / p99 / max (ms)，可在循环运行时随时调用"""
+        stats = {}
+        for stage, name in enumerate(self.names):
+            count = self._count[stage]
+            if count == 0:
+                continue
+            max_time = self._max[stage]
+            p50, p95, p99 = self._quantiles(list(self._hist[stage]), count, (0.50, 0.95, 0.99))
+            stats[name] = {
+                "count": count,
+                "total_s": self._total[stage],
+                "mean_ms": self._total[stage] / count * 1000,
+                # 桶的上界可能超过真实最大值
+                "p50_ms": min(p50, max_time) * 1000,
+                "p95_ms": min(p95, max_time) * 1000,
+                "p99_ms": min(p99, max_time) * 1000,
+                "max_ms": max_time * 1000,
+            }
+        return stats
+
+    def report(self):
+        stats = self.stats()
+        lines = [f"{'stage':<28}{'count':>9}{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}  (ms)"]
+        for name, s in stats.items():
+            lines.append(f"{name:<28}{s['count']:>9}{s['mean_ms']:>9.3f}{s['p50_ms']:>9.3f}"
+                         f"{s['p95_ms']:>9.3f}{s['p99_ms']:>9.3f}{s['max_ms']:>9.3f}")
+        return "\n".join(lines)
+
+    def trace(self):
+        """环形缓冲中的事件，按开始时间排序，转换成 Chrome trace 的 complete ("X") 事件"""
+        with self._lock:
+            total = self._trace_n
+            stages, starts, durations = list(self._trace_stage), list(self._trace_start), list(self._trace_dur)
+        n = min(total, self.trace_events)
+        first = total - n
+        tids = {thread: i for i, thread in enumerate(dict.fromkeys(self.threads))}
+        events = [{"ph": "M", "name": "thread_name", "pid": os.getpid(), "tid": tid, "args": {"name": thread}}
+                  for thread, tid in tids.items()]
+        pid = os.getpid()
+        for k in range(first, total):
+            i = k % self.trace_events
+            stage = stages[i]
+            events.append({
+                "ph": "X",
+                "name": self.names[stage],
+                "pid": pid,
+                "tid": tids[self.threads[stage]],
+                "ts": (starts[i] - self.origin) * 1e6,
+                "dur": durations[i] * 1e6,
+            })
+        events[len(tids):] = sorted(events[len(tids):], key=lambda e: (e["ts"], -e["dur"]))
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export_trace(self, path):
+        """写出 Chrome trace JSON，可在 chrome://tracing 或 ui.perfetto.dev 中打开"""
+        if not self.trace_events:
+            raise ValueError("trace recording is disabled (trace_events=0)")
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.trace(), f)
+
+
+def make_profiler(cfg):
+    """按 cfg.profile_config 创建 StageProfiler，未启用时返回 None"""
+    profile_config = cfg.profile_config
+    if not profile_config.enabled:
+        return None
+    return StageProfiler(trace_events=profile_config.trace_events)
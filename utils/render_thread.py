@@ -0,0 +1,97 @@
+import threading
+import time
+
+import numpy as np
+
+
+class RenderThread:
+    """以独立频率在后台线程中调用 viewer.sync()
+
+    物理/控制循环只在 PD 控制和 mj_step 修改 MjData 时持有 lock (策略推理和状态输出在锁外)，
+    渲染线程只在 viewer.sync() 期间持有 lock，因此物理循环最多等待一次 sync 的拷贝时间，
+    不会再被每步的渲染拖慢；启用 profiler 时这段等待记录为 lock_wait 阶段。
+    """
+
+    def __init__(self, viewer, lock, fps=60.0, history=1024, profiler=None):
+        """
+        Args:
+            viewer: mujoco.viewer.launch_passive 返回的 Handle
+            lock: 与物理循环共享的 threading.Lock
+            fps: 渲染频率 [Hz]
+            history: 用于统计的最近帧耗时数量
+            profiler: 可选的 utils.profiler.StageProfiler，记录 viewer.sync 和等待 lock 的耗时
+        """
+        self.viewer = viewer
+        self.lock = lock
+        self.fps = fps
+        self.frames = 0
+        self.running = False
+        self.thread = None
+        self._sync_times = np.zeros(history)
+        self._frame_intervals = np.zeros(history)
+        self._start_time = 0.0
+        self.profiler = profiler
+        if profiler is not None:
+            self._stage_lock = profiler.stage("render.lock_wait", thread="render")
+            self._stage_sync = profiler.stage("viewer.sync", thread="render")
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=1.0)
+
+    def _run(self):
+        period = 1.0 / self.fps
+        history = len(self._sync_times)
+        self._start_time = time.perf_counter()
+        next_frame = self._start_time
+        last_frame = self._start_time
+        while self.running and self.viewer.is_running():
+            t0 = time.perf_counter()
+            with self.lock:
+                if self.profiler is not None:
+                    t_locked = time.perf_counter()
+                    self.viewer.sync()
+                    self.profiler.record(self._stage_lock, t0, t_locked)
+                    self.profiler.record(self._stage_sync, t_locked, time.perf_counter())
+                else:
+                    self.viewer.sync()
+            t1 = time.perf_counter()
+
+            idx = self.frames % history
+            self._sync_times[idx] = t1 - t0
+            self._frame_intervals[idx] = t0 - last_frame
+            last_frame = t0
+            self.frames += 1
+
+            next_frame += period
+            sleep_time = next_frame - time.perf_counter()
+            if sleep_time > 0:
+                time.sleep(sleep_time)
+            else:
+                next_frame = time.perf_counter()
+
+    def stats(self):
+        n = min(self.frames, len(self._sync_times))
+        elapsed = time.perf_counter() - self._start_time if self.frames else 0.0
+        sync_ms = self._sync_times[:n] * 1000
+        interval_ms = self._frame_intervals[:n] * 1000
+        return {
+            "frames": self.frames,
+            "target_fps": self.fps,
+            "fps": self.frames / elapsed if elapsed > 0 else 0.0,
+            "mean_sync_ms": float(sync_ms.mean()) if n else 0.0,
+            "max_sync_ms": float(sync_ms.max()) if n else 0.0,
+            "max_frame_interval_ms": float(interval_ms.max()) if n else 0.0,
+        }
+
+    def report(self):
+        s = self.stats()
+        return (f"render {s['frames']} frames, {s['fps']:.1f}/{s['target_fps']:.0f} fps, "
+                f"sync mean {s['mean_sync_ms']:.3f}ms max {s['max_sync_ms']:.3f}ms, "
+                f"max frame interval {s['max_frame_interval_ms']:.1f}ms")
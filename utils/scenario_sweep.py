@@ -0,0 +1,140 @@
+import csv
+import itertools
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import torch
+
+from utils.batch_runner import BatchedRunner
+
+SCENES = (
+    "./robotics/go2/scene.xml",
+    "./robotics/go2/scene_terrain.xml",
+    "./robotics/go2/scene_wutaishan.xml",
+)
+
+COLUMNS = ("scene", "x_vel", "y_vel", "ang_vel", "fall_rate", "lin_vel_tracking_error",
+           "ang_vel_tracking_error", "mean_power", "sim_seconds_per_wall_second")
+
+
+def command_grid(x_vels, y_vels, ang_vels):
+    """前向/侧向/偏航速度的所有组合"""
+    return [tuple(map(float, cmd)) for cmd in itertools.product(x_vels, y_vels, ang_vels)]
+
+
+# 每个 worker 进程的状态，由 _init_worker 设置
+_worker = {}
+
+
+def _init_worker(cfg, num_envs, runner_kwargs):
+    _worker["cfg"] = cfg
+    _worker["num_envs"] = num_envs
+    _worker["runner_kwargs"] = runner_kwargs
+    _worker["runners"] = {}
+
+
+def _get_runner(scene):
+    # 模型按场景缓存在 worker 内，策略由进程内的注册表缓存，都只加载一次
+    runner = _worker["runners"].get(scene)
+    if runner is None:
+        runner = BatchedRunner(_worker["cfg"], _worker["num_envs"], model_path=scene,
+                               **_worker["runner_kwargs"])
+        _worker["runners"][scene] = runner
+    return runner
+
+
+def _run_cell(scene, cmd, duration, seed):
+    runner = _get_runner(scene)
+    # 每个格子单独设种子，结果与分配到哪个 worker、执行顺序无关
+    runner.rng = np.random.default_rng(seed)
+    torch.manual_seed(seed)
+    summary = runner.run(np.array(cmd), duration).summary
+    row = {"scene": os.path.basename(scene), "x_vel": cmd[0], "y_vel": cmd[1], "ang_vel": cmd[2]}
+    row.update({k: summary[k] for k in COLUMNS[4:]})
+    row["pid"] = os.getpid()
+    return row
+
+
+class ScenarioSweep:
+    """场景 × 速度命令的无界面批量评估
+
+    每个 (场景, 命令) 格子作为一个任务分发到进程池，每个格子内用 BatchedRunner
+    跑 num_envs 个带初始扰动的环境。worker 进程只加载一次策略，每个场景的模型也只加载一次。
+    """
+
+    def __init__(self, cfg, scenes=SCENES, commands=((0.5, 0.0, 0.0),), num_envs=4, duration=10.0,
+                 workers=None, seed=0, **runner_kwargs):
+        """
+        Args:
+            cfg: Sim2simCfg，worker 中通过 cfg.inference_config 加载策略
+            scenes: MuJoCo 场景文件列表
+            commands: (x_vel, y_vel, ang_vel) 列表，见 command_grid
+            num_envs: 每个格子的并行环境数
+            duration: 每个格子的仿真时长 [s]
+            workers: 进程数，默认 os.cpu_count()
+            seed: 基础随机种子，第 i 个格子使用 seed + i
+            runner_kwargs: 传给 BatchedRunner 的其他参数 (init_pos_noise, init_yaw_noise, fall_tilt ...)
+        """
+        self.cfg = cfg
+        self.scenes = list(scenes)
+        self.commands = [tuple(map(float, cmd)) for cmd in commands]
+        self.num_envs = num_envs
+        self.duration = duration
+        self.workers = workers or os.cpu_count()
+        self.seed = seed
+        self.runner_kwargs = runner_kwargs
+
+    def tasks(self):
+        return [(scene, cmd) for scene in self.scenes for cmd in self.commands]
+
+    def run(self, verbose=True):
+        """运行所有格子，返回按 (场景, 命令) 顺序排列的结果行和汇总"""
+        tasks = self.tasks()
+        rows = [None] * len(tasks)
+        # spawn 而不是 fork，避免子进程继承 torch/OpenMP 的线程状态
+        context = multiprocessing.get_context("spawn")
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(tasks)), mp_context=context,
+                                 initializer=_init_worker,
+                                 initargs=(self.cfg, self.num_envs, self.runner_kwargs)) as pool:
+            futures = {pool.submit(_run_cell, scene, cmd, self.duration, self.seed + i): i
+                       for i, (scene, cmd) in enumerate(tasks)}
+            for done, future in enumerate(as_completed(futures), 1):
+                i = futures[future]
+                rows[i] = future.result()
+                if verbose:
+                    row = rows[i]
+                    print(f"[{done}/{len(tasks)}] {row['scene']} cmd=({row['x_vel']:.2f}, {row['y_vel']:.2f}, "
+                          f"{row['ang_vel']:.2f}) fall_rate={row['fall_rate']:.2f}")
+        wall_time = time.perf_counter() - start
+
+        sim_time = len(tasks) * self.num_envs * self.duration
+        summary = {
+            "cells": len(tasks),
+            "workers": len({row["pid"] for row in rows}),
+            "wall_time": wall_time,
+            "sim_seconds_per_wall_second": sim_time / wall_time,
+        }
+        return rows, summary
+
+
+def format_table(rows):
+    header = ("scene", "x_vel", "y_vel", "ang_vel", "fall", "lin_err", "ang_err", "power", "sim_s/s")
+    widths = (22, 6, 6, 7, 6, 8, 8, 8, 8)
+    lines = [" ".join(f"{h:>{w}}" for h, w in zip(header, widths))]
+    for row in rows:
+        values = [row[k] for k in COLUMNS]
+        cells = [f"{values[0]:>{widths[0]}}"]
+        cells += [f"{v:>{w}.2f}" for v, w in zip(values[1:], widths[1:])]
+        lines.append(" ".join(cells))
+    return "\n".join(lines)
+
+
+def save_csv(rows, path):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
@@ -0,0 +1,230 @@
+import json
+import os
+import struct
+import time
+
+import numpy as np
+
+from utils.command_sources import CommandSource
+from utils.state_sinks import StateSink
+
+MAGIC = b"DWQSESS\0"
+VERSION = 1
+# magic, version, metadata 长度；记录区从 RECORD_ALIGN 的整数倍开始
+_HEADER = struct.Struct("<8sII")
+RECORD_ALIGN = 64
+
+
+def record_dtype(num_single_obs, num_actions, nq, nv):
+    """每个控制周期一条的定长记录"""
+    return np.dtype([
+        ("tick", "<i8"),
+        ("sim_time", "<f8"),
+        ("wall_time", "<f8"),
+        ("cmd", "<f8", (3,)),
+        ("obs", "<f4", (num_single_obs,)),
+        ("action", "<f4", (num_actions,)),
+        ("qpos", "<f8", (nq,)),
+        ("qvel", "<f8", (nv,)),
+    ])
+
+
+def _dtype_from_descr(descr):
+    return np.dtype([tuple(field[:2]) + ((tuple(field[2]),) if len(field) > 2 else ()) for field in descr])
+
+
+def session_metadata(loop, **extra):
+    """从 ControlLoop 收集回放所需的信息"""
+    from utils.policy_registry import get_registry
+
+    cfg = loop.cfg
+    meta = {
+        "created": time.time(),
+        "scene": loop.model_path,
+        "policy_root": cfg.policy_root,
+        "policy_sha256": get_registry().digest(cfg.policy_root),
+        "backend": cfg.inference_config.backend,
+        "num_threads": cfg.inference_config.num_threads,
+        "seed": loop.seed,
+        "dt": cfg.sim_config.dt,
+        "decimation": loop.decimation,
+        "warmup_time": loop.warmup_time,
+    }
+    meta.update(extra)
+    return meta
+
+
+class SessionRecorder(StateSink):
+    """把每个控制周期的命令、观测、动作、qpos/qvel 和时间戳追加写入二进制文件
+
+    文件格式: 头 (magic, 版本, metadata 长度) + JSON metadata (包含记录的 dtype)，
+    之后是定长记录，可以直接 np.memmap。记录先写入预分配的块，块满时整块写入，
+    进程中途退出时最多丢失最后不完整的一块，读取时会忽略不完整的尾部记录。
+    """
+
+    def __init__(self, path, meta=None, block_records=256):
+        self.path = path
+        self.meta = meta or {}
+        self.block_records = block_records
+        self.count = 0
+        self._file = None
+        self._block = None
+        self._n = 0
+
+    def _open(self, loop):
+        dtype = record_dtype(len(loop.obs), len(loop.action), loop.model.nq, loop.model.nv)
+        meta = session_metadata(loop, **self.meta)
+        meta["dtype"] = dtype.descr
+        payload = json.dumps(meta).encode()
+        pad = -(_HEADER.size + len(payload)) % RECORD_ALIGN
+        payload += b" " * pad
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._file = open(self.path, "wb")
+        self._file.write(_HEADER.pack(MAGIC, VERSION, len(payload)))
+        self._file.write(payload)
+        self._block = np.zeros(self.block_records, dtype=dtype)
+        self._fields = {name: self._block[name] for name in dtype.names}
+
+    def publish(self, loop):
+        if self._file is None:
+            self._open(loop)
+        f = self._fields
+        n = self._n
+        f["tick"][n] = self.count
+        f["sim_time"][n] = loop.data.time
+        f["wall_time"][n] = time.time()
+        f["cmd"][n] = loop.cmd
+        f["obs"][n] = loop.obs
+        f["action"][n] = loop.action
+        f["qpos"][n] = loop.qpos
+        f["qvel"][n] = loop.qvel
+        self.count += 1
+        self._n = n + 1
+        if self._n == self.block_records:
+            self.flush()
+
+    def flush(self):
+        if self._file is None or self._n == 0:
+            return
+        self._file.write(self._block[:self._n].tobytes())
+        self._file.flush()
+        self._n = 0
+
+    def close(self):
+        if self._file is not None:
+            self.flush()
+            self._file.close()
+            self._file = None
+
+
+def read_session(path, mmap=True):
+    """读取录制文件
+
+    Returns:
+        (meta, records)，records 为结构化数组 (默认只读 memmap)，按字段名取列
+    """
+    with open(path, "rb") as f:
+        magic, version, meta_len = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a session recording")
+        if version != VERSION:
+            raise ValueError(f"{path}: unsupported session version {version}")
+        meta = json.loads(f.read(meta_len))
+    dtype = _dtype_from_descr(meta["dtype"])
+    offset = _HEADER.size + meta_len
+    count = (os.path.getsize(path) - offset) // dtype.itemsize
+    if mmap and count > 0:
+        records = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(count,))
+    else:
+        records = np.fromfile(path, dtype=dtype, count=count, offset=offset)
+    return meta, records
+
+
+class RecordedCommandSource(CommandSource):
+    """按控制周期依次回放录制的命令，回放完之后保持最后一个命令"""
+
+    def __init__(self, cmds):
+        self.cmds = np.ascontiguousarray(cmds, dtype=np.double)
+        self.index = 0
+
+    def read(self, out):
+        np.copyto(out, self.cmds[self.index])
+        if self.index < len(self.cmds) - 1:
+            self.index += 1
+
+
+class ReplayCapture(StateSink):
+    """回放时记录每个控制周期的 qpos/qvel/action，用于和录制结果对比"""
+
+    def __init__(self, num_ticks, nq, nv, num_actions):
+        self.num_ticks = num_ticks
+        self.qpos = np.zeros((num_ticks, nq))
+        self.qvel = np.zeros((num_ticks, nv))
+        self.action = np.zeros((num_ticks, num_actions), dtype=np.float32)
+        self.count = 0
+
+    def done(self):
+        return self.count >= self.num_ticks
+
+    def publish(self, loop):
+        if self.count < self.num_ticks:
+            self.qpos[self.count] = loop.qpos
+            self.qvel[self.count] = loop.qvel
+            self.action[self.count] = loop.action
+            self.count += 1
+
+
+def divergence(records, capture, tolerance=1e-6):
+    """回放结果与录制的差异"""
+    n = capture.count
+    qpos_err = np.abs(capture.qpos[:n] - records["qpos"][:n]).max(axis=1)
+    action_err = np.abs(capture.action[:n] - records["action"][:n]).max(axis=1)
+    base_err = np.linalg.norm(capture.qpos[:n, 0:3] - records["qpos"][:n, 0:3], axis=1)
+    over = np.flatnonzero(qpos_err > tolerance)
+    return {
+        "ticks": n,
+        "recorded_ticks": len(records),
+        "exact": bool(n == len(records) and qpos_err.max(initial=0.0) == 0.0 and action_err.max(initial=0.0) == 0.0),
+        "max_qpos_error": float(qpos_err.max(initial=0.0)),
+        "max_action_error": float(action_err.max(initial=0.0)),
+        "final_base_pos_error": float(base_err[-1]) if n else 0.0,
+        "first_divergent_tick": int(over[0]) if len(over) else -1,
+        "first_divergent_time": float(records["sim_time"][over[0]]) if len(over) else float("nan"),
+    }
+
+
+def replay_session(path, cfg, model_path=None, policy_root=None, tolerance=1e-6):
+    """无界面、不限速地用录制的命令重新驱动控制循环，并报告与录制的差异
+
+    Args:
+        path: 录制文件
+        cfg: Sim2simCfg，后端/线程数默认使用录制时的设置
+        model_path: 覆盖录制时的场景，用于模型改动后的回归检查
+        policy_root: 覆盖录制时的策略，用于策略改动后的回归检查
+        tolerance: qpos 差异超过该值的第一个控制周期记为发散点
+    """
+    from utils.control_loop import ControlLoop
+    from utils.policy_registry import get_registry
+
+    meta, records = read_session(path)
+    registry = get_registry()
+    policy_root = policy_root or meta["policy_root"]
+    policy = registry.engine(policy_root, meta["backend"], meta["num_threads"])
+
+    source = RecordedCommandSource(records["cmd"])
+    loop = ControlLoop(cfg, source, policy=policy, model_path=model_path or meta["scene"],
+                       warmup_time=meta["warmup_time"], seed=meta["seed"])
+    capture = ReplayCapture(len(records), loop.model.nq, loop.model.nv, len(loop.action))
+    loop.state_sinks = (capture,)
+
+    start = time.perf_counter()
+    loop.run(viewer=False, duration=float("inf"), speed=0, until=capture.done)
+    wall_time = time.perf_counter() - start
+
+    report = divergence(records, capture, tolerance)
+    report["policy_changed"] = registry.digest(policy_root) != meta["policy_sha256"]
+    report["sim_time"] = capture.count * meta["dt"] * meta["decimation"]
+    report["wall_time"] = wall_time
+    report["real_time_factor"] = report["sim_time"] / wall_time
+    return report
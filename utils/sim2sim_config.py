@@ -0,0 +1,79 @@
+import numpy as np
+
+from utils.policy_registry import LazyPolicy
+
+
+def pd_control(kps, target_q, q, kds, target_dq, dq):
+    """Calculates torques from position commands with customizable limits"""
+    output = (target_q - q) * kps + (target_dq - dq) * kds
+    return output
+
+
+class Sim2simCfg:
+    """Go2 DreamWaQ sim2sim 配置，供无界面/批量运行等脚本共享"""
+    policy_root = "./policies/dreamwaq/go2/policy_dwaq.pt"
+
+    # 第一次访问时才加载，见 utils/policy_registry.py
+    whole_policy = LazyPolicy()
+
+    class sim_config:
+        mujoco_model_path = "./robotics/go2/scene_terrain.xml"
+        dt = 0.005
+        decimation = 4
+        real_time_factor = 1.0  # N 倍实时，0 表示不限速
+        sim_duration = 500.  # 仿真时长 [s]
+        render_fps = 60.  # viewer 刷新频率，与 200Hz 物理循环解耦
+
+    class robot_config:
+        base_kp = 28
+        base_kd = 0.7
+        kps = np.array([base_kp, base_kp, base_kp, base_kp, base_kp, base_kp,
+                        base_kp, base_kp, base_kp, base_kp, base_kp, base_kp])
+        kds = np.array([base_kd, base_kd, base_kd, base_kd, base_kd, base_kd,
+                        base_kd, base_kd, base_kd, base_kd, base_kd, base_kd])
+        hip_pos = 0.0
+        thigh_pos = 0.8
+        calf_pos = -1.5
+
+        default_angles = np.array([hip_pos, thigh_pos, calf_pos,
+                                   hip_pos, thigh_pos, calf_pos,
+                                   hip_pos, thigh_pos, calf_pos,
+                                   hip_pos, thigh_pos, calf_pos,])
+
+        init_angles = np.array([hip_pos, thigh_pos, calf_pos,
+                                hip_pos, thigh_pos, calf_pos,
+                                hip_pos, 1., calf_pos,
+                                hip_pos, 1., calf_pos])
+
+    class env:
+        num_actions = 12
+        frame_stack = 6
+        num_single_obs = 45
+        num_observations = num_single_obs * frame_stack
+
+    class control:
+        action_scale = 0.25
+        decimation = 4
+
+    class inference_config:
+        backend = "torchscript"  # reference | torchscript | onnx
+        num_threads = 1  # intra-op 线程数，None 表示使用 torch 默认值
+
+    class profile_config:
+        enabled = False  # 各阶段耗时直方图，见 utils/profiler.py，关闭时控制循环不做任何计时
+        trace_events = 0  # Chrome trace 环形缓冲的事件数，0 表示不记录时间线
+        trace_path = None  # 退出时写出 Chrome trace JSON 的路径
+        report_interval = 0.  # 每隔多少仿真秒打印一次分位数，0 表示只在退出时打印
+
+    class normalization:
+        class obs_scales:
+            lin_vel = 2.0
+            ang_vel = 0.25
+            dof_pos = 1.0
+            dof_vel = 0.05
+            height_measurements = 5.0
+            quat = 1.
+        # 命令的归一化参数，其实最后的0.5在训练的时候是0.25
+        cmd_scale = np.array([2.0, 2.0, 0.5])
+        clip_observations = 100.
+        clip_actions = 100.
@@ -0,0 +1,267 @@
+import copy
+import itertools
+import json
+import os
+import re
+import struct
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from utils.state_frame import FIELDS, JOINT_NAMES, MAGIC, decode
+
+MAGIC_ARCHIVE = b"DWQARCH\0"
+VERSION = 1
+# magic, version, metadata 长度；记录区从 RECORD_ALIGN 的整数倍开始，与 utils/session_recorder.py 相同
+_HEADER = struct.Struct("<8sII")
+RECORD_ALIGN = 64
+# 时间索引每 INDEX_STRIDE 条记录一项 (该记录的接收时间)，保存在 <session>.idx
+INDEX_STRIDE = 256
+SUFFIX = ".dwqa"
+INDEX_SUFFIX = ".idx"
+
+
+def record_dtype(num_joints):
+    """服务器收到的每个状态消息一条的定长记录，缺少的字段为 NaN"""
+    return np.dtype([
+        ("t", "<f8"),  # 服务器接收时间 time.time() [s]
+        ("timestamp", "<f8"),  # 仿真端的发送时间 [ms]
+        ("seq", "<u4"),
+        ("base_pos", "<f4", (3,)),
+        ("base_quat", "<f4", (4,)),
+        ("joint_pos", "<f4", (num_joints,)),
+        ("joint_vel", "<f4", (num_joints,)),
+    ])
+
+
+def _dtype_from_descr(descr):
+    return np.dtype([tuple(field[:2]) + ((tuple(field[2]),) if len(field) > 2 else ()) for field in descr])
+
+
+def session_name(sim_id, created, n=0):
+    """<sim_id>-<YYYYmmdd-HHMMSS-mmm>[-n]，sim_id 中文件名不允许的字符替换为 _，n > 0 区分同一毫秒内的录制"""
+    safe = re.sub(r"[^A-Za-z0-9_-]", "_", sim_id or "default")
+    name = f"{safe}-{time.strftime('%Y%m%d-%H%M%S', time.localtime(created))}-{int(created * 1000) % 1000:03d}"
+    return f"{name}-{n}" if n else name
+
+
+class StateArchive:
+    """把服务器转发的状态帧追加写入定长记录文件，供 HTTP 接口按时间范围读取
+
+    append() 在服务器的转发路径上调用，只把 (接收时间, 原始消息) 放入有界队列，
+    解码 (原始帧、增量编码帧或 JSON) 和写文件都在后台线程中进行；写入跟不上时丢弃最旧的消息并计数。
+    文件格式与 utils/session_recorder.py 相同: 头 + JSON metadata + 定长记录，可以直接 np.memmap。
+    """
+
+    def __init__(self, directory, sim_id=None, state_frame=None, queue_size=4096, flush_interval=0.05):
+        """
+        Args:
+            directory: 录制目录，文件名见 session_name()
+            sim_id: 仿真名
+            state_frame: sim_connect 握手中的 state_frame (关节名、编码参数)
+            queue_size: 等待写入的消息数上限
+            flush_interval: 后台线程写入的间隔 [s]，HTTP 接口最多晚这么久看到新记录
+        """
+        state_frame = state_frame or {}
+        joint_names = state_frame.get("joint_names") or JOINT_NAMES
+        self.created = time.time()
+        self.dtype = record_dtype(len(joint_names))
+        self.flush_interval = flush_interval
+        self.count = 0
+        self.dropped = 0
+        self._pending = deque(maxlen=queue_size)
+        self._decoder = None
+        codec = state_frame.get("codec")
+        if codec is not None:
+            from utils.state_codec import DeltaFrameDecoder
+
+            self._decoder = DeltaFrameDecoder(codec.get("resolution"))
+
+        meta = {
+            "sim_id": sim_id,
+            "created": self.created,
+            "joint_names": list(joint_names),
+            "codec": codec,
+            "index_stride": INDEX_STRIDE,
+            "dtype": self.dtype.descr,
+        }
+        payload = json.dumps(meta).encode()
+        payload += b" " * (-(_HEADER.size + len(payload)) % RECORD_ALIGN)
+        os.makedirs(directory, exist_ok=True)
+        # "xb" 不覆盖已有的录制: 同一仿真在同一毫秒内重连时换一个后缀
+        for n in itertools.count():
+            self.name = session_name(sim_id, self.created, n)
+            self.path = os.path.join(directory, self.name + SUFFIX)
+            try:
+                self._file = open(self.path, "xb")
+                break
+            except FileExistsError:
+                continue
+        self.index_path = os.path.join(directory, self.name + INDEX_SUFFIX)
+        self._file.write(_HEADER.pack(MAGIC_ARCHIVE, VERSION, len(payload)))
+        self._file.write(payload)
+        self._file.flush()
+        # 名字已由记录文件占用，同名的索引文件只可能是删除录制时留下的
+        self._index = open(self.index_path, "wb")
+        self._block = np.zeros(queue_size, dtype=self.dtype)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"archive-{self.name}", daemon=True)
+        self._thread.start()
+
+    def append(self, message):
+        """转发路径上调用，message 为二进制状态帧或 JSON state 文本，不阻塞"""
+        if len(self._pending) == self._pending.maxlen:
+            self.dropped += 1
+        self._pending.append((time.time(), message))
+
+    def _fill(self, row, t, message):
+        """解码一条消息写入 row，增量编码帧在收到 keyframe 之前无法解码，返回 False"""
+        if isinstance(message, (bytes, bytearray)):
+            if message[:4] == MAGIC:
+                state = decode(message)
+            elif self._decoder is not None:
+                state = self._decoder.decode(message)
+                if state is None:
+                    return False
+            else:
+                return False
+        else:
+            state = json.loads(message)
+        row["t"] = t
+        row["timestamp"] = state.get("timestamp") or 0.0
+        row["seq"] = state.get("seq") or 0
+        for name in FIELDS:
+            value = state.get(name)
+            row[name] = np.nan if value is None else value
+        return True
+
+    def _drain(self):
+        n = 0
+        pending = self._pending
+        while pending and n < len(self._block):
+            t, message = pending.popleft()
+            if self._fill(self._block[n], t, message):
+                n += 1
+        if n == 0:
+            return
+        # 时间索引: 落在本批中的每个 INDEX_STRIDE 整数倍记录
+        first = -self.count % INDEX_STRIDE
+        if first < n:
+            self._index.write(self._block["t"][first:n:INDEX_STRIDE].tobytes())
+            self._index.flush()
+        self._file.write(self._block[:n].tobytes())
+        self._file.flush()
+        self.count += n
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self._drain()
+        self._drain()
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self._file.close()
+        self._index.close()
+
+    def stats(self):
+        return {"session": self.name, "records": self.count, "dropped": self.dropped,
+                "pending": len(self._pending)}
+
+
+class ArchiveReader:
+    """只读打开一个录制，记录区为 np.memmap，按需只读取用到的页
+
+    文件仍在写入时，refresh() 重新映射以看到新记录。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            magic, version, meta_len = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != MAGIC_ARCHIVE:
+                raise ValueError(f"{path} is not a state archive")
+            if version != VERSION:
+                raise ValueError(f"{path}: unsupported state archive version {version}")
+            self.meta = json.loads(f.read(meta_len))
+        self.dtype = _dtype_from_descr(self.meta["dtype"])
+        self.offset = _HEADER.size + meta_len
+        self.index_path = os.path.splitext(path)[0] + INDEX_SUFFIX
+        self.records = None
+        self.index = None
+        self.refresh()
+
+    def refresh(self):
+        count = max(os.path.getsize(self.path) - self.offset, 0) // self.dtype.itemsize
+        if self.records is None or len(self.records) != count:
+            self.records = (np.memmap(self.path, dtype=self.dtype, mode="r", offset=self.offset, shape=(count,))
+                            if count > 0 else np.zeros(0, dtype=self.dtype))
+        # 只使用已有对应记录的索引项
+        index = np.fromfile(self.index_path, dtype="<f8") if os.path.exists(self.index_path) else np.zeros(0)
+        self.index = index[:(count + INDEX_STRIDE - 1) // INDEX_STRIDE]
+        return count
+
+    def snapshot(self):
+        """当前 records / index 的浅拷贝，之后对本对象的 refresh() / close() 不影响它 (多个线程共享一个 reader 时用)"""
+        return copy.copy(self)
+
+    def close(self):
+        """释放对 memmap 的引用 (文件在最后一个仍在使用的视图释放后解除映射)，之后 refresh() 可以重新打开"""
+        self.records = np.zeros(0, dtype=self.dtype)
+        self.index = np.zeros(0)
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def start(self):
+        return float(self.records["t"][0]) if len(self.records) else self.meta["created"]
+
+    @property
+    def end(self):
+        return float(self.records["t"][-1]) if len(self.records) else self.meta["created"]
+
+    def find(self, t):
+        """第一条接收时间 >= t 的记录下标：先在稀疏索引中二分，再只读取一个索引区间内的记录"""
+        block = max(int(np.searchsorted(self.index, t, side="right")) - 1, 0)
+        lo = block * INDEX_STRIDE
+        hi = min(lo + INDEX_STRIDE, len(self.records))
+        return lo + int(np.searchsorted(np.asarray(self.records["t"][lo:hi]), t))
+
+    def range(self, start, end, limit=None):
+        """接收时间在 [start, end) 的记录 (memmap 视图)，超过 limit 条时等间隔抽取，返回 (records, step)"""
+        lo = self.find(start)
+        hi = self.find(end)
+        step = 1
+        if limit and hi - lo > limit:
+            step = -(-(hi - lo) // limit)
+        return self.records[lo:hi:step], step
+
+    def overview(self, points):
+        """整个录制等间隔抽取约 points 条记录，只触及被抽中的记录所在的页"""
+        return self.range(-np.inf, np.inf, limit=points)
+
+    def summary(self):
+        return {"session": os.path.splitext(os.path.basename(self.path))[0], "sim_id": self.meta.get("sim_id"),
+                "created": self.meta.get("created"), "start": self.start, "end": self.end,
+                "records": len(self.records), "joint_names": self.meta.get("joint_names")}
+
+
+def records_to_json(records, fields=None, origin=0.0):
+    """记录转换成按列的 dict，t 为相对 origin 的秒数"""
+    out = {"t": (np.asarray(records["t"]) - origin).tolist(), "seq": np.asarray(records["seq"]).tolist(),
+           "timestamp": np.asarray(records["timestamp"]).tolist()}
+    for name in fields or FIELDS:
+        # NaN 不是合法的 JSON，缺少的字段输出 null
+        values = np.asarray(records[name], dtype=np.float64)
+        out[name] = np.where(np.isnan(values), None, values).tolist()
+    return out
+
+
+def list_archives(directory):
+    """目录中的录制文件，按创建时间排序"""
+    if not directory or not os.path.isdir(directory):
+        return []
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(SUFFIX))
@@ -0,0 +1,233 @@
+import struct
+import time
+
+import numpy as np
+
+from utils.state_frame import (FIELD_BASE_POS, FIELD_BASE_QUAT, FIELD_JOINT_POS, FIELD_JOINT_VEL, FIELDS,
+                               JOINT_NAMES, field_sizes)
+
+# 量化 + 增量编码的状态帧，所有字段小端序:
+#   magic "DWQD" | version u8 | num_joints u8 | flags u16 | seq u32 | timestamp_ms f64 | key_age u16
+#   u8[k] 每个字段的字节数 (k 为 flags 中置位的字段数)
+#   每个字段: zigzag varint 编码的整数，keyframe 为量化后的绝对值，其它帧为相对第 seq - key_age 帧 (keyframe) 的差值；
+#   全部为 0 的字段长度为 0，不占字节 (例如站立时的机身位姿)
+# flags 的低 4 位与 utils/state_frame.py 的 fields 相同，FLAG_KEYFRAME 表示这是 keyframe (key_age == 0)。
+# 差值相对最近的 keyframe 而不是上一帧，因此服务器丢帧、降频或裁剪字段之后，剩下的每一帧仍可独立解码。
+DELTA_MAGIC = b"DWQD"
+DELTA_VERSION = 1
+DELTA_HEADER = struct.Struct("<4sBBHIdH")
+FLAG_KEYFRAME = 0x100
+FIELD_MASK = 0xFF
+
+# 默认量化分辨率
+RESOLUTION = {
+    "base_pos": 1e-3,  # m
+    "base_quat": 1e-3,
+    "joint_pos": 1e-3,  # rad
+    "joint_vel": 1e-2,  # rad/s
+}
+
+
+
+# 一个 int64 的 zigzag varint 最多 10 字节
+VARINT_MAX = 10
+
+
+def _varint_encode(values, out, pos):
+    """把整数序列以 zigzag varint 写入 out (bytearray) 的 pos 处，返回写完后的位置
+
+    每帧只有约 30 个值，纯 Python 循环比 numpy 向量化更快 (后者的固定开销占主导)。
+    """
+    for v in values:
+        u = (v << 1) ^ (v >> 63)
+        while u >= 0x80:
+            out[pos] = (u & 0x7F) | 0x80
+            pos += 1
+            u >>= 7
+        out[pos] = u
+        pos += 1
+    return pos
+
+
+def _varint_decode(data):
+    """zigzag varint 字节 -> 整数列表"""
+    values = []
+    u = 0
+    shift = 0
+    for b in data:
+        u |= (b & 0x7F) << shift
+        if b & 0x80:
+            shift += 7
+        else:
+            values.append((u >> 1) ^ -(u & 1))
+            u = 0
+            shift = 0
+    return values
+
+
+def is_keyframe(frame):
+    """只读头部：增量编码帧中的 keyframe 返回 True，原始帧和普通增量帧返回 False"""
+    return (frame[:4] == DELTA_MAGIC
+            and bool(DELTA_HEADER.unpack_from(frame, 0)[3] & FLAG_KEYFRAME))
+
+
+def describe(resolution=None, keyframe_interval=50):
+    """握手中的编码参数，网页端据此反量化"""
+    return {
+        "name": "delta",
+        "version": DELTA_VERSION,
+        "keyframe_interval": keyframe_interval,
+        "resolution": dict(RESOLUTION, **(resolution or {})),
+    }
+
+
+class DeltaFrameEncoder:
+    """量化 + 相对 keyframe 增量编码，接口与 utils.state_frame.StateFrameEncoder 相同
+
+    encode_into() 把帧写入调用者预分配的缓冲区 (至少 max_frame_size 字节)，keyframe 表示最近一帧是否为 keyframe。
+    每 keyframe_interval 帧发送一次 keyframe，新加入的客户端最多等待一个间隔即可同步
+    (服务器还会缓存最近的 keyframe 直接发给新客户端)。
+    """
+
+    def __init__(self, num_joints=len(JOINT_NAMES), resolution=None, keyframe_interval=50):
+        if not 0 < keyframe_interval <= 0xFFFF:
+            raise ValueError(f"keyframe_interval must be in [1, 65535], got {keyframe_interval}")
+        self.num_joints = num_joints
+        self.keyframe_interval = keyframe_interval
+        self.resolution = dict(RESOLUTION, **(resolution or {}))
+        self.seq = 0
+        self.sizes = field_sizes(num_joints)
+        n = sum(size for _, size in self.sizes)
+        self._scale = np.concatenate([np.full(size, 1.0 / self.resolution[name])
+                                      for name, (_, size) in zip(FIELDS, self.sizes)])
+        self._x = np.zeros(n)
+        self._q = np.zeros(n, dtype=np.int64)
+        self._key = np.zeros(n, dtype=np.int64)
+        self._key_seq = 0
+        self._key_fields = 0
+        self._bounds = []
+        offset = 0
+        for _, size in self.sizes:
+            self._bounds.append((offset, offset + size))
+            offset += size
+        self._views = [self._x[start:end] for start, end in self._bounds]
+        self.keyframe = False
+        self.max_frame_size = DELTA_HEADER.size + len(self.sizes) + VARINT_MAX * n
+        self._buf = bytearray(self.max_frame_size)
+
+    def handshake_info(self):
+        return describe(self.resolution, self.keyframe_interval)
+
+    def encode(self, base_pos, base_quat, joint_pos, joint_vel=None, timestamp_ms=None):
+        size = self.encode_into(self._buf, base_pos, base_quat, joint_pos, joint_vel, timestamp_ms)
+        return bytes(memoryview(self._buf)[:size])
+
+    def encode_into(self, buf, base_pos, base_quat, joint_pos, joint_vel=None, timestamp_ms=None):
+        """写入 buf 的开头，返回帧的字节数"""
+        views = self._views
+        views[0][:] = base_pos
+        views[1][:] = base_quat
+        views[2][:] = joint_pos
+        fields = FIELD_BASE_POS | FIELD_BASE_QUAT | FIELD_JOINT_POS
+        count = len(self._x)
+        if joint_vel is not None:
+            views[3][:] = joint_vel
+            fields |= FIELD_JOINT_VEL
+        else:
+            count -= self.num_joints
+        np.rint(np.multiply(self._x, self._scale, out=self._x), out=self._x)
+        self._q[:] = self._x
+
+        key = self.seq % self.keyframe_interval == 0 or fields != self._key_fields
+        if key:
+            self._key[:] = self._q
+            self._key_seq = self.seq
+            self._key_fields = fields
+            values = self._q[:count]
+        else:
+            values = self._q[:count] - self._key[:count]
+
+        values = values.tolist()
+        bounds = self._bounds[:3 if joint_vel is None else 4]
+        # 头, 每个字段的字节数, 各字段的数据
+        lengths = DELTA_HEADER.size
+        pos = lengths + len(bounds)
+        for k, (start, end) in enumerate(bounds):
+            before = pos
+            segment = values[start:end]
+            if any(segment):
+                pos = _varint_encode(segment, buf, pos)
+            buf[lengths + k] = pos - before
+        if timestamp_ms is None:
+            timestamp_ms = time.time() * 1000
+        DELTA_HEADER.pack_into(buf, 0, DELTA_MAGIC, DELTA_VERSION, self.num_joints,
+                               fields | (FLAG_KEYFRAME if key else 0), self.seq, timestamp_ms,
+                               (self.seq - self._key_seq) & 0xFFFF)
+        self.seq = (self.seq + 1) & 0xFFFFFFFF
+        self.keyframe = key
+        return pos
+
+
+class DeltaFrameDecoder:
+    """DeltaFrameEncoder 的解码端，decode() 在收到第一个 keyframe 之前返回 None"""
+
+    def __init__(self, resolution=None):
+        self.resolution = dict(RESOLUTION, **(resolution or {}))
+        self._key_seq = None
+        self._key = {}
+
+    def decode(self, frame):
+        magic, version, num_joints, flags, seq, timestamp_ms, key_age = DELTA_HEADER.unpack_from(frame, 0)
+        if magic != DELTA_MAGIC:
+            raise ValueError("not a delta state frame")
+        if version != DELTA_VERSION:
+            raise ValueError(f"unsupported delta state frame version {version}")
+        fields = flags & FIELD_MASK
+        keyframe = bool(flags & FLAG_KEYFRAME)
+        if not keyframe and (seq - key_age) & 0xFFFFFFFF != self._key_seq:
+            return None
+
+        present = [(name, bit, size) for name, (bit, size) in zip(FIELDS, field_sizes(num_joints)) if fields & bit]
+        offset = DELTA_HEADER.size + len(present)
+        lengths = frame[DELTA_HEADER.size:offset]
+
+        if keyframe:
+            self._key_seq = seq
+            self._key = {}
+        state = {"type": "state", "seq": seq, "timestamp": timestamp_ms}
+        for (name, bit, size), length in zip(present, lengths):
+            q = np.array(_varint_decode(frame[offset:offset + length]) if length else [0] * size,
+                         dtype=np.int64)
+            offset += length
+            if keyframe:
+                self._key[name] = q
+            elif name in self._key:
+                q = q + self._key[name]
+            else:
+                state[name] = None
+                continue
+            state[name] = q * self.resolution[name]
+        for name in FIELDS:
+            state.setdefault(name, None)
+        return state
+
+
+def project_delta(frame, fields):
+    """只保留 fields 中的字段，按字节切片，不解码 varint"""
+    magic, version, num_joints, flags, seq, timestamp_ms, key_age = DELTA_HEADER.unpack_from(frame, 0)
+    present = flags & FIELD_MASK
+    keep = present & fields
+    if keep == present:
+        return frame
+    bits = [bit for bit, _ in field_sizes(num_joints) if present & bit]
+    lengths = frame[DELTA_HEADER.size:DELTA_HEADER.size + len(bits)]
+    offset = DELTA_HEADER.size + len(bits)
+    kept_lengths = []
+    parts = []
+    for bit, length in zip(bits, lengths):
+        if keep & bit:
+            kept_lengths.append(length)
+            parts.append(frame[offset:offset + length])
+        offset += length
+    header = DELTA_HEADER.pack(magic, version, num_joints, keep | (flags & ~FIELD_MASK), seq, timestamp_ms, key_age)
+    return header + bytes(kept_lengths) + b"".join(parts)
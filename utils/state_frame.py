@@ -0,0 +1,192 @@
+import struct
+import time
+
+import numpy as np
+
+# 二进制状态帧，所有字段小端序:
+#   magic "DWQS" | version u16 | num_joints u16 | seq u32 | fields u32 | timestamp_ms f64
+#   float32 payload: fields 中置位的字段按 base_pos, base_quat (w, x, y, z), joint_pos, joint_vel 的顺序排列
+# 关节名等不变的信息只在 sim_connect 握手中发送一次，见 handshake()
+# 服务器按客户端订阅的字段用 project() 裁剪帧，只切片字节，不解码 payload
+MAGIC = b"DWQS"
+VERSION = 2
+HEADER = struct.Struct("<4sHHIId")
+
+FIELD_BASE_POS = 1
+FIELD_BASE_QUAT = 2
+FIELD_JOINT_POS = 4
+FIELD_JOINT_VEL = 8
+FIELDS = {
+    "base_pos": FIELD_BASE_POS,
+    "base_quat": FIELD_BASE_QUAT,
+    "joint_pos": FIELD_JOINT_POS,
+    "joint_vel": FIELD_JOINT_VEL,
+}
+# 订阅时可用的字段组合
+FIELD_GROUPS = {
+    "base_pose": FIELD_BASE_POS | FIELD_BASE_QUAT,
+    "joints": FIELD_JOINT_POS | FIELD_JOINT_VEL,
+    "all": FIELD_BASE_POS | FIELD_BASE_QUAT | FIELD_JOINT_POS | FIELD_JOINT_VEL,
+}
+ALL_FIELDS = FIELD_GROUPS["all"]
+
+# 服务器转发给订阅了多个仿真的网页客户端时，在帧前加上路由头: magic "DWQR" | channel u16
+# channel 为服务器为每个仿真分配的编号，随 sim_info 发给网页端
+ROUTE_MAGIC = b"DWQR"
+ROUTE_HEADER = struct.Struct("<4sH")
+
+JOINT_NAMES = ["FL_hip", "FL_thigh", "FL_calf", "FR_hip", "FR_thigh", "FR_calf",
+               "RL_hip", "RL_thigh", "RL_calf", "RR_hip", "RR_thigh", "RR_calf"]
+
+
+def field_sizes(num_joints):
+    """(字段位, float32 个数)，按 payload 中的顺序"""
+    return ((FIELD_BASE_POS, 3), (FIELD_BASE_QUAT, 4), (FIELD_JOINT_POS, num_joints), (FIELD_JOINT_VEL, num_joints))
+
+
+def frame_size(num_joints, fields=ALL_FIELDS):
+    return HEADER.size + 4 * sum(n for bit, n in field_sizes(num_joints) if fields & bit)
+
+
+def field_mask(names):
+    """把订阅的字段名 (FIELDS 或 FIELD_GROUPS 中的键) 转换成字段位"""
+    if isinstance(names, str):
+        names = [names]
+    mask = 0
+    for name in names:
+        bit = FIELDS.get(name) or FIELD_GROUPS.get(name)
+        if bit is None:
+            raise ValueError(f"unknown state field '{name}', expected one of "
+                             f"{list(FIELDS) + list(FIELD_GROUPS)}")
+        mask |= bit
+    return mask
+
+
+def handshake(joint_names=JOINT_NAMES, codec=None, sim_id=None):
+    """sim_connect 消息，服务器保存后转发给订阅该仿真的网页客户端
+
+    codec: 使用 utils/state_codec.py 的增量编码时为其参数 (DeltaFrameEncoder.handshake_info())
+    sim_id: 同一服务器上有多个仿真时的名字，None 为服务器的默认仿真
+    """
+    return {
+        "type": "sim_connect",
+        "sim_id": sim_id,
+        "state_frame": {
+            "version": VERSION,
+            "header_bytes": HEADER.size,
+            "frame_bytes": frame_size(len(joint_names)),
+            "joint_names": list(joint_names),
+            "codec": codec,
+        },
+    }
+
+
+class StateFrameEncoder:
+    """把机器人状态打包成原始帧
+
+    encode_into() 直接写入调用者预分配的缓冲区 (bytearray，至少 max_frame_size 字节)，不分配内存；
+    encode() 写入内部缓冲区后返回一份拷贝。keyframe 恒为 False，与 DeltaFrameEncoder 的接口一致。
+    """
+
+    def __init__(self, num_joints=len(JOINT_NAMES)):
+        self.num_joints = num_joints
+        self.seq = 0
+        self.keyframe = False
+        self.max_frame_size = frame_size(num_joints)
+        self._buf = bytearray(self.max_frame_size)
+        # encode_into 的目标缓冲区 -> 其中各字段的 float32 视图，每个缓冲区只在第一次使用时创建
+        self._views = {}
+
+    def _field_views(self, buf):
+        views = self._views.get(id(buf))
+        if views is None or views[0] is not buf:
+            payload = np.frombuffer(buf, dtype="<f4", count=3 + 4 + 2 * self.num_joints, offset=HEADER.size)
+            n = self.num_joints
+            views = self._views[id(buf)] = (buf, payload[0:3], payload[3:7], payload[7:7 + n], payload[7 + n:7 + 2 * n])
+        return views
+
+    def encode_into(self, buf, base_pos, base_quat, joint_pos, joint_vel=None, timestamp_ms=None):
+        """写入 buf 的开头，返回帧的字节数"""
+        _, view_pos, view_quat, view_joint_pos, view_joint_vel = self._field_views(buf)
+        view_pos[:] = base_pos
+        view_quat[:] = base_quat
+        view_joint_pos[:] = joint_pos
+        fields = FIELD_BASE_POS | FIELD_BASE_QUAT | FIELD_JOINT_POS
+        size = self.max_frame_size
+        if joint_vel is not None:
+            view_joint_vel[:] = joint_vel
+            fields |= FIELD_JOINT_VEL
+        else:
+            size -= 4 * self.num_joints
+        if timestamp_ms is None:
+            timestamp_ms = time.time() * 1000
+        HEADER.pack_into(buf, 0, MAGIC, VERSION, self.num_joints, self.seq, fields, timestamp_ms)
+        self.seq = (self.seq + 1) & 0xFFFFFFFF
+        return size
+
+    def encode(self, base_pos, base_quat, joint_pos, joint_vel=None, timestamp_ms=None):
+        size = self.encode_into(self._buf, base_pos, base_quat, joint_pos, joint_vel, timestamp_ms)
+        return bytes(memoryview(self._buf)[:size])
+
+    def handshake_info(self):
+        return None
+
+
+def frame_fields(frame):
+    """帧中包含的字段位，只读头部"""
+    magic, version, num_joints, seq, fields, timestamp_ms = HEADER.unpack_from(frame, 0)
+    if magic != MAGIC:
+        raise ValueError("not a state frame")
+    if version != VERSION:
+        raise ValueError(f"unsupported state frame version {version}")
+    return fields
+
+
+def project(frame, fields):
+    """只保留 fields 中的字段，返回新的帧；不需要裁剪时原样返回，增量编码帧见 utils/state_codec.py"""
+    if frame[:4] != MAGIC:
+        from utils.state_codec import DELTA_MAGIC, project_delta
+
+        if frame[:4] == DELTA_MAGIC:
+            return project_delta(frame, fields)
+    magic, version, num_joints, seq, present, timestamp_ms = HEADER.unpack_from(frame, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("not a supported state frame")
+    keep = present & fields
+    if keep == present:
+        return frame
+    parts = [HEADER.pack(magic, version, num_joints, seq, keep, timestamp_ms)]
+    offset = HEADER.size
+    for bit, n in field_sizes(num_joints):
+        if present & bit:
+            if keep & bit:
+                parts.append(frame[offset:offset + 4 * n])
+            offset += 4 * n
+    return b"".join(parts)
+
+
+def decode(frame):
+    """解码一帧，返回与 JSON state 消息相同字段的 dict (不含 joint_names)，缺少的字段为 None"""
+    fields = frame_fields(frame)
+    _, _, num_joints, seq, _, timestamp_ms = HEADER.unpack_from(frame, 0)
+    state = {"type": "state", "seq": seq, "timestamp": timestamp_ms}
+    offset = HEADER.size
+    for name, (bit, n) in zip(FIELDS, field_sizes(num_joints)):
+        if fields & bit:
+            state[name] = np.frombuffer(frame, dtype="<f4", offset=offset, count=n)
+            offset += 4 * n
+        else:
+            state[name] = None
+    return state
+
+
+def route(frame, channel):
+    """加上路由头"""
+    return ROUTE_HEADER.pack(ROUTE_MAGIC, channel) + frame
+
+
+def unroute(frame):
+    """(channel, 原始帧)，没有路由头的帧返回 (None, frame)"""
+    if frame[:4] != ROUTE_MAGIC:
+        return None, frame
+    return ROUTE_HEADER.unpack_from(frame, 0)[1], frame[ROUTE_HEADER.size:]
@@ -0,0 +1,57 @@
+import numpy as np
+
+from utils.easy_math import quaternion_to_euler_array
+
+
+class StateSink:
+    """控制循环每个控制周期的状态输出
+
+    publish(loop) 在策略推理之后调用，loop 为 utils.control_loop.ControlLoop，
+    可直接读取 loop.base_pos / base_quat / qj / dqj / cmd / obs / action 等预分配的视图。
+    """
+
+    def publish(self, loop):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class WebSocketStateSink(StateSink):
+    """把机器人状态通过 WebSocketBridge 发送给网页端"""
+
+    def __init__(self, bridge):
+        self.bridge = bridge
+
+    def publish(self, loop):
+        self.bridge.send_state(loop.base_pos, loop.base_quat, loop.qj, loop.dqj)
+
+
+class LoggerSink(StateSink):
+    """每个控制周期把姿态、角速度、功率、关节位置和力矩写入 utils.logger.Logger
+
+    Logger 的 dt 应为控制周期 (sim dt * decimation)；启用 logger.start_live_plot() 时在另一个进程中实时绘图。
+    力矩取自 data.ctrl，即上一个物理步施加的 PD 力矩。
+    """
+
+    def __init__(self, logger):
+        self.logger = logger
+
+    def publish(self, loop):
+        roll, pitch, yaw = quaternion_to_euler_array(loop.base_quat[[1, 2, 3, 0]])
+        self.logger.log_states({
+            "roll": roll,
+            "pitch": pitch,
+            "yaw": yaw,
+            "angle_vel_x": loop.omega[0],
+            "angle_vel_y": loop.omega[1],
+            "angle_vel_z": loop.omega[2],
+            "power": np.abs(loop.ctrl * loop.dqj).sum(),
+            "dof_pos": loop.qj,
+            "dof_pos_target": loop.target_q,
+            "dof_torque": loop.ctrl,
+            "base_vel_z": loop.base_lin_vel[2],
+        })
+
+    def close(self):
+        self.logger.close()
@@ -1,18 +1,148 @@
 import asyncio
 import websockets
 import json
+import math
 import time
 from typing import Optional, Callable
 import threading
 
+from utils.profiler import StageProfiler
+from utils.state_frame import JOINT_NAMES, StateFrameEncoder, handshake
+
+class FrameSlot:
+    """单写者 (控制线程) / 单读者 (发送协程) 的最新帧槽位，不加锁，写入时不分配内存
+
+    三个预分配的缓冲区：最新发布的帧、未取走的 keyframe 和写者正在写入的帧各占一个，
+    写者总能找到一个空闲的缓冲区，直接编码进去，再把下标赋给 published 发布 (CPython 中单个赋值是原子的)。
+    未取走的 keyframe 所在的缓冲区不会被覆盖，之后的普通帧也不会让它丢失。
+    每个缓冲区有写入计数 (seqlock)，写入期间为奇数；读者拷贝帧前后计数不同说明缓冲区已被重新使用，重新读取。
+    version 为写者给每帧的递增编号，taken 为读者取走的最新编号，只由读者写入。
+    """
+
+    def __init__(self, size):
+        self.buffers = [bytearray(size) for _ in range(3)]
+        self.sizes = [0] * 3
+        self.versions = [0] * 3
+        self.writes = [0] * 3
+        self.published = -1
+        self.key = -1
+        self.key_version = 0
+        self.taken = 0
+        self._writing = 0
+
+    def begin(self):
+        """写者：返回本帧要写入的缓冲区"""
+        key = self.key if self.key_version > self.taken else -1
+        i = 0
+        while i == self.published or i == key:
+            i += 1
+        self.writes[i] += 1
+        self._writing = i
+        return self.buffers[i]
+
+    def publish(self, size, version, keyframe=False):
+        """写者：发布 begin() 返回的缓冲区中 size 字节的帧"""
+        i = self._writing
+        self.sizes[i] = size
+        self.versions[i] = version
+        self.writes[i] += 1
+        if keyframe:
+            self.key = i
+            self.key_version = version
+        self.published = i
+
+    def write(self, data, version):
+        """写者：发布一份已编码的帧 (JSON 消息)，缓冲区不够时换一个更大的"""
+        buffer = self.begin()
+        if len(data) > len(buffer):
+            buffer = self.buffers[self._writing] = bytearray(2 * len(data))
+        buffer[:len(data)] = data
+        self.publish(len(data), version)
+
+    def take(self):
+        """读者：下一帧的拷贝，先未取走的 keyframe，再最新的普通帧；没有新帧时返回 None"""
+        while True:
+            taken = self.taken
+            key_version = self.key_version
+            key = key_version > taken
+            i = self.key if key else self.published
+            if i < 0:
+                return None
+            before = self.writes[i]
+            version = self.versions[i]
+            # key 在 keyframe 写完后才赋值，key 指向的缓冲区可能已是更新的 keyframe
+            if before & 1 or (key and version < key_version):
+                continue
+            if version <= taken:
+                return None
+            data = bytes(memoryview(self.buffers[i])[:self.sizes[i]])
+            if self.writes[i] != before:
+                continue
+            # 拷贝普通帧期间发布了新的 keyframe，这一帧可能以它为基准，先取 keyframe
+            if not key and self.key_version > taken:
+                continue
+            self.taken = version
+            return data
+
+    def pending(self):
+        """等待发送的帧数 (未取走的 keyframe 和更新的普通帧)"""
+        taken = self.taken
+        key = self.key_version > taken
+        latest = self.published >= 0 and self.versions[self.published] > taken and not (
+            key and self.published == self.key)
+        return key + latest
+
+
 class WebSocketBridge:
-    def __init__(self, uri: str):
+    """仿真端的 WebSocket 客户端：接收 command 消息，发送机器人状态
+
+    状态发送不阻塞控制线程：send_state() 把帧直接编码进 FrameSlot 预分配的缓冲区并发布 (不加锁，不做 I/O)，
+    由事件循环中唯一的发送协程取出拷贝并发送。网络阻塞时槽位中的旧帧被新帧覆盖 (coalesced)，
+    不会在事件循环里堆积协程。增量编码未发送的 keyframe 不会被之后的普通帧覆盖。
+
+    command 消息由浏览器 (t_client)、服务器 (t_server) 和本桥接 (t_bridge) 分别打上毫秒时间戳，
+    命令来源在控制循环第一次应用该命令时把各段延迟记录进 command_latency 直方图。
+    桥接每 REPORT_INTERVAL 秒把命令延迟统计，以及 metrics_source (ControlLoop) 的实时倍率、
+    超时步数等调度统计发给服务器 (GET /stats, GET /metrics)。
+    """
+
+    # 命令延迟和仿真统计上报服务器的间隔 [s]
+    REPORT_INTERVAL = 1.0
+    # 命令延迟的各段，见 record_command_latency()
+    LATENCY_STAGES = ("client_to_server", "server_to_bridge", "bridge_to_apply", "client_to_apply")
+
+    def __init__(self, uri: str, binary: bool = True, encoder=None, sim_id: Optional[str] = None):
+        """
+        Args:
+            uri: WebSocket 服务器地址
+            sim_id: 在服务器上注册的仿真名，同一服务器可连接多个不同名字的仿真；None 为服务器的默认仿真
+            binary: True 时状态以二进制帧发送 (utils/state_frame.py)，False 时使用旧的 JSON 消息
+            encoder: 二进制帧的编码器，默认 StateFrameEncoder；
+                     utils.state_codec.DeltaFrameEncoder 为量化 + 增量编码
+        """
         self.uri = uri
+        self.binary = binary
+        self.encoder = encoder if encoder is not None else StateFrameEncoder()
+        self.sim_id = sim_id
+        # 提供 scheduler 属性的对象 (ControlLoop)，其调度统计随 sim_metrics 上报
+        self.metrics_source = None
         self.websocket = None
         self.command_callback: Optional[Callable] = None
         self.running = False
         self.loop = None
         self.thread = None
+        # 最新帧槽位，JSON 消息的缓冲区按需扩大
+        self._slot = FrameSlot(self.encoder.max_frame_size if binary else 1024)
+        self._wakeup = None
+        self._sender_idle = False
+        # 计数器各自只有一个线程写入：submitted 为控制线程 (也是帧的 version)，sent / failed 为发送协程
+        self.submitted = 0
+        self.sent = 0
+        self.failed = 0
+        # 命令延迟直方图，只由控制线程写入
+        self.command_latency = StageProfiler(min_time=1e-5, max_time=10.0)
+        self._latency_stages = [self.command_latency.stage(f"cmd.{name}", thread="command")
+                                for name in self.LATENCY_STAGES]
 
     def set_command_callback(self, callback: Callable):
         self.command_callback = callback
@@ -23,9 +153,11 @@ class WebSocketBridge:
         self.thread.start()
 
     def _run_loop(self):
-        self.loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(self.loop)
-        self.loop.run_until_complete(self._connect())
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._wakeup = asyncio.Event()
+        self.loop = loop
+        loop.run_until_complete(self._connect())
 
     async def _connect(self):
         while self.running:
@@ -33,42 +165,144 @@ class WebSocketBridge:
                 async with websockets.connect(self.uri) as websocket:
                     self.websocket = websocket
                     # Identify as simulation
-                    await websocket.send(json.dumps({"type": "sim_connect"}))
+                    await websocket.send(json.dumps(handshake(codec=self.encoder.handshake_info(), sim_id=self.sim_id)))
                     print("Connected to WebSocket server")
+                    tasks = [asyncio.create_task(self._send_loop(websocket)),
+                             asyncio.create_task(self._report_loop(websocket))]
+                    for task in tasks:
+                        task.add_done_callback(self._task_done)
 
-                    # Receive commands
-                    while self.running:
-                        try:
-                            data = await asyncio.wait_for(websocket.recv(), timeout=0.1)
+                    # Receive commands, stop() closes the socket to end the loop
+                    try:
+                        async for data in websocket:
+                            t_bridge = time.time() * 1000
                             msg = json.loads(data)
                             if msg.get("type") == "command" and self.command_callback:
+                                msg["t_bridge"] = t_bridge
                                 self.command_callback(msg)
-                        except asyncio.TimeoutError:
-                            continue
+                            elif msg.get("type") == "error":
+                                print(f"WebSocket server error: {msg.get('message')}")
+                    finally:
+                        for task in tasks:
+                            task.cancel()
 
             except Exception as e:
                 print(f"WebSocket error: {e}")
-                self.websocket = None
+            self.websocket = None
+            if self.running:
                 await asyncio.sleep(1)
 
+    @staticmethod
+    def _task_done(task):
+        """发送 / 上报协程异常退出时打印异常，否则异常只保存在没人等待的 task 中"""
+        if not task.cancelled() and task.exception() is not None:
+            print(f"WebSocket bridge task {task.get_coro().__name__} failed: {task.exception()!r}")
+
+    async def _send_loop(self, websocket):
+        """唯一的发送协程，总是发送槽位中最新的帧"""
+        while True:
+            # 先标记空闲再取帧：send_state() 先发布再读取该标记，二者至少有一方能看到对方的写入，不会错过唤醒
+            self._wakeup.clear()
+            self._sender_idle = True
+            data = self._slot.take()
+            if data is None:
+                await self._wakeup.wait()
+                continue
+            self._sender_idle = False
+            try:
+                await websocket.send(data if self.binary else data.decode())
+                self.sent += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # 连接已断开，接收循环负责重连
+                self.failed += 1
+                return
+
+    async def _report_loop(self, websocket):
+        """定期上报：有新命令时发送命令延迟统计，控制循环运行时发送调度统计"""
+        last_count = 0
+        last_scheduler = None
+        last_sim_time = last_wall_time = 0.0
+        while True:
+            await asyncio.sleep(self.REPORT_INTERVAL)
+            count = self.command_latency.count(self._latency_stages[2])
+            if count != last_count:
+                last_count = count
+                await websocket.send(json.dumps({"type": "command_latency",
+                                                 "stages": self.command_latency.stats()}))
+
+            scheduler = getattr(self.metrics_source, "scheduler", None)
+            if scheduler is None:
+                continue
+            stats = scheduler.stats()
+            if scheduler is not last_scheduler:
+                last_scheduler = scheduler
+                last_sim_time = last_wall_time = 0.0
+            # 最近一个上报间隔内的实时倍率，stats 中的 real_time_factor 为整次运行的平均
+            wall = stats["wall_time"] - last_wall_time
+            stats["recent_real_time_factor"] = (stats["sim_time"] - last_sim_time) / wall if wall > 0 else 0.0
+            last_sim_time, last_wall_time = stats["sim_time"], stats["wall_time"]
+            # 不限速时 target_speed 为 inf，JSON 中用 null
+            stats = {key: value if math.isfinite(value) else None for key, value in stats.items()}
+            await websocket.send(json.dumps({"type": "sim_metrics", "scheduler": stats, "state_frames": self.stats()}))
+
+    def record_command_latency(self, msg, t_apply):
+        """由命令来源在控制线程中调用，msg 为第一次被应用的 command 消息，t_apply 为 time.time()
+
+        不同机器上的浏览器时钟与服务器不同步时，client_to_* 两段只有参考意义。
+        """
+        # 消息中的时间戳为毫秒，直方图以秒为单位
+        t_client, t_server, t_bridge = (msg.get(key) for key in ("t_client", "t_server", "t_bridge"))
+        client_to_server, server_to_bridge, bridge_to_apply, client_to_apply = self._latency_stages
+        record = self.command_latency.record
+        if t_bridge is not None:
+            record(bridge_to_apply, t_bridge / 1000, t_apply)
+            if t_server is not None:
+                record(server_to_bridge, t_server / 1000, t_bridge / 1000)
+        if t_client is not None:
+            if t_server is not None:
+                record(client_to_server, t_client / 1000, t_server / 1000)
+            record(client_to_apply, t_client / 1000, t_apply)
+
+    def stats(self):
+        """sent: 已发送, coalesced: 未发送即被新帧覆盖, failed: 发送失败, pending: 槽位中等待发送"""
+        pending = self._slot.pending()
+        return {"sent": self.sent, "coalesced": self.submitted - self.sent - self.failed - pending,
+                "failed": self.failed, "pending": pending}
+
+    @staticmethod
+    def encode_state_json(base_pos, base_quat, joint_pos, joint_vel=None):
+        """旧的 JSON 状态消息，供 binary=False 和对比测试使用"""
+        msg = {
+            "type": "state",
+            "timestamp": int(time.time() * 1000),
+            "base_pos": base_pos.tolist(),
+            "base_quat": base_quat.tolist(),
+            "joint_pos": joint_pos.tolist(),
+            "joint_vel": joint_vel.tolist() if joint_vel is not None else [0.0] * 12,
+            "joint_names": JOINT_NAMES,
+        }
+        return json.dumps(msg)
+
     def send_state(self, base_pos, base_quat, joint_pos, joint_vel=None):
+        """由控制线程调用，只编码进槽位的缓冲区并发布，从不加锁或等待网络"""
         if self.websocket and self.loop:
-            msg = {
-                "type": "state",
-                "timestamp": int(time.time() * 1000),
-                "base_pos": base_pos.tolist(),
-                "base_quat": base_quat.tolist(),
-                "joint_pos": joint_pos.tolist(),
-                "joint_vel": joint_vel.tolist() if joint_vel is not None else [0.0] * 12,
-                "joint_names": ["FL_hip", "FL_thigh", "FL_calf", "FR_hip", "FR_thigh", "FR_calf",
-                                "RL_hip", "RL_thigh", "RL_calf", "RR_hip", "RR_thigh", "RR_calf"]
-            }
-            asyncio.run_coroutine_threadsafe(
-                self.websocket.send(json.dumps(msg)),
-                self.loop
-            )
+            slot = self._slot
+            self.submitted += 1
+            if self.binary:
+                size = self.encoder.encode_into(slot.begin(), base_pos, base_quat, joint_pos, joint_vel)
+                slot.publish(size, self.submitted, self.encoder.keyframe)
+            else:
+                slot.write(self.encode_state_json(base_pos, base_quat, joint_pos, joint_vel).encode(), self.submitted)
+            if self._sender_idle:
+                self._sender_idle = False
+                self.loop.call_soon_threadsafe(self._wakeup.set)
 
     def stop(self):
         self.running = False
+        websocket, loop = self.websocket, self.loop
+        if websocket is not None and loop is not None:
+            asyncio.run_coroutine_threadsafe(websocket.close(), loop)
         if self.thread:
             self.thread.join(timeout=2)